@@ -9,8 +9,29 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+if settings.DEBUG:
+    # Como runserver: archivos estáticos (admin) servidos por Django en desarrollo
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+    django_application = ASGIStaticFilesHandler(django_application)
+
+# Después de get_asgi_application(), que inicializa Django
+from inventario.sse import RUTA as RUTA_EVENTOS, aplicacion_eventos  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    Django más el flujo de eventos de stock (Server-Sent Events), que se
+    atiende fuera de Django para detectar la desconexión del cliente. El
+    reparto de eventos es en memoria: correr con un único worker.
+    """
+    if scope['type'] == 'http' and scope['path'] == RUTA_EVENTOS:
+        return await aplicacion_eventos(scope, receive, send)
+    return await django_application(scope, receive, send)
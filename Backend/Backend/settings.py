@@ -6,6 +6,8 @@ from pathlib import Path
 from datetime import timedelta
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inventario.metricas.MetricasMiddleware',  # Primero: mide también el resto del middleware
+    'inventario.perfilado.PerfiladoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # ✅ ANTES de CommonMiddleware
@@ -77,12 +81,50 @@ TEMPLATES = [
 WSGI_APPLICATION = 'Backend.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DJANGO_DB_ENGINE: sqlite (por defecto) o postgresql (varios procesos escribiendo a la vez)
+DB_ENGINE = os.getenv('DJANGO_DB_ENGINE', 'sqlite').lower()
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DJANGO_DB_NAME', 'inventario'),
+            'USER': os.getenv('DJANGO_DB_USER', 'postgres'),
+            'PASSWORD': os.getenv('DJANGO_DB_PASSWORD', ''),
+            'HOST': os.getenv('DJANGO_DB_HOST', 'localhost'),
+            'PORT': os.getenv('DJANGO_DB_PORT', '5432'),
+            # Conexiones persistentes: se reutilizan entre peticiones del mismo
+            # worker y se comprueban antes de reutilizarlas
+            'CONN_MAX_AGE': int(os.getenv('DJANGO_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            # Las exportaciones y los reportes leen con QuerySet.iterator(), que en
+            # PostgreSQL usa un cursor del lado del servidor; hay que desactivarlo
+            # detrás de PgBouncer en modo transacción
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DJANGO_DB_SERVER_SIDE_CURSORS', 'True').lower() != 'true',
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+
+# SQLite como base de producción (inventario/sqlite.py): WAL, espera de
+# bloqueos y reintentos de las escrituras de ventas y movimientos
+SQLITE_PRODUCCION = os.getenv('DJANGO_SQLITE_PRODUCCION', 'False').lower() == 'true'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': int(os.getenv('DJANGO_SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.getenv('DJANGO_SQLITE_MMAP_MB', '256')) * 1024 * 1024,
+    # Negativo: tamaño en KiB en lugar de páginas
+    'cache_size': -int(os.getenv('DJANGO_SQLITE_CACHE_MB', '64')) * 1024,
+    'temp_store': 'MEMORY',
 }
+SQLITE_REINTENTOS = int(os.getenv('DJANGO_SQLITE_REINTENTOS', '5'))
+SQLITE_REINTENTO_ESPERA_MS = 20
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -106,6 +148,15 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Versiones reducidas de las imágenes de productos (inventario/imagenes.py):
+# lado mayor en px de cada tamaño, calidad de compresión y hilos que las generan
+IMAGENES_TAMANOS = {'miniatura': 160, 'mediana': 480, 'grande': 1200}
+IMAGENES_CALIDAD_WEBP = 80
+IMAGENES_CALIDAD_JPEG = 82
+IMAGENES_HILOS = int(os.getenv('DJANGO_IMAGENES_HILOS', '2'))
+# False las genera al confirmar la transacción en el mismo hilo de la petición
+IMAGENES_SEGUNDO_PLANO = os.getenv('DJANGO_IMAGENES_SEGUNDO_PLANO', 'True').lower() == 'true'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -114,7 +165,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # ============================================
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWT con claims de autorización (ver inventario/autenticacion.py)
+        'inventario.autenticacion.JWTReclamosAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -128,6 +180,120 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 100,
 }
 
+# ============================================
+# CACHÉ
+# ============================================
+# DJANGO_CACHE_BACKEND:
+#   archivo (por defecto) - compartida entre los procesos del mismo servidor
+#   memoria               - local a cada proceso (solo con un único proceso)
+#   redis                 - compartida entre servidores, requiere el paquete redis
+CACHE_BACKENDS = {
+    'archivo': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memoria': 'django.core.cache.backends.locmem.LocMemCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+CACHE_BACKEND = os.getenv('DJANGO_CACHE_BACKEND', 'archivo')
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f"DJANGO_CACHE_BACKEND={CACHE_BACKEND!r} no es válido. Opciones: {', '.join(CACHE_BACKENDS)}"
+    )
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.getenv(
+            'DJANGO_CACHE_LOCATION',
+            {'archivo': str(BASE_DIR / 'cache'), 'memoria': 'inventario', 'redis': 'redis://localhost:6379/0'}[CACHE_BACKEND],
+        ),
+    }
+}
+if CACHE_BACKEND != 'redis':
+    # Cada combinación de parámetros de un reporte es una entrada: las 300 por
+    # defecto se llenan enseguida y al llenarse se descarta un tercio de la caché
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('DJANGO_CACHE_MAX_ENTRIES', '20000'))}
+
+# Segundos que un reporte puede quedarse en caché (las ventas lo invalidan antes)
+REPORTES_CACHE_TTL = int(os.getenv('DJANGO_REPORTES_CACHE_TTL', '3600'))
+
+# Reportes en segundo plano (POST /api/reportes/jobs/, python manage.py worker_reportes):
+# procesos del worker, segundos sin latido para dar por muerto a un trabajador
+# y veces que se reintenta un trabajo abandonado
+REPORTES_TRABAJADORES = int(os.getenv('DJANGO_REPORTES_TRABAJADORES', '2'))
+REPORTES_TRABAJO_EXPIRACION_SEGUNDOS = int(os.getenv('DJANGO_REPORTES_TRABAJO_EXPIRACION_SEGUNDOS', '300'))
+# Cada cuánto renueva el latido el trabajador, sin importar cuánto tarde cada tramo
+REPORTES_TRABAJO_LATIDO_SEGUNDOS = max(1, REPORTES_TRABAJO_EXPIRACION_SEGUNDOS // 5)
+REPORTES_TRABAJO_INTENTOS = 3
+
+# ============================================
+# CARGA MASIVA DE VENTAS (POS sin conexión)
+# ============================================
+# Ventas por transacción en POST /api/ventas/bulk/ (se puede cambiar con ?lote=)
+VENTAS_BULK_TAMANO_LOTE = int(os.getenv('DJANGO_VENTAS_BULK_TAMANO_LOTE', '200'))
+# Máximo de ventas aceptadas en una sola petición
+VENTAS_BULK_MAXIMO = int(os.getenv('DJANGO_VENTAS_BULK_MAXIMO', '5000'))
+# Segundos que la fecha enviada por un POS puede adelantarse al reloj del servidor
+VENTAS_FECHA_TOLERANCIA_SEGUNDOS = int(os.getenv('DJANGO_VENTAS_FECHA_TOLERANCIA_SEGUNDOS', '300'))
+
+# ============================================
+# MÉTRICAS POR PETICIÓN (inventario/metricas.py)
+# ============================================
+# Cabecera Server-Timing con SQL, autenticación, permisos y serialización
+METRICAS_SERVER_TIMING = os.getenv('DJANGO_METRICAS_SERVER_TIMING', 'True').lower() == 'true'
+# Minutos que cubren los histogramas de GET /api/metrics/
+METRICAS_VENTANA_MINUTOS = int(os.getenv('DJANGO_METRICAS_VENTANA_MINUTOS', '15'))
+
+# Consultas SQL de al menos estos ms se registran con su plan (inventario/consultas_lentas.py); 0 lo desactiva
+CONSULTAS_LENTAS_MS = float(os.getenv('DJANGO_CONSULTAS_LENTAS_MS', '200'))
+CONSULTAS_LENTAS_ARCHIVO = Path(os.getenv('DJANGO_CONSULTAS_LENTAS_ARCHIVO', BASE_DIR / 'logs' / 'consultas_lentas.log'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'mensaje': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'consultas_lentas': {
+            # Crea la carpeta del archivo con el primer registro
+            'class': 'inventario.consultas_lentas.ArchivoConsultasLentas',
+            'filename': CONSULTAS_LENTAS_ARCHIVO,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'mensaje',
+        },
+    },
+    'loggers': {
+        'inventario.consultas_lentas': {
+            'handlers': ['consultas_lentas'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Perfiles de cProfile pedidos con X-Perfilar: 1 o ?perfilar=1 (inventario/perfilado.py)
+PERFILES_DIR = os.getenv('DJANGO_PERFILES_DIR', str(BASE_DIR / 'perfiles'))
+PERFILES_MAXIMO = int(os.getenv('DJANGO_PERFILES_MAXIMO', '50'))
+
+# ============================================
+# SINCRONIZACIÓN DEL CATÁLOGO (GET /api/productos/changes/)
+# ============================================
+# Los cambios más recientes que esto no se entregan todavía: una transacción
+# que aún no confirma puede tener una fecha_actualizacion anterior a la última vista.
+# En PostgreSQL solo cubre la diferencia de reloj entre servidores (las transacciones
+# abiertas se consultan); en SQLite debe superar la transacción de escritura más
+# larga, p. ej. un lote de VENTAS_BULK_TAMANO_LOTE ventas en /api/ventas/bulk/
+SINCRONIZACION_MARGEN_SEGUNDOS = float(os.getenv('DJANGO_SINCRONIZACION_MARGEN_SEGUNDOS', '2'))
+SINCRONIZACION_LIMITE = 500
+
+# ============================================
+# HISTORIAL DE STOCK (inventario/historial_stock.py)
+# ============================================
+# Los cortes de stock se toman con este atraso: una venta que aún no confirma
+# puede tener una fecha anterior al momento del corte
+STOCK_CORTES_MARGEN_SEGUNDOS = float(os.getenv('DJANGO_STOCK_CORTES_MARGEN_SEGUNDOS', '300'))
+
 # ============================================
 # JWT CONFIGURATION ✅
 # ============================================
@@ -154,6 +320,10 @@ SIMPLE_JWT = {
     'AUTH_COOKIE': None,
 }
 
+# Segundos que cada proceso reutiliza los cambios de rol/estado publicados
+# (caché y tabla CambioAutorizacion) antes de volver a leerlos: retraso máximo de una desactivación
+AUTH_CAMBIOS_TTL_LOCAL = float(os.getenv('DJANGO_AUTH_CAMBIOS_TTL_LOCAL', '5'))
+
 # ============================================
 # CORS CONFIGURATION ✅
 # ============================================
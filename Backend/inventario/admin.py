@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import Producto, Categoria, Empleado, MovimientoInventario, Cliente, Venta, Coleccion
+from .models import Producto, ProductoVariante, Categoria, Empleado, MovimientoInventario, RegistroStock, Cliente, Venta, Coleccion
 
 # Register your models here.
 admin.site.register(Producto)
+admin.site.register(ProductoVariante)
 admin.site.register(Categoria)
 admin.site.register(Coleccion)
 
@@ -11,4 +12,21 @@ admin.site.register(Cliente)
 
 admin.site.register(MovimientoInventario)
 
+
+@admin.register(RegistroStock)
+class RegistroStockAdmin(admin.ModelAdmin):
+    """El historial de stock solo se consulta"""
+    list_display = ('fecha', 'producto', 'delta', 'variante', 'delta_variante', 'origen')
+    list_filter = ('origen',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Venta)
\ No newline at end of file
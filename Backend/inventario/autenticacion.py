@@ -0,0 +1,170 @@
+"""
+Autenticación JWT sin consultas por petición.
+
+El access token lleva como claims todo lo que necesitan IsAdmin/IsEmpleado
+(empleado_id, activo, rol, is_active, is_staff, is_superuser), así que
+autenticar y autorizar no toca la base de datos. Los tokens emitidos antes de
+estos claims siguen funcionando por el camino de siempre (consulta del User).
+
+Como un token ya emitido no cambia, las desactivaciones y los cambios de rol
+(señales de User y Empleado en signals.py, sea cual sea el origen: API,
+admin o shell) se guardan en CambioAutorizacion y tienen prioridad sobre los
+claims. La caché solo evita leer esa tabla en cada petición: si pierde una
+entrada se vuelve a leer de la base de datos. Cada proceso guarda la
+respuesta unos pocos segundos (AUTH_CAMBIOS_TTL_LOCAL), que es el retraso
+máximo con el que otro proceso aplica el cambio.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from . import metricas
+from .models import CambioAutorizacion, Empleado
+
+CLAIM_ROL = 'rol'
+_SIN_CAMBIOS = object()
+
+_locales = {}
+_lock = threading.Lock()
+
+
+def reclamos_usuario(user):
+    """Claims de autorización de ``user`` (una consulta, al emitir el token)"""
+    empleado = Empleado.objects.filter(user_id=user.pk).values('id', 'activo').first()
+    return {
+        'empleado_id': empleado['id'] if empleado else None,
+        'activo': empleado['activo'] if empleado else user.is_superuser,
+        'is_active': user.is_active,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+        CLAIM_ROL: 'admin' if user.is_staff else 'empleado',
+    }
+
+
+# ---------- cambios posteriores a la emisión del token ----------
+def _clave(user_id):
+    return f'auth:cambios:{user_id}'
+
+
+def _duracion():
+    # Lo mismo que un refresh token: el access token que se obtiene al refrescar copia sus claims
+    return int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+
+
+def _olvidar_local(user_id):
+    with _lock:
+        _locales.pop(user_id, None)
+
+
+def _publicar(user_id, valor):
+    CambioAutorizacion.objects.update_or_create(user_id=user_id, defaults={'reclamos': valor})
+    # Hasta confirmar, quien no encuentre la entrada lee la tabla; al confirmar
+    # set() reemplaza lo que otro proceso haya cargado entretanto
+    cache.delete(_clave(user_id))
+    _olvidar_local(user_id)
+
+    def confirmar():
+        cache.set(_clave(user_id), valor, _duracion())
+        _olvidar_local(user_id)
+
+    transaction.on_commit(confirmar)
+
+
+def registrar_cambio(user):
+    """Publica el estado actual de ``user`` para que reemplace los claims de los tokens ya emitidos"""
+    _publicar(user.pk, reclamos_usuario(user))
+
+
+def registrar_eliminacion(user_id):
+    """Los tokens de un usuario eliminado dejan de autenticar"""
+    _publicar(user_id, {'eliminado': True})
+
+
+def cambios(user_id):
+    """Estado publicado para ``user_id`` o None, con un caché local de pocos segundos"""
+    ahora = time.monotonic()
+    local = _locales.get(user_id)
+    if local is not None and local[0] > ahora:
+        valor = local[1]
+    else:
+        valor = cache.get(_clave(user_id), _SIN_CAMBIOS)
+        if valor is _SIN_CAMBIOS:
+            # Entrada vencida, descartada por la caché o nunca cargada: la tabla manda.
+            # add() no pisa lo que un _publicar() haya escrito entretanto
+            valor = CambioAutorizacion.objects.filter(user_id=user_id).values_list('reclamos', flat=True).first()
+            valor = valor or {}
+            cache.add(_clave(user_id), valor, _duracion())
+        with _lock:
+            _locales[user_id] = (ahora + settings.AUTH_CAMBIOS_TTL_LOCAL, valor)
+            # Limpieza ocasional de entradas vencidas
+            if len(_locales) > 10000:
+                for clave in [c for c, (expira, _) in _locales.items() if expira <= ahora]:
+                    del _locales[clave]
+    return valor or None
+
+
+def limpiar_cache_local():
+    with _lock:
+        _locales.clear()
+
+
+# ---------- autenticación ----------
+class UsuarioToken(TokenUser):
+    """Usuario construido desde los claims del token (y los cambios publicados)"""
+
+    def __init__(self, token, cambios=None):
+        super().__init__(token)
+        self.reclamos = {
+            clave: token.get(clave) for clave in ('empleado_id', 'activo', 'is_staff', 'is_superuser')
+        }
+        # Los tokens emitidos antes de este claim son de usuarios activos
+        self.reclamos['is_active'] = token.get('is_active', True)
+        self.reclamos.update(cambios or {})
+
+    @property
+    def is_active(self):
+        return bool(self.reclamos['is_active'])
+
+    @property
+    def is_staff(self):
+        return bool(self.reclamos['is_staff'])
+
+    @property
+    def is_superuser(self):
+        return bool(self.reclamos['is_superuser'])
+
+    @property
+    def empleado_id(self):
+        return self.reclamos['empleado_id']
+
+    @property
+    def empleado_activo(self):
+        return bool(self.reclamos['activo'])
+
+
+class JWTReclamosAuthentication(JWTAuthentication):
+    """JWTAuthentication que no consulta el User si el token trae los claims"""
+
+    def authenticate(self, request):
+        with metricas.medir('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if CLAIM_ROL not in validated_token:
+            # Token emitido antes de los claims
+            return super().get_user(validated_token)
+
+        actual = cambios(validated_token[api_settings.USER_ID_CLAIM])
+        if actual and actual.get('eliminado'):
+            raise AuthenticationFailed('Usuario no encontrado', code='user_not_found')
+        usuario = UsuarioToken(validated_token, actual)
+        if not usuario.is_active:
+            raise AuthenticationFailed('Usuario inactivo', code='user_inactive')
+        return usuario
@@ -0,0 +1,120 @@
+"""
+Búsqueda de productos por texto completo.
+
+En SQLite se usa la tabla virtual FTS5 ``inventario_producto_fts`` (creada en
+la migración 0008), que indexa nombre, descripción, categoría y colección y
+se mantiene al día con triggers sobre las tres tablas, así que cualquier
+escritura (ORM, admin, update() masivo o SQL directo) queda reflejada sin
+código adicional. En PostgreSQL la tabla ``inventario_producto_busqueda``
+(migración 0015) guarda lo mismo en un tsvector sin tildes con índice GIN y
+se mantiene con triggers equivalentes. Las dos se unen a Producto a través
+de modelos no gestionados (ProductoFTS, ProductoBusqueda). En otros motores
+se busca cada palabra con icontains y se ordena con los mismos pesos por columna.
+"""
+import operator
+import re
+import unicodedata
+from functools import reduce
+
+from django.db import connections
+from django.db.models import Case, F, FloatField, Func, IntegerField, Lookup, Q, Value, When
+
+from .models import ProductoBusqueda, ProductoFTS
+
+
+# Peso de cada columna en bm25: nombre, descripcion, categoria, coleccion
+PESOS_BM25 = (10.0, 1.0, 3.0, 3.0)
+# Los mismos pesos para ts_rank, por etiqueta {D, C, B, A}: descripción D,
+# categoría y colección B, nombre A
+PESOS_TS_RANK = '{0.1, 0, 0.3, 1.0}'
+COLUMNAS = ('nombre', 'descripcion', 'categoria__nombre', 'coleccion__nombre')
+
+
+def usa_fts(alias='default'):
+    return connections[alias].vendor in ('sqlite', 'postgresql')
+
+
+def terminos(texto):
+    """Palabras de la búsqueda, sin la sintaxis de consulta de FTS5"""
+    return re.findall(r'\w+', texto.lower())
+
+
+def sin_tildes(texto):
+    return ''.join(
+        caracter for caracter in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(caracter)
+    )
+
+
+def consulta_fts(texto):
+    """
+    "blusa sat" -> '"blusa"* "sat"*': todas las palabras deben aparecer y la
+    última (y las demás) se aceptan como prefijo, que es lo que se espera de
+    una caja de búsqueda que consulta en cada tecla.
+    """
+    return ' '.join(f'"{termino}"*' for termino in terminos(texto))
+
+
+def consulta_tsquery(texto):
+    """La misma consulta para to_tsquery: "blusa satín" -> 'blusa:* & satin:*'"""
+    return ' & '.join(f'{sin_tildes(termino)}:*' for termino in terminos(texto))
+
+
+class Coincide(Lookup):
+    """
+    ``indice__coincide=consulta``: MATCH de FTS5 o @@ de PostgreSQL. Como
+    lookup (y no como expresión en filter()) la tabla del índice se une con
+    INNER JOIN, que es donde FTS5 admite MATCH.
+    """
+    lookup_name = 'coincide'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        operador = '@@' if connection.vendor == 'postgresql' else 'MATCH'
+        return f'{lhs} {operador} {rhs}', [*lhs_params, *rhs_params]
+
+
+ProductoFTS._meta.get_field('indice').register_lookup(Coincide)
+ProductoBusqueda._meta.get_field('documento').register_lookup(Coincide)
+
+
+def buscar(queryset, texto):
+    """
+    Filtra ``queryset`` (de Producto) a los productos que coinciden con
+    ``texto`` y los ordena por relevancia y luego por nombre.
+    """
+    if not terminos(texto):
+        return queryset
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        queryset = queryset.filter(fts__indice__coincide=consulta_fts(texto))
+        # bm25 es negativo: cuanto menor, más relevante
+        relevancia = -Func(F('fts__indice'), *map(Value, PESOS_BM25), function='bm25', output_field=FloatField())
+    elif vendor == 'postgresql':
+        tsquery = Func(Value(consulta_tsquery(texto)), template="to_tsquery('simple', %(expressions)s)")
+        queryset = queryset.filter(busqueda__documento__coincide=tsquery)
+        relevancia = Func(
+            F('busqueda__documento'), tsquery,
+            template=f"ts_rank('{PESOS_TS_RANK}', %(expressions)s)", output_field=FloatField(),
+        )
+    else:
+        return _buscar_sin_fts(queryset, terminos(texto))
+
+    return queryset.annotate(relevancia=relevancia).order_by('-relevancia', 'nombre', 'id')
+
+
+def _buscar_sin_fts(queryset, palabras):
+    """Cada palabra debe aparecer en alguna columna; relevancia = suma de los pesos"""
+    condicion = Q()
+    casos = []
+    for palabra in palabras:
+        coincide = [Q(**{f'{columna}__icontains': palabra}) for columna in COLUMNAS]
+        condicion &= reduce(operator.or_, coincide)
+        casos += [
+            Case(When(q, then=Value(int(peso))), default=Value(0), output_field=IntegerField())
+            for q, peso in zip(coincide, PESOS_BM25)
+        ]
+    queryset = queryset.filter(condicion)
+    relevancia = sum(casos[1:], casos[0])
+    return queryset.annotate(relevancia=relevancia).order_by('-relevancia', 'nombre', 'id')
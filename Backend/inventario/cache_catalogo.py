@@ -0,0 +1,28 @@
+"""
+Versión del catálogo (productos, variantes, categorías y colecciones) para
+las respuestas condicionales con ETag / Last-Modified.
+
+La versión es un token aleatorio más la hora en que se generó, guardados en
+la caché. Se renueva al confirmar cualquier escritura del catálogo (ver
+signals.py y ajustar_stock_lote), así que comprobar si un cliente tiene la
+última versión cuesta una lectura de la caché y ninguna consulta.
+"""
+import time
+import uuid
+
+from django.core.cache import cache
+
+CLAVE_VERSION = 'catalogo:version'
+
+
+def version():
+    """(token, timestamp) de la versión actual del catálogo"""
+    actual = cache.get(CLAVE_VERSION)
+    if actual is None:
+        cache.add(CLAVE_VERSION, (uuid.uuid4().hex, time.time()), None)
+        actual = cache.get(CLAVE_VERSION)
+    return actual
+
+
+def invalidar():
+    cache.set(CLAVE_VERSION, (uuid.uuid4().hex, time.time()), None)
@@ -0,0 +1,89 @@
+"""
+Caché de las respuestas de reportes.
+
+Las claves incluyen una versión global que se renueva cada vez que se crea,
+edita o elimina una venta (ver signals.py), así que una escritura invalida
+todos los reportes a la vez sin tener que recorrer claves. La versión es un
+token aleatorio, no un contador, para que dos invalidaciones concurrentes
+nunca dejen la misma versión en backends sin incremento atómico.
+"""
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+CLAVE_VERSION = 'reportes:version'
+CLAVE_ACIERTOS = 'reportes:aciertos'
+CLAVE_FALLOS = 'reportes:fallos'
+CLAVE_INVALIDACIONES = 'reportes:invalidaciones'
+
+
+def _version():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, uuid.uuid4().hex, None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def _contar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, 1, None)
+
+
+def firma(parametros):
+    return hashlib.sha1(json.dumps(parametros, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def clave(nombre, parametros):
+    """
+    Clave del reporte con la versión actual. Se obtiene antes de calcularlo:
+    si entretanto se registra una venta el resultado queda en una versión vieja.
+    """
+    return f'reportes:{_version()}:{nombre}:{firma(parametros)}'
+
+
+def buscar(clave_reporte):
+    valor = cache.get(clave_reporte)
+    _contar(CLAVE_ACIERTOS if valor is not None else CLAVE_FALLOS)
+    return valor
+
+
+def guardar(clave_reporte, valor):
+    cache.set(clave_reporte, valor, settings.REPORTES_CACHE_TTL)
+
+
+def obtener(nombre, parametros, calcular):
+    """
+    Devuelve el reporte ``nombre`` para ``parametros`` desde la caché o lo
+    calcula con ``calcular()`` y lo guarda.
+    """
+    clave_reporte = clave(nombre, parametros)
+    valor = buscar(clave_reporte)
+    if valor is None:
+        valor = calcular()
+        guardar(clave_reporte, valor)
+    return valor
+
+
+def invalidar():
+    """Descarta todos los reportes en caché"""
+    cache.set(CLAVE_VERSION, uuid.uuid4().hex, None)
+    _contar(CLAVE_INVALIDACIONES)
+
+
+def estadisticas():
+    valores = cache.get_many([CLAVE_ACIERTOS, CLAVE_FALLOS, CLAVE_INVALIDACIONES])
+    aciertos = valores.get(CLAVE_ACIERTOS, 0)
+    fallos = valores.get(CLAVE_FALLOS, 0)
+    return {
+        "backend": settings.CACHES['default']['BACKEND'],
+        "aciertos": aciertos,
+        "fallos": fallos,
+        "invalidaciones": valores.get(CLAVE_INVALIDACIONES, 0),
+        "tasa_aciertos": round(aciertos / (aciertos + fallos), 4) if aciertos + fallos else None,
+    }
@@ -0,0 +1,135 @@
+"""
+Registro de consultas lentas.
+
+Cada conexión (ver signals.conexion_creada) lleva un execute_wrapper que
+mide cada sentencia. Las que tardan CONSULTAS_LENTAS_MS o más se escriben,
+una por línea en JSON, en el logger ``inventario.consultas_lentas`` (un
+ArchivoConsultasLentas configurado en settings.LOGGING) con:
+
+- la vista que la originó (ProductoViewSet.list, VentaViewSet.reportes_resumen...);
+- el SQL, su huella (el SQL sin la cantidad de elementos de los IN) y los
+  tipos de los parámetros (no sus valores);
+- el plan: EXPLAIN QUERY PLAN en SQLite y EXPLAIN en PostgreSQL.
+
+``python manage.py resumen_consultas_lentas`` agrupa el archivo por huella
+y ordena por tiempo total.
+"""
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import re
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metricas
+
+logger = logging.getLogger('inventario.consultas_lentas')
+
+_explicando = contextvars.ContextVar('explicando', default=False)
+
+EXPLICABLES = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+_LISTA_PARAMETROS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_FILAS_REPETIDAS = re.compile(r'(\(%s, \.\.\.\))(?:, \(%s, \.\.\.\))+')
+_ESPACIOS = re.compile(r'\s+')
+
+
+class ArchivoConsultasLentas(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler que crea la carpeta del archivo al abrirlo, con la
+    primera consulta lenta, y no al importar settings (tests, check, collectstatic).
+    """
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def instalar(connection):
+    if registrar not in connection.execute_wrappers:
+        connection.execute_wrappers.append(registrar)
+
+
+def huella(sql):
+    """SQL normalizado para agrupar: IN (%s, %s, ...) y VALUES de varias filas cuentan como una sola forma"""
+    normalizado = _FILAS_REPETIDAS.sub(r'\1, ...', _LISTA_PARAMETROS.sub('(%s, ...)', sql))
+    return _ESPACIOS.sub(' ', normalizado).strip()
+
+
+def forma_parametros(params, many):
+    if many:
+        params = list(params or [])
+        return {'filas': len(params), 'primera': forma_parametros(params[0], False) if params else []}
+    if isinstance(params, dict):
+        return {clave: type(valor).__name__ for clave, valor in params.items()}
+    # Tipos consecutivos iguales (los de un IN) se compactan: ['int x50', 'str']
+    compacto = []
+    for tipo, repetidos in itertools.groupby(type(valor).__name__ for valor in params or ()):
+        cantidad = sum(1 for _ in repetidos)
+        compacto.append(tipo if cantidad == 1 else f'{tipo} x{cantidad}')
+    return compacto
+
+
+def registrar(execute, sql, params, many, context):
+    umbral = settings.CONSULTAS_LENTAS_MS
+    if not umbral or _explicando.get():
+        return execute(sql, params, many, context)
+
+    inicio = time.perf_counter()
+    resultado = execute(sql, params, many, context)
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    if duracion_ms >= umbral:
+        conexion = context['connection']
+        logger.warning(json.dumps({
+            'fecha': timezone.now().isoformat(),
+            'duracion_ms': round(duracion_ms, 2),
+            'vista': metricas.vista_actual(),
+            'base_de_datos': conexion.vendor,
+            'huella': huella(sql),
+            'sql': sql,
+            'parametros': forma_parametros(params, many),
+            'plan': None if many else explicar(conexion, sql, params),
+        }, ensure_ascii=False, default=str))
+    return resultado
+
+
+def explicar(conexion, sql, params):
+    """Plan de ``sql`` o None; nunca interrumpe la consulta que se está registrando"""
+    if not sql.lstrip().upper().startswith(EXPLICABLES):
+        return None
+    if conexion.vendor == 'sqlite':
+        prefijo = 'EXPLAIN QUERY PLAN '
+    elif conexion.vendor == 'postgresql':
+        prefijo = 'EXPLAIN '
+    else:
+        return None
+
+    token = _explicando.set(True)
+    # En PostgreSQL un error aborta la transacción: se aísla en un savepoint
+    punto = conexion.savepoint() if conexion.vendor == 'postgresql' and conexion.in_atomic_block else None
+    try:
+        # create_cursor() no pasa por los execute_wrappers (ni cuenta en las métricas)
+        cursor = conexion.create_cursor()
+        try:
+            cursor.execute(prefijo + sql, params)
+            filas = cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception:
+        if punto:
+            conexion.savepoint_rollback(punto)
+        return None
+    else:
+        if punto:
+            conexion.savepoint_commit(punto)
+    finally:
+        _explicando.reset(token)
+
+    if conexion.vendor == 'sqlite':
+        # (id, padre, no usado, detalle)
+        return [fila[-1] for fila in filas]
+    return [fila[0] for fila in filas]
@@ -0,0 +1,105 @@
+"""
+Difusión de cambios de stock a los clientes conectados por Server-Sent Events.
+
+El reparto es en el mismo proceso: cada conexión abierta en
+GET /api/stock/eventos/ tiene una cola asyncio en el event loop del servidor
+ASGI, y las escrituras de stock (ventas y movimientos, vía ajustar_stock_lote)
+publican al confirmar su transacción. Si no hay nadie conectado no se publica
+ni se consulta nada; si lo hay, cada transacción cuesta una consulta sin
+importar cuántos clientes estén escuchando.
+
+Con varios procesos (workers) cada uno solo reparte los cambios que escribe
+él mismo, así que el servidor ASGI debe correr con un único worker.
+"""
+import asyncio
+import itertools
+import json
+import threading
+
+TAMANO_COLA = 256
+# Comentario de latido si no hay eventos, y espera que se sugiere al cliente para reconectar
+LATIDO_SEGUNDOS = 15
+REINTENTO_MS = 3000
+
+
+class Suscripcion:
+    def __init__(self, loop):
+        self.loop = loop
+        self.cola = asyncio.Queue(maxsize=TAMANO_COLA)
+
+
+class Difusor:
+    """Conjunto de suscripciones; ``publicar`` se puede llamar desde cualquier hilo"""
+
+    def __init__(self):
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+        self._secuencia = itertools.count(1)
+
+    def suscribir(self):
+        suscripcion = Suscripcion(asyncio.get_running_loop())
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def hay_suscriptores(self):
+        return bool(self._suscripciones)
+
+    def publicar(self, tipo, datos):
+        mensaje = formatear(tipo, datos, next(self._secuencia))
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            try:
+                suscripcion.loop.call_soon_threadsafe(_entregar, suscripcion.cola, mensaje)
+            except RuntimeError:
+                # El loop ya se cerró: la conexión no volverá a leer
+                self.cancelar(suscripcion)
+
+
+def _entregar(cola, mensaje):
+    if cola.full():
+        # Cliente lento: se descartan sus eventos pendientes y se le pide recargar
+        while not cola.empty():
+            cola.get_nowait()
+        mensaje = formatear('resync', {})
+    cola.put_nowait(mensaje)
+
+
+def formatear(tipo, datos, identificador=None):
+    lineas = [f'event: {tipo}']
+    if identificador is not None:
+        lineas.append(f'id: {identificador}')
+    lineas.append(f'data: {json.dumps(datos, default=str)}')
+    return '\n'.join(lineas) + '\n\n'
+
+
+difusor = Difusor()
+
+
+def publicar_stock(ids_productos, ids_variantes=()):
+    """Lee el stock resultante de los productos (y variantes) ajustados y lo difunde"""
+    if not difusor.hay_suscriptores():
+        return
+    # Importación local: models usa este módulo desde ajustar_stock_lote
+    from .models import Producto, ProductoVariante
+
+    variantes = {}
+    if ids_variantes:
+        filas = ProductoVariante.objects.filter(pk__in=ids_variantes).values_list('producto_id', 'id', 'stock')
+        for producto_id, variante_id, stock in filas:
+            variantes.setdefault(producto_id, {})[variante_id] = stock
+
+    for producto_id, stock, estado in Producto.objects.filter(pk__in=ids_productos).values_list(
+        'id', 'stock_actual', 'estado'
+    ):
+        difusor.publicar('stock', {
+            'producto': producto_id,
+            'stock_actual': stock,
+            'estado': estado,
+            'variantes': variantes.get(producto_id, {}),
+        })
@@ -0,0 +1,133 @@
+"""
+Exportación en streaming de ventas y movimientos a CSV o NDJSON.
+
+Las filas se leen con QuerySet.iterator() (cursor del lado del servidor en
+PostgreSQL) y se escriben en bloques a un StreamingHttpResponse, así que la
+memoria usada no depende del rango exportado. Bajo ASGI el generador se
+entrega como iterador asíncrono: Django 4.2 cargaría entero en memoria un
+iterador síncrono (sync_to_async(list)) antes de enviarlo.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import DetalleVenta, MovimientoInventario
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+FILAS_POR_BLOQUE = 500
+FILAS_POR_CONSULTA = 2000
+
+COLUMNAS_VENTAS = [
+    ('venta_id', 'venta_id'),
+    ('fecha', 'venta__fecha'),
+    ('canal_venta', 'venta__canal_venta'),
+    ('empleado_id', 'venta__empleado_id'),
+    ('empleado_nombre', 'venta__empleado__user__first_name'),
+    ('empleado_apellido', 'venta__empleado__user__last_name'),
+    ('venta_subtotal', 'venta__subtotal'),
+    ('venta_descuento', 'venta__descuento'),
+    ('venta_total', 'venta__total'),
+    ('detalle_id', 'id'),
+    ('producto_id', 'producto_id'),
+    ('producto_nombre', 'producto__nombre'),
+    ('cantidad', 'cantidad'),
+    ('precio_unitario', 'precio_unitario'),
+    ('subtotal', 'subtotal'),
+]
+
+COLUMNAS_MOVIMIENTOS = [
+    ('id', 'id'),
+    ('fecha', 'fecha'),
+    ('tipo', 'tipo'),
+    ('producto_id', 'producto_id'),
+    ('producto_nombre', 'producto__nombre'),
+    ('cantidad', 'cantidad'),
+    ('empleado_id', 'empleado_id'),
+    ('motivo', 'motivo'),
+]
+
+
+def rango_fechas(desde, hasta):
+    """Convierte fechas locales YYYY-MM-DD (ambas incluidas) en límites datetime"""
+    limites = {}
+    if desde:
+        limites['gte'] = timezone.make_aware(datetime.combine(date.fromisoformat(desde), time.min))
+    if hasta:
+        limites['lt'] = timezone.make_aware(
+            datetime.combine(date.fromisoformat(hasta) + timedelta(days=1), time.min)
+        )
+    return limites
+
+
+def filas_ventas(limites):
+    consulta = DetalleVenta.objects.order_by('venta__fecha', 'venta_id', 'id')
+    for operador, valor in limites.items():
+        consulta = consulta.filter(**{f'venta__fecha__{operador}': valor})
+    return consulta.values_list(*[campo for _, campo in COLUMNAS_VENTAS]).iterator(chunk_size=FILAS_POR_CONSULTA)
+
+
+def filas_movimientos(limites):
+    consulta = MovimientoInventario.objects.order_by('fecha', 'id')
+    for operador, valor in limites.items():
+        consulta = consulta.filter(**{f'fecha__{operador}': valor})
+    return consulta.values_list(*[campo for _, campo in COLUMNAS_MOVIMIENTOS]).iterator(chunk_size=FILAS_POR_CONSULTA)
+
+
+def _valor(valor):
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).isoformat()
+    return valor
+
+
+def _bloques_csv(columnas, filas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow([nombre for nombre, _ in columnas])
+    for numero, fila in enumerate(filas, start=1):
+        escritor.writerow([_valor(valor) for valor in fila])
+        if numero % FILAS_POR_BLOQUE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _bloques_ndjson(columnas, filas):
+    nombres = [nombre for nombre, _ in columnas]
+    bloque = []
+    for fila in filas:
+        bloque.append(json.dumps(dict(zip(nombres, map(_valor, fila))), default=str, ensure_ascii=False))
+        if len(bloque) == FILAS_POR_BLOQUE:
+            yield '\n'.join(bloque) + '\n'
+            bloque = []
+    if bloque:
+        yield '\n'.join(bloque) + '\n'
+
+
+async def _bloques_asincronos(bloques):
+    """
+    Recorre el generador síncrono bloque a bloque en el hilo de la petición
+    (thread_sensitive), el mismo que abrió la conexión y el cursor de la BD.
+    """
+    siguiente = sync_to_async(next, thread_sensitive=True)
+    fin = object()
+    while (bloque := await siguiente(bloques, fin)) is not fin:
+        yield bloque
+
+
+def respuesta_streaming(request, columnas, filas, formato, nombre_archivo):
+    bloques = _bloques_csv(columnas, filas) if formato == 'csv' else _bloques_ndjson(columnas, filas)
+    if isinstance(request, ASGIRequest):
+        bloques = _bloques_asincronos(bloques)
+    respuesta = StreamingHttpResponse(bloques, content_type=FORMATOS[formato])
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.{formato}"'
+    return respuesta
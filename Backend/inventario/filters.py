@@ -1,5 +1,6 @@
 import django_filters
-from .models import Producto
+from .models import Producto, ProductoVariante, normalizar_color, normalizar_talla
+from . import busqueda
 
 class ProductoFilter(django_filters.FilterSet):
     """
@@ -26,8 +27,16 @@ class ProductoFilter(django_filters.FilterSet):
     precio_max = django_filters.NumberFilter(field_name='precio_unitario', lookup_expr='lte')
     stock_min = django_filters.NumberFilter(field_name='stock_actual', lookup_expr='gte')
     stock_max = django_filters.NumberFilter(field_name='stock_actual', lookup_expr='lte')
-    tallas = django_filters.CharFilter(field_name='tallas', lookup_expr='icontains')
-    colores = django_filters.CharFilter(field_name='colores', lookup_expr='icontains')
+    # Talla y color exactos (uno o varios separados por comas) sobre las
+    # variantes: "Azul" ya no coincide con "Azul marino"
+    tallas = django_filters.CharFilter(method='filtrar_variantes')
+    colores = django_filters.CharFilter(method='filtrar_variantes')
+    # Estado del stock (en_stock, bajo_stock, agotado), servido por índice
+    estado = django_filters.ChoiceFilter(choices=Producto.ESTADO_CHOICES)
+    # Búsqueda por texto completo (nombre, descripción, categoría y colección),
+    # por prefijo y ordenada por relevancia. Servida por el índice FTS5 (SQLite)
+    # o tsvector (PostgreSQL).
+    q = django_filters.CharFilter(method='filtrar_busqueda')
 
     class Meta:
         model = Producto
@@ -35,5 +44,18 @@ class ProductoFilter(django_filters.FilterSet):
             'nombre', 'categoria', 'coleccion',
             'precio_min', 'precio_max',
             'stock_min', 'stock_max',
-            'tallas', 'colores'
+            'tallas', 'colores', 'estado', 'q'
         ]
+
+    def filtrar_variantes(self, queryset, name, value):
+        campo, normalizar = ('talla', normalizar_talla) if name == 'tallas' else ('color', normalizar_color)
+        valores = [normalizar(valor) for valor in value.split(',') if valor.strip()]
+        if not valores:
+            return queryset
+        # Subconsulta sobre el índice (talla|color, producto): sin DISTINCT ni filas repetidas
+        return queryset.filter(pk__in=ProductoVariante.objects.filter(
+            **{f'{campo}__in': valores}
+        ).values('producto_id'))
+
+    def filtrar_busqueda(self, queryset, name, value):
+        return busqueda.buscar(queryset, value)
@@ -0,0 +1,102 @@
+"""
+Stock de los productos en cualquier fecha.
+
+Cada cambio de stock queda en RegistroStock (solo se agregan filas) y
+``crear_corte()`` guarda cada cierto tiempo el stock de todos los productos
+en CorteStock (``python manage.py crear_corte_stock``, desde cron). El stock
+en un instante es el del último corte anterior más los deltas posteriores
+al corte:
+
+- ``stock_en(producto_id, momento)``: una lectura del corte del producto y una
+  suma de sus deltas (índice producto, fecha, delta);
+- ``stock_todos_en(momento)``: una lectura del corte completo y una suma de
+  deltas agrupada por producto (índice fecha, producto, delta).
+
+Sin cortes las sumas recorren el historial entero: el resultado es el mismo,
+solo más lento. Las variantes no tienen cortes: ``stock_variante_en()`` suma
+sus delta_variante (índice variante, fecha, delta_variante).
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Subquery, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import CorteStock, RegistroStock
+
+
+def leer_momento(texto):
+    """
+    ISO 8601 -> datetime con zona horaria. Una fecha sin hora es el final de
+    ese día (hora local). Sin texto es ahora. ValueError si no se entiende.
+    """
+    if not texto:
+        return timezone.now()
+    # Primero la fecha sola: parse_datetime la aceptaría como medianoche
+    dia = parse_date(texto)
+    momento = datetime.combine(dia, time.max) if dia else parse_datetime(texto)
+    if momento is None:
+        raise ValueError(f"Fecha inválida: {texto}")
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento
+
+
+def stock_en(producto_id, momento):
+    """(stock del producto en ``momento``, fecha del corte usado o None)"""
+    corte = (
+        CorteStock.objects.filter(producto_id=producto_id, fecha__lte=momento)
+        .order_by('-fecha').values_list('fecha', 'stock').first()
+    )
+    fecha_corte, stock = corte or (None, 0)
+
+    deltas = RegistroStock.objects.filter(producto_id=producto_id, fecha__lte=momento)
+    if fecha_corte is not None:
+        deltas = deltas.filter(fecha__gt=fecha_corte)
+    return stock + (deltas.aggregate(total=Sum('delta'))['total'] or 0), fecha_corte
+
+
+def stock_variante_en(variante_id, momento):
+    """Stock de la variante en ``momento``"""
+    deltas = RegistroStock.objects.filter(variante_id=variante_id, fecha__lte=momento)
+    return deltas.aggregate(total=Sum('delta_variante'))['total'] or 0
+
+
+def stock_todos_en(momento):
+    """({producto_id: stock} en ``momento``, fecha del corte usado o None)"""
+    # Una sola lectura: las filas del último corte anterior a ``momento``
+    fecha_ultimo = CorteStock.objects.filter(fecha__lte=momento).order_by('-fecha').values('fecha')[:1]
+    saldos = {}
+    ultimo = None
+    for producto_id, stock, ultimo in CorteStock.objects.filter(fecha=Subquery(fecha_ultimo)).values_list(
+        'producto_id', 'stock', 'fecha'
+    ):
+        saldos[producto_id] = stock
+
+    deltas = RegistroStock.objects.filter(fecha__lte=momento)
+    if ultimo is not None:
+        deltas = deltas.filter(fecha__gt=ultimo)
+    for producto_id, total in deltas.order_by().values_list('producto_id').annotate(total=Sum('delta')):
+        saldos[producto_id] = saldos.get(producto_id, 0) + total
+    return saldos, ultimo
+
+
+def crear_corte(fecha=None):
+    """
+    Guarda el stock de todos los productos en ``fecha`` (por defecto hace
+    STOCK_CORTES_MARGEN_SEGUNDOS: una venta que aún no confirma puede llevar
+    una fecha anterior a la de su commit). Devuelve los productos guardados.
+    """
+    if fecha is None:
+        fecha = timezone.now() - timedelta(seconds=settings.STOCK_CORTES_MARGEN_SEGUNDOS)
+    with transaction.atomic():
+        if CorteStock.objects.filter(fecha=fecha).exists():
+            return 0
+        saldos, _ = stock_todos_en(fecha)
+        CorteStock.objects.bulk_create(
+            [CorteStock(producto_id=producto_id, fecha=fecha, stock=stock) for producto_id, stock in saldos.items()],
+            batch_size=2000,
+        )
+    return len(saldos)
@@ -0,0 +1,171 @@
+"""
+Versiones reducidas de Producto.imagen.
+
+Al guardar un producto con una imagen nueva (signals.imagen_guardada) se
+programa, para cuando confirme la transacción, ``procesar`` en un
+ThreadPoolExecutor de IMAGENES_HILOS hilos (Pillow suelta el GIL al
+redimensionar y comprimir). Por cada tamaño de IMAGENES_TAMANOS (lado mayor en
+px, sin ampliar) se guardan una WebP y una JPEG progresiva junto a la original
+y sus nombres quedan en Producto.imagenes:
+
+    {"origen": "productos/blusa.jpg",
+     "miniatura": {"webp": "productos/derivadas/blusa-miniatura.webp", "jpeg": "..."}, ...}
+
+Mientras no estén listas (o si la imagen no se pudo leer) solo está ``origen``
+o el campo está vacío y el cliente usa la imagen original.
+``python manage.py procesar_imagenes`` genera las de las imágenes existentes.
+"""
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import cache_catalogo
+
+logger = logging.getLogger('inventario.imagenes')
+
+CARPETA = 'productos/derivadas'
+FORMATOS = ('webp', 'jpeg')
+
+_ejecutor = None
+_pendientes = set()
+_lock = threading.Lock()
+
+
+def _obtener_ejecutor():
+    global _ejecutor
+    with _lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=settings.IMAGENES_HILOS, thread_name_prefix='imagenes')
+        return _ejecutor
+
+
+def pendiente(producto):
+    """True si la imagen del producto todavía no tiene sus versiones reducidas"""
+    return (producto.imagen.name or '') != (producto.imagenes or {}).get('origen', '')
+
+
+def programar(producto):
+    """Procesa la imagen del producto en segundo plano cuando confirme la transacción"""
+    clave = (producto.pk, producto.imagen.name or '')
+
+    def enviar():
+        if not settings.IMAGENES_SEGUNDO_PLANO:
+            procesar(*clave)
+            return
+        with _lock:
+            if clave in _pendientes:
+                return
+            _pendientes.add(clave)
+        _obtener_ejecutor().submit(_procesar_en_hilo, *clave)
+
+    transaction.on_commit(enviar)
+
+
+def _procesar_en_hilo(producto_id, nombre):
+    try:
+        procesar(producto_id, nombre)
+    except Exception:
+        logger.exception("No se pudieron generar las imágenes del producto %s (%s)", producto_id, nombre)
+    finally:
+        with _lock:
+            _pendientes.discard((producto_id, nombre))
+        # Cada hilo del ejecutor abre su propia conexión
+        connection.close()
+
+
+def reducir(imagen, lado):
+    """Copia de ``imagen`` con el lado mayor en ``lado`` px como máximo"""
+    copia = imagen.copy()
+    copia.thumbnail((lado, lado), Image.LANCZOS)
+    return copia
+
+
+def codificar(imagen, formato):
+    salida = io.BytesIO()
+    if formato == 'webp':
+        imagen.save(salida, 'WEBP', quality=settings.IMAGENES_CALIDAD_WEBP, method=4)
+    else:
+        if imagen.mode != 'RGB':
+            # JPEG no tiene transparencia: se aplana sobre blanco
+            fondo = Image.new('RGB', imagen.size, 'white')
+            fondo.paste(imagen, mask=imagen.getchannel('A') if 'A' in imagen.getbands() else None)
+            imagen = fondo
+        imagen.save(salida, 'JPEG', quality=settings.IMAGENES_CALIDAD_JPEG, optimize=True, progressive=True)
+    return salida.getvalue()
+
+
+def generar(nombre):
+    """Genera y guarda las versiones de la imagen ``nombre``. Devuelve el dict para Producto.imagenes"""
+    with default_storage.open(nombre, 'rb') as archivo:
+        original = Image.open(archivo)
+        original = ImageOps.exif_transpose(original)
+        original = original.convert('RGBA' if 'A' in original.getbands() or 'transparency' in original.info else 'RGB')
+
+    base = PurePosixPath(nombre).stem
+    imagenes = {'origen': nombre}
+    for tamano, lado in settings.IMAGENES_TAMANOS.items():
+        reducida = reducir(original, lado)
+        imagenes[tamano] = {
+            formato: default_storage.save(
+                f'{CARPETA}/{base}-{tamano}.{"jpg" if formato == "jpeg" else formato}',
+                ContentFile(codificar(reducida, formato)),
+            )
+            for formato in FORMATOS
+        }
+    return imagenes
+
+
+def archivos(imagenes):
+    return [
+        nombre
+        for tamano, formatos in (imagenes or {}).items() if tamano != 'origen'
+        for nombre in formatos.values()
+    ]
+
+
+def procesar(producto_id, nombre):
+    """
+    Genera las versiones de ``nombre`` y las asigna al producto si su imagen
+    sigue siendo esa. Borra las versiones de la imagen anterior.
+    """
+    # Importación local: models importa los módulos del paquete al cargarse
+    from .models import Producto
+
+    anteriores = Producto.objects.filter(pk=producto_id).values_list('imagenes', flat=True).first()
+    imagenes = generar(nombre) if nombre else {}
+
+    actualizados = Producto.objects.filter(pk=producto_id, imagen=nombre).update(
+        imagenes=imagenes, fecha_actualizacion=timezone.now()
+    )
+    # Si la imagen cambió entretanto estas versiones ya no sirven
+    sobrantes = archivos(anteriores) if actualizados else archivos(imagenes)
+    for archivo in sobrantes:
+        default_storage.delete(archivo)
+    if actualizados:
+        cache_catalogo.invalidar()
+    return bool(actualizados)
+
+
+def urls(imagenes, request=None):
+    """{tamaño: {formato: url}} para el serializer; None si aún no hay versiones"""
+    tamanos = {tamano: formatos for tamano, formatos in (imagenes or {}).items() if tamano != 'origen'}
+    if not tamanos:
+        return None
+
+    def url(nombre):
+        ruta = default_storage.url(nombre)
+        return request.build_absolute_uri(ruta) if request is not None else ruta
+
+    return {
+        tamano: {formato: url(nombre) for formato, nombre in formatos.items()}
+        for tamano, formatos in tamanos.items()
+    }
@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from inventario.models import Venta
+from inventario.reportes import dias_sin_resumen, reconstruir_resumen
+
+
+def _tramos(dias):
+    """Agrupa una lista ordenada de días en rangos (desde, hasta) de días seguidos"""
+    tramos = []
+    for dia in dias:
+        if tramos and tramos[-1][1] + timedelta(days=1) == dia:
+            tramos[-1][1] = dia
+        else:
+            tramos.append([dia, dia])
+    return tramos
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el resumen diario de ventas (ResumenVentaDiaria) a partir de "
+        "las ventas registradas, mes a mes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial YYYY-MM-DD (por defecto la primera venta)')
+        parser.add_argument('--hasta', help='Fecha final YYYY-MM-DD (por defecto la última venta)')
+        parser.add_argument('--faltantes', action='store_true',
+                            help='Solo los días con ventas que faltan en el resumen (útil al desplegar)')
+
+    def handle(self, *args, **options):
+        if options['faltantes']:
+            tramos = _tramos(dias_sin_resumen())
+            if not tramos:
+                self.stdout.write("No faltan días en el resumen diario.")
+                return
+            for desde, hasta in tramos:
+                self.reconstruir(desde, hasta)
+            self.stdout.write(self.style.SUCCESS("Resumen diario completado."))
+            return
+
+        rango = Venta.objects.aggregate(primera=Min('fecha'), ultima=Max('fecha'))
+        if rango['primera'] is None:
+            self.stdout.write("No hay ventas registradas.")
+            return
+
+        try:
+            desde = date.fromisoformat(options['desde']) if options['desde'] else timezone.localdate(rango['primera'])
+            hasta = date.fromisoformat(options['hasta']) if options['hasta'] else timezone.localdate(rango['ultima'])
+        except ValueError as error:
+            raise CommandError(f"Fecha inválida: {error}")
+
+        self.reconstruir(desde, hasta)
+        self.stdout.write(self.style.SUCCESS("Resumen diario reconstruido."))
+
+    def reconstruir(self, desde, hasta):
+        inicio = desde
+        while inicio <= hasta:
+            siguiente_mes = (inicio.replace(day=1) + timedelta(days=32)).replace(day=1)
+            fin = min(siguiente_mes - timedelta(days=1), hasta)
+            filas = reconstruir_resumen(inicio, fin)
+            self.stdout.write(f"{inicio} a {fin}: {filas} filas")
+            inicio = fin + timedelta(days=1)
@@ -0,0 +1,184 @@
+import json
+import platform
+import random
+import statistics
+import time
+from datetime import date
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from inventario import cache_reportes
+from inventario.models import Categoria, Empleado, MovimientoInventario, Producto, ProductoVariante, Venta
+
+USUARIO = '__bench_api__'
+
+
+class Rollback(Exception):
+    """Revierte las escrituras de una petición del benchmark"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide las rutas reales de la API (URLconf, middleware, autenticación JWT, "
+        "permisos, serializers) con un cliente en proceso y escribe p50/p95/p99, "
+        "peticiones por segundo y consultas por petición en JSON. Las escrituras "
+        "(ventas, movimientos) se revierten. Sembrar antes con seed_synthetic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=200, help='Peticiones medidas por escenario')
+        parser.add_argument('--calentamiento', type=int, default=10)
+        parser.add_argument('--escenarios', help='Nombres separados por coma (por defecto todos)')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--salida', help='Archivo donde escribir el JSON (por defecto la salida estándar)')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['semilla'])
+        # Las ventas indican la variante para descontar también su stock
+        variantes = list(
+            ProductoVariante.objects.filter(producto__activo=True, stock__gt=10)
+            .values_list('producto_id', 'id', 'producto__precio_unitario')[:2000]
+        )
+        if not variantes:
+            raise CommandError("No hay productos con stock: ejecutar seed_synthetic primero.")
+        self.variantes = variantes
+        self.categorias = list(Categoria.objects.values_list('id', flat=True)[:50])
+        self.cliente = APIClient()
+        self.empleado = self._autenticar()
+
+        escenarios = self._escenarios()
+        if options['escenarios']:
+            nombres = [nombre.strip() for nombre in options['escenarios'].split(',')]
+            desconocidos = set(nombres) - escenarios.keys()
+            if desconocidos:
+                raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+            escenarios = {nombre: escenarios[nombre] for nombre in nombres}
+
+        resultado = {
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'entorno': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'base_de_datos': connection.vendor,
+            },
+            'datos': {
+                'productos': Producto.objects.count(),
+                'ventas': Venta.objects.count(),
+                'movimientos': MovimientoInventario.objects.count(),
+            },
+            'parametros': {'peticiones': options['peticiones'], 'calentamiento': options['calentamiento']},
+            'escenarios': {},
+        }
+        for nombre, peticion in escenarios.items():
+            self.stderr.write(f"{nombre}...")
+            resultado['escenarios'][nombre] = self._medir(peticion, options['peticiones'], options['calentamiento'])
+
+        salida = json.dumps(resultado, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(salida + '\n')
+        else:
+            self.stdout.write(salida)
+
+    def _autenticar(self):
+        """Administrador del benchmark con un JWT real obtenido de /api/token/"""
+        user, _ = User.objects.get_or_create(username=USUARIO, defaults={'is_staff': True, 'first_name': 'Bench'})
+        user.is_staff = True
+        user.set_password(USUARIO)
+        user.save()
+        empleado, _ = Empleado.objects.get_or_create(
+            user=user, defaults={'fecha_contratacion': date.today(), 'activo': True}
+        )
+        respuesta = self.cliente.post('/api/token/', {'username': USUARIO, 'password': USUARIO}, format='json')
+        if respuesta.status_code != 200:
+            raise CommandError(f"No se pudo obtener el token: {respuesta.status_code} {respuesta.content[:200]}")
+        self.cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {respuesta.data['access']}")
+        return empleado
+
+    # ---------- escenarios ----------
+    def _escenarios(self):
+        get = self.cliente.get
+        return {
+            'productos_listado': lambda: get('/api/productos/'),
+            'productos_filtro_estado': lambda: get('/api/productos/?estado=bajo_stock'),
+            'productos_filtro_talla_color': lambda: get('/api/productos/?tallas=M&colores=Negro'),
+            'productos_filtro_categoria': lambda: get(f'/api/productos/?categoria={self.rng.choice(self.categorias or [0])}'),
+            'productos_busqueda': lambda: get(f"/api/productos/?q={self.rng.choice(['blu', 'vest', 'seda cla', 'kimono'])}"),
+            'ventas_listado': lambda: get('/api/ventas/'),
+            'venta_crear': self._crear_venta,
+            'reportes_resumen': lambda: get('/api/ventas/reportes/resumen/?periodo=12m'),
+            'reportes_resumen_sin_cache': self._resumen_sin_cache,
+            'movimientos_listado': lambda: get('/api/movimientos-inventario/'),
+            'movimiento_crear': self._crear_movimiento,
+        }
+
+    def _revertido(self, peticion):
+        """Ejecuta la petición dentro de una transacción que se revierte"""
+        respuesta = None
+        try:
+            with transaction.atomic():
+                respuesta = peticion()
+                raise Rollback
+        except Rollback:
+            pass
+        return respuesta
+
+    def _crear_venta(self):
+        lineas = self.rng.sample(self.variantes, self.rng.randint(1, 4))
+        datos = {
+            'canal_venta': 'presencial',
+            'empleado': self.empleado.id,
+            'total': 0,
+            'detalles': [
+                {'producto': producto_id, 'variante': variante_id, 'cantidad': 1, 'precio_unitario': str(precio)}
+                for producto_id, variante_id, precio in lineas
+            ],
+        }
+        return self._revertido(lambda: self.cliente.post('/api/ventas/', datos, format='json'))
+
+    def _crear_movimiento(self):
+        producto_id, variante_id, _ = self.rng.choice(self.variantes)
+        datos = {'producto': producto_id, 'variante': variante_id, 'tipo': 'entrada', 'cantidad': 5, 'motivo': 'bench'}
+        return self._revertido(lambda: self.cliente.post('/api/movimientos-inventario/', datos, format='json'))
+
+    def _resumen_sin_cache(self):
+        cache_reportes.invalidar()
+        return self.cliente.get('/api/ventas/reportes/resumen/?periodo=12m')
+
+    # ---------- medición ----------
+    def _medir(self, peticion, peticiones, calentamiento):
+        # Las consultas se cuentan en el calentamiento para no cargar la medición
+        consultas = []
+        estados = set()
+        for _ in range(max(calentamiento, 1)):
+            with CaptureQueriesContext(connection) as capturadas:
+                respuesta = peticion()
+            consultas.append(len(capturadas))
+            estados.add(respuesta.status_code)
+
+        tiempos = []
+        inicio = time.perf_counter()
+        for _ in range(peticiones):
+            t0 = time.perf_counter()
+            respuesta = peticion()
+            tiempos.append((time.perf_counter() - t0) * 1000)
+            estados.add(respuesta.status_code)
+        total = time.perf_counter() - inicio
+
+        percentiles = statistics.quantiles(tiempos, n=100, method='inclusive') if len(tiempos) > 1 else tiempos * 99
+        return {
+            'peticiones': peticiones,
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+            'media_ms': round(statistics.fmean(tiempos), 2),
+            'max_ms': round(max(tiempos), 2),
+            'peticiones_por_segundo': round(peticiones / total, 1),
+            'consultas': {'min': min(consultas), 'max': max(consultas)},
+            'estados_http': sorted(estados),
+        }
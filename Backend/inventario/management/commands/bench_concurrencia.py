@@ -0,0 +1,160 @@
+import json
+import random
+import statistics
+import threading
+import time
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from rest_framework.exceptions import ValidationError
+
+from inventario import sqlite
+from inventario.models import Empleado, Producto
+from inventario.serializers import CrearVentaSerializer, MovimientoInventarioSerializer
+
+USUARIO = '__bench_concurrencia__'
+
+
+class Command(BaseCommand):
+    help = (
+        "Escrituras concurrentes sostenidas: varios hilos registran ventas y "
+        "movimientos (por los mismos serializers que la API) durante unos segundos "
+        "y se informa escrituras por segundo, latencias, reintentos por "
+        "'database is locked' y escrituras fallidas. Escribe datos reales: "
+        "usar sobre una base sembrada con seed_synthetic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--segundos', type=float, default=10)
+        parser.add_argument('--movimientos', type=float, default=0.2,
+                            help='Fracción de escrituras que son movimientos de inventario')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--forzar', action='store_true',
+                            help='Permite ejecutarlo con DEBUG=False')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['forzar']:
+            raise CommandError("DEBUG=False: parece producción. Usa --forzar si de verdad es una base de pruebas.")
+
+        self.productos = list(
+            Producto.objects.filter(activo=True, stock_actual__gt=0)
+            .order_by('-stock_actual').values_list('id', 'precio_unitario')[:500]
+        )
+        if not self.productos:
+            raise CommandError("No hay productos con stock suficiente: ejecutar seed_synthetic primero.")
+        self.empleado = self._empleado()
+        self.fraccion_movimientos = options['movimientos']
+
+        self.tiempos = []
+        self.fallidas = 0
+        self.rechazadas = 0
+        self.lock = threading.Lock()
+        reintentos_antes = sqlite.reintentos_realizados()
+        fin = time.perf_counter() + options['segundos']
+
+        hilos = [
+            threading.Thread(target=self._trabajar, args=(fin, random.Random(options['semilla'] + numero)))
+            for numero in range(options['hilos'])
+        ]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        total = time.perf_counter() - inicio
+
+        tiempos = self.tiempos or [0]
+        percentiles = statistics.quantiles(tiempos, n=100, method='inclusive') if len(tiempos) > 1 else tiempos * 99
+        resultado = {
+            'base_de_datos': connection.vendor,
+            'pragmas': self._pragmas(),
+            'parametros': {'hilos': options['hilos'], 'segundos': options['segundos']},
+            'escrituras': len(self.tiempos),
+            'escrituras_por_segundo': round(len(self.tiempos) / total, 1),
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+            'max_ms': round(max(tiempos), 2),
+            'reintentos': sqlite.reintentos_realizados() - reintentos_antes,
+            'fallidas_por_bloqueo': self.fallidas,
+            'rechazadas': self.rechazadas,
+        }
+        self.stdout.write(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+    def _empleado(self):
+        user, _ = User.objects.get_or_create(username=USUARIO, defaults={'first_name': 'Bench'})
+        empleado, _ = Empleado.objects.get_or_create(
+            user=user, defaults={'fecha_contratacion': date.today(), 'activo': True}
+        )
+        return empleado
+
+    def _pragmas(self):
+        if connection.vendor != 'sqlite':
+            return {}
+        with connection.cursor() as cursor:
+            valores = {}
+            for pragma in ('journal_mode', 'busy_timeout', 'synchronous'):
+                cursor.execute(f'PRAGMA {pragma}')
+                valores[pragma] = cursor.fetchone()[0]
+        return valores
+
+    def _trabajar(self, fin, rng):
+        try:
+            while time.perf_counter() < fin:
+                escritura = self._movimiento if rng.random() < self.fraccion_movimientos else self._venta
+                t0 = time.perf_counter()
+                try:
+                    creada = escritura(rng)
+                except OperationalError as error:
+                    if not sqlite.es_bloqueo(error):
+                        raise
+                    with self.lock:
+                        self.fallidas += 1
+                    continue
+                duracion = (time.perf_counter() - t0) * 1000
+                with self.lock:
+                    if creada:
+                        self.tiempos.append(duracion)
+                    else:
+                        self.rechazadas += 1
+        finally:
+            # Cada hilo tiene su propia conexión
+            connections.close_all()
+
+    def _venta(self, rng):
+        lineas = rng.sample(self.productos, rng.randint(1, 3))
+        serializer = CrearVentaSerializer(data={
+            'canal_venta': 'presencial',
+            'empleado': self.empleado.id,
+            'total': 0,
+            'detalles': [
+                {'producto': producto_id, 'cantidad': 1, 'precio_unitario': str(precio)}
+                for producto_id, precio in lineas
+            ],
+        })
+        if not serializer.is_valid():
+            return False
+        try:
+            serializer.save()
+        except ValidationError:
+            # Stock insuficiente
+            return False
+        return True
+
+    def _movimiento(self, rng):
+        producto_id, _ = rng.choice(self.productos)
+        serializer = MovimientoInventarioSerializer(data={
+            'producto': producto_id, 'tipo': 'entrada', 'cantidad': 3, 'motivo': 'bench',
+        })
+        if not serializer.is_valid():
+            return False
+        try:
+            serializer.save()
+        except ValidationError:
+            # Stock insuficiente
+            return False
+        return True
@@ -0,0 +1,81 @@
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from inventario.models import Categoria, Empleado, Producto
+from inventario.serializers import CrearVentaSerializer
+
+
+class Rollback(Exception):
+    """Fuerza el rollback de los datos creados por el benchmark"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide consultas y latencia de CrearVentaSerializer.create según el número "
+        "de líneas de la venta. Los datos se crean en una transacción que se revierte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lineas', default='1,5,10,30,100',
+                            help='Cantidades de líneas a medir, separadas por coma')
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        lineas = [int(n) for n in options['lineas'].split(',') if n.strip()]
+        repeticiones = options['repeticiones']
+
+        self.stdout.write(f"{'lineas':>8} {'consultas':>10} {'ms_prom':>10} {'ms_max':>10}")
+        try:
+            with transaction.atomic():
+                empleado, productos = self._preparar_datos(max(lineas))
+                for n in lineas:
+                    consultas, tiempos = self._medir(empleado, productos[:n], repeticiones)
+                    self.stdout.write(
+                        f"{n:>8} {consultas:>10} "
+                        f"{sum(tiempos) / len(tiempos):>10.2f} {max(tiempos):>10.2f}"
+                    )
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _preparar_datos(self, cantidad):
+        user = User.objects.create_user(username='__bench_venta__', password=None)
+        empleado = Empleado.objects.create(user=user, fecha_contratacion=date.today())
+        categoria = Categoria.objects.create(nombre='__bench_venta__')
+        productos = Producto.objects.bulk_create([
+            Producto(
+                nombre=f'Bench {i}', categoria=categoria, tallas='M',
+                precio_unitario=Decimal('10.00'), stock_actual=10 ** 6, estado='en_stock',
+            )
+            for i in range(cantidad)
+        ])
+        return empleado, productos
+
+    def _medir(self, empleado, productos, repeticiones):
+        datos = {
+            'canal_venta': 'presencial',
+            'empleado': empleado.pk,
+            'total': '0',
+            'detalles': [
+                {'producto': p.pk, 'cantidad': 1, 'precio_unitario': '10.00'}
+                for p in productos
+            ],
+        }
+        tiempos = []
+        consultas = 0
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                serializer = CrearVentaSerializer(data=datos)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                serializer.data
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas = len(capturadas)
+        return consultas, tiempos
@@ -0,0 +1,118 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from inventario.models import (
+    Producto, Venta, DetalleVenta, MovimientoInventario, Cliente
+)
+from inventario.sintetico import sembrar_catalogo, sembrar_ventas
+
+# Índices agregados por las migraciones 0005 y 0006
+INDICES = {
+    Producto: ['producto_activo_estado_idx', 'producto_activo_nombre_idx'],
+    Cliente: ['cliente_activo_nombre_idx'],
+    Venta: ['venta_fecha_idx'],
+    MovimientoInventario: ['movimiento_fecha_idx', 'movimiento_producto_fecha_idx'],
+}
+
+
+def consultas_calientes():
+    """Formas de consulta más frecuentes de la API, como querysets sin evaluar"""
+    hace_30_dias = timezone.now() - timedelta(days=30)
+    hace_365_dias = timezone.now() - timedelta(days=365)
+    producto = Producto.objects.order_by('pk').first()
+    return {
+        'ventas_listado': Venta.objects.order_by('-fecha')[:100],
+        'ventas_rango_30d': Venta.objects.filter(fecha__gte=hace_30_dias).order_by().values_list('total'),
+        'top_productos_365d': (
+            DetalleVenta.objects.filter(venta__fecha__gte=hace_365_dias)
+            .values('producto__id', 'producto__nombre')
+            .annotate(cantidad_vendida=Sum('cantidad'), ingresos=Sum('subtotal'))
+            .order_by('-cantidad_vendida')[:5]
+        ),
+        'movimientos_listado': MovimientoInventario.objects.order_by('-fecha')[:100],
+        'movimientos_producto': MovimientoInventario.objects.filter(producto=producto).order_by('-fecha')[:50],
+        'productos_activos': Producto.objects.filter(activo=True).order_by('nombre')[:100],
+        'productos_agotados': Producto.objects.filter(activo=True, estado='agotado')[:100],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Muestra el plan (EXPLAIN) y la latencia de las consultas más frecuentes. "
+        "Con --comparar las mide sin y con los índices de la migración 0006. "
+        "Usar sobre una base de datos de pruebas: --sembrar-ventas inserta datos sintéticos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sembrar-ventas', type=int, default=0,
+                            help='Ventas sintéticas a crear antes de medir (p. ej. 1000000)')
+        parser.add_argument('--productos', type=int, default=10000)
+        parser.add_argument('--empleados', type=int, default=50)
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--comparar', action='store_true',
+                            help='Elimina temporalmente los índices para medir el "antes"')
+
+    def handle(self, *args, **options):
+        if options['sembrar_ventas']:
+            rng = random.Random(options['semilla'])
+            self.stdout.write(f"Sembrando {options['sembrar_ventas']} ventas...")
+            productos, empleados = sembrar_catalogo(options['productos'], options['empleados'], rng)
+            sembrar_ventas(
+                options['sembrar_ventas'], productos, empleados, rng,
+                movimientos=options['sembrar_ventas'] // 2,
+            )
+            self._analizar()
+
+        if options['comparar']:
+            self._quitar_indices()
+            try:
+                self._analizar()
+                self._medir('SIN ÍNDICES', options['repeticiones'])
+            finally:
+                self._crear_indices()
+            self._analizar()
+        self._medir('CON ÍNDICES', options['repeticiones'])
+
+    def _indices(self):
+        for modelo, nombres in INDICES.items():
+            por_nombre = {index.name: index for index in modelo._meta.indexes}
+            for nombre in nombres:
+                yield modelo, por_nombre[nombre]
+
+    def _quitar_indices(self):
+        with connection.schema_editor() as editor:
+            for modelo, index in self._indices():
+                editor.remove_index(modelo, index)
+
+    def _crear_indices(self):
+        with connection.schema_editor() as editor:
+            for modelo, index in self._indices():
+                editor.add_index(modelo, index)
+
+    def _analizar(self):
+        """Actualiza las estadísticas del planificador"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _medir(self, titulo, repeticiones):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n===== {titulo} ====="))
+        for nombre, consulta in consultas_calientes().items():
+            plan = consulta.explain()
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                list(consulta.all())
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+
+            self.stdout.write(self.style.SUCCESS(
+                f"\n{nombre}: mediana {statistics.median(tiempos):.2f} ms"
+            ))
+            self.stdout.write(plan)
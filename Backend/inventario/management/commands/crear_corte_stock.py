@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario import historial_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda un corte con el stock de todos los productos (CorteStock). Las "
+        "consultas de stock en una fecha parten del último corte anterior, así "
+        "que conviene ejecutarlo periódicamente (por ejemplo cada noche desde cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Instante del corte en ISO 8601 (por defecto ahora menos el margen)')
+
+    def handle(self, *args, **options):
+        fecha = None
+        if options['fecha']:
+            try:
+                fecha = historial_stock.leer_momento(options['fecha'])
+            except ValueError as error:
+                raise CommandError(str(error))
+
+        productos = historial_stock.crear_corte(fecha)
+        self.stdout.write(self.style.SUCCESS(f"Corte de stock guardado: {productos} productos."))
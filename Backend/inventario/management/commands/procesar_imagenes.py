@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from inventario import imagenes
+from inventario.models import Producto
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera las versiones reducidas (WebP y JPEG de cada tamaño de "
+        "IMAGENES_TAMANOS) de las imágenes de productos que aún no las tienen."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true',
+                            help='Vuelve a generar también las que ya tienen versiones')
+        parser.add_argument('--hilos', type=int, default=settings.IMAGENES_HILOS,
+                            help='0 las procesa en el hilo principal')
+
+    def handle(self, *args, **options):
+        trabajos = [
+            (producto_id, nombre)
+            for producto_id, nombre, derivadas in Producto.objects.exclude(imagen='').exclude(imagen=None)
+            .order_by('id').values_list('id', 'imagen', 'imagenes').iterator()
+            if options['todas'] or nombre != (derivadas or {}).get('origen')
+        ]
+        self.stdout.write(f"{len(trabajos)} imágenes por procesar.")
+
+        procesadas = fallidas = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['hilos'])) as ejecutor:
+            if options['hilos'] > 0:
+                errores = ejecutor.map(self._procesar_en_hilo, trabajos)
+            else:
+                errores = map(self._procesar, trabajos)
+            for (producto_id, nombre), error in zip(trabajos, errores):
+                if error:
+                    fallidas += 1
+                    self.stderr.write(f"Producto {producto_id} ({nombre}): {error}")
+                else:
+                    procesadas += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Procesadas: {procesadas}. Fallidas: {fallidas}."))
+
+    def _procesar(self, trabajo):
+        try:
+            imagenes.procesar(*trabajo)
+        except Exception as error:
+            return str(error) or error.__class__.__name__
+        return None
+
+    def _procesar_en_hilo(self, trabajo):
+        try:
+            return self._procesar(trabajo)
+        finally:
+            # Cada hilo tiene su propia conexión
+            connection.close()
@@ -0,0 +1,87 @@
+import json
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Pasos del plan que suelen indicar un índice faltante
+_RECORRIDO_SQLITE = re.compile(r'^SCAN (?!.*\bUSING\b)(?!.*CONSTANT ROW)|USE TEMP B-TREE')
+_RECORRIDO_POSTGRES = re.compile(r'Seq Scan|Sort Method: external')
+
+
+class Command(BaseCommand):
+    help = (
+        "Resume el registro de consultas lentas (inventario/consultas_lentas.py): "
+        "agrupa por huella del SQL, ordena por tiempo total y muestra las vistas "
+        "que las lanzan y el plan de la ejecución más lenta, marcando los "
+        "recorridos completos de tabla."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archivo', help='Registro a leer (por defecto CONSULTAS_LENTAS_ARCHIVO y sus rotaciones)')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help='Salida en JSON')
+
+    def handle(self, *args, **options):
+        archivos = self._archivos(options['archivo'])
+        if not archivos:
+            raise CommandError("No hay registro de consultas lentas todavía.")
+
+        grupos = defaultdict(lambda: {'veces': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'vistas': Counter(), 'peor': None})
+        for archivo in archivos:
+            with open(archivo, encoding='utf-8') as lineas:
+                for linea in lineas:
+                    try:
+                        registro = json.loads(linea)
+                    except ValueError:
+                        continue
+                    grupo = grupos[registro['huella']]
+                    grupo['veces'] += 1
+                    grupo['total_ms'] += registro['duracion_ms']
+                    grupo['vistas'][registro['vista'] or '(fuera de una petición)'] += 1
+                    if registro['duracion_ms'] >= grupo['max_ms']:
+                        grupo['max_ms'] = registro['duracion_ms']
+                        grupo['peor'] = registro
+
+        ranking = sorted(grupos.items(), key=lambda item: item[1]['total_ms'], reverse=True)[:options['top']]
+        resultado = [self._resumen(huella, grupo) for huella, grupo in ranking]
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultado, indent=2, ensure_ascii=False))
+            return
+        for posicion, resumen in enumerate(resultado, start=1):
+            aviso = '  [posible índice faltante]' if resumen['recorrido_completo'] else ''
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"#{posicion}  total {resumen['total_ms']:.0f} ms  |  {resumen['veces']} veces  |  "
+                f"media {resumen['media_ms']:.1f} ms  |  máx {resumen['max_ms']:.1f} ms{aviso}"
+            ))
+            self.stdout.write(f"  vistas: {', '.join(f'{vista} ({veces})' for vista, veces in resumen['vistas'])}")
+            self.stdout.write(f"  parámetros: {resumen['parametros']}")
+            self.stdout.write(f"  sql: {resumen['huella'][:500]}")
+            for paso in resumen['plan'] or ['(sin plan)']:
+                self.stdout.write(f"    {paso}")
+            self.stdout.write('')
+
+    def _archivos(self, archivo):
+        if archivo:
+            return [Path(archivo)] if Path(archivo).exists() else []
+        base = Path(settings.CONSULTAS_LENTAS_ARCHIVO)
+        return [ruta for ruta in [base, *sorted(base.parent.glob(base.name + '.*'))] if ruta.exists()]
+
+    def _resumen(self, huella, grupo):
+        peor = grupo['peor']
+        plan = peor['plan'] or []
+        patron = _RECORRIDO_POSTGRES if peor['base_de_datos'] == 'postgresql' else _RECORRIDO_SQLITE
+        return {
+            'huella': huella,
+            'veces': grupo['veces'],
+            'total_ms': round(grupo['total_ms'], 2),
+            'media_ms': round(grupo['total_ms'] / grupo['veces'], 2),
+            'max_ms': grupo['max_ms'],
+            'vistas': grupo['vistas'].most_common(5),
+            'parametros': peor['parametros'],
+            'plan': plan,
+            'recorrido_completo': any(patron.search(paso.strip()) for paso in plan),
+        }
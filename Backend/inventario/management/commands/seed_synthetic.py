@@ -0,0 +1,66 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventario import cache_catalogo, cache_reportes
+from inventario.sintetico import sembrar_catalogo, sembrar_ventas
+
+
+class Command(BaseCommand):
+    help = (
+        "Llena la base de datos con datos sintéticos (productos con variantes, "
+        "empleados, ventas con detalles y movimientos) usando bulk_create por lotes, "
+        "y reconstruye el resumen diario de ventas. Solo para bases de pruebas o benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=10000)
+        parser.add_argument('--empleados', type=int, default=500)
+        parser.add_argument('--ventas', type=int, default=1000000)
+        parser.add_argument('--movimientos', type=int, default=None,
+                            help='Movimientos de inventario (por defecto la mitad de las ventas)')
+        parser.add_argument('--dias', type=int, default=730,
+                            help='Días hacia atrás en los que se reparten ventas y movimientos')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por bulk_create')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--forzar', action='store_true',
+                            help='Permite ejecutarlo con DEBUG=False')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['forzar']:
+            raise CommandError("DEBUG=False: parece producción. Usa --forzar si de verdad es una base de pruebas.")
+
+        rng = random.Random(options['semilla'])
+        movimientos = options['movimientos']
+        if movimientos is None:
+            movimientos = options['ventas'] // 2
+        inicio = time.perf_counter()
+
+        self.stdout.write(f"Catálogo: {options['productos']} productos, {options['empleados']} empleados...")
+        productos, empleados = sembrar_catalogo(options['productos'], options['empleados'], rng, lote=options['lote'])
+
+        def progreso(ventas, movs):
+            self.stdout.write(f"  {ventas} ventas, {movs} movimientos ({time.perf_counter() - inicio:.0f} s)")
+
+        self.stdout.write(f"Ventas: {options['ventas']}, movimientos: {movimientos}...")
+        sembrar_ventas(
+            options['ventas'], productos, empleados, rng,
+            dias=options['dias'], lote=options['lote'], movimientos=movimientos, progreso=progreso,
+        )
+
+        # bulk_create no pasa por el resumen incremental ni por las señales
+        hoy = timezone.localdate()
+        call_command(
+            'backfill_resumen_ventas',
+            desde=(hoy - timedelta(days=options['dias'])).isoformat(), hasta=hoy.isoformat(),
+            stdout=self.stdout,
+        )
+        cache_reportes.invalidar()
+        cache_catalogo.invalidar()
+
+        self.stdout.write(self.style.SUCCESS(f"Datos sintéticos creados en {time.perf_counter() - inicio:.0f} s."))
@@ -0,0 +1,83 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from inventario import trabajos_reportes
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula los reportes pedidos en POST /api/reportes/jobs/. Toma los "
+        "trabajos pendientes de la tabla TrabajoReporte y los reparte entre un "
+        "pool de procesos. Se pueden ejecutar varios workers a la vez, incluso "
+        "en servidores distintos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=settings.REPORTES_TRABAJADORES,
+                            help='Procesos que calculan reportes; 0 los calcula en este proceso')
+        parser.add_argument('--espera', type=float, default=1.0,
+                            help='Segundos entre consultas a la cola cuando no hay trabajos')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa los pendientes y termina (para cron o pruebas)')
+
+    def handle(self, *args, **options):
+        trabajador = trabajos_reportes.nombre_trabajador()
+        self.stdout.write(f"Worker de reportes {trabajador} con {options['procesos']} procesos.")
+        try:
+            if options['procesos'] > 0:
+                self._con_pool(trabajador, options)
+            else:
+                self._en_este_proceso(trabajador, options)
+        except KeyboardInterrupt:
+            # Los trabajos a medias vuelven a la cola cuando vence su latido
+            self.stdout.write("Worker detenido.")
+
+    def _en_este_proceso(self, trabajador, options):
+        while True:
+            reclamado = trabajos_reportes.reclamar(trabajador)
+            if reclamado is None:
+                if options['una_vez']:
+                    return
+                time.sleep(options['espera'])
+                continue
+            trabajo_id, reclamo = reclamado
+            self._informar(trabajo_id, trabajos_reportes.ejecutar(trabajo_id, reclamo))
+
+    def _con_pool(self, trabajador, options):
+        procesos = options['procesos']
+        # Los procesos hijos abren sus propias conexiones
+        connections.close_all()
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=django.setup) as pool:
+            en_curso = {}
+            while True:
+                while len(en_curso) < procesos:
+                    reclamado = trabajos_reportes.reclamar(trabajador)
+                    if reclamado is None:
+                        break
+                    trabajo_id, reclamo = reclamado
+                    en_curso[pool.submit(trabajos_reportes.ejecutar, trabajo_id, reclamo)] = trabajo_id
+
+                if not en_curso:
+                    if options['una_vez']:
+                        return
+                    time.sleep(options['espera'])
+                    continue
+
+                terminados, _ = wait(en_curso, timeout=options['espera'], return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    trabajo_id = en_curso.pop(futuro)
+                    try:
+                        self._informar(trabajo_id, futuro.result())
+                    except Exception as error:
+                        # El proceso murió o el error ocurrió fuera de ejecutar()
+                        self.stderr.write(f"Reporte #{trabajo_id}: {error!r}")
+
+    def _informar(self, trabajo_id, estado):
+        self.stdout.write(f"Reporte #{trabajo_id}: {estado}")
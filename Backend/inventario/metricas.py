@@ -0,0 +1,222 @@
+"""
+Medición del tiempo de cada petición, por partes.
+
+MetricasMiddleware abre una ``Medicion`` para la petición (en un ContextVar,
+así que funciona igual con WSGI y con ASGI) y envuelve las consultas SQL con
+``connection.execute_wrapper``. El resto del código marca sus tramos con
+``medir(nombre)``: la autenticación JWT ('auth'), los permisos ('permisos') y
+la representación de los serializers ('serializacion'). Al terminar:
+
+- la respuesta lleva la cabecera Server-Timing (visible en las DevTools);
+- la petición se suma a histogramas por endpoint de los últimos minutos, que
+  se consultan en GET /api/metrics/ (solo admins).
+
+Los histogramas son de cada proceso: con varios workers cada uno muestra
+solo las peticiones que atendió él.
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+# Límites superiores (ms) de los intervalos del histograma; el último es abierto
+LIMITES_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_actual = contextvars.ContextVar('medicion', default=None)
+
+
+class Medicion:
+    def __init__(self):
+        self.duraciones = defaultdict(float)
+        self.consultas = 0
+        self.vista = None
+        self._activos = Counter()
+
+    def sql(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duraciones['db'] += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+def vista_actual():
+    """Vista que atiende la petición en curso (ProductoViewSet.list, metrics...) o None"""
+    medicion = _actual.get()
+    return medicion.vista if medicion is not None else None
+
+
+def nombre_vista(request, view_func):
+    clase = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if clase is None:
+        return view_func.__name__
+    acciones = getattr(view_func, 'actions', None)
+    if acciones:
+        metodo = request.method.lower()
+        return f'{clase.__name__}.{acciones.get(metodo, metodo)}'
+    # Con @api_view la clase toma el nombre de la función
+    return clase.__name__
+
+
+@contextmanager
+def medir(nombre):
+    """
+    Suma la duración del bloque al tramo ``nombre`` de la petición en curso.
+    Los bloques anidados del mismo tramo (un serializer dentro de otro) se
+    cuentan una sola vez. Fuera de una petición no hace nada.
+    """
+    medicion = _actual.get()
+    if medicion is None or medicion._activos[nombre]:
+        yield
+        return
+    medicion._activos[nombre] += 1
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.duraciones[nombre] += time.perf_counter() - inicio
+        medicion._activos[nombre] -= 1
+
+
+def server_timing(medicion, total):
+    partes = [f'db;dur={medicion.duraciones["db"] * 1000:.1f};desc="{medicion.consultas} consultas"']
+    for nombre in ('auth', 'permisos', 'serializacion'):
+        if nombre in medicion.duraciones:
+            partes.append(f'{nombre};dur={medicion.duraciones[nombre] * 1000:.1f}')
+    partes.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(partes)
+
+
+# ---------- histogramas por endpoint ----------
+class Acumulado:
+    def __init__(self):
+        self.intervalos = [0] * (len(LIMITES_MS) + 1)
+        self.peticiones = 0
+        self.errores = 0
+        self.total_ms = 0.0
+        self.db_ms = 0.0
+        self.consultas = 0
+        self.max_ms = 0.0
+
+    def sumar(self, otro):
+        self.intervalos = [a + b for a, b in zip(self.intervalos, otro.intervalos)]
+        self.peticiones += otro.peticiones
+        self.errores += otro.errores
+        self.total_ms += otro.total_ms
+        self.db_ms += otro.db_ms
+        self.consultas += otro.consultas
+        self.max_ms = max(self.max_ms, otro.max_ms)
+
+    def percentil(self, fraccion):
+        """Límite superior del intervalo donde cae el percentil (acotado por el máximo visto)"""
+        objetivo = fraccion * self.peticiones
+        acumuladas = 0
+        for limite, cantidad in zip(LIMITES_MS + (None,), self.intervalos):
+            acumuladas += cantidad
+            if acumuladas >= objetivo:
+                return self.max_ms if limite is None else min(limite, self.max_ms)
+        return self.max_ms
+
+    def resumen(self):
+        return {
+            'peticiones': self.peticiones,
+            'errores_5xx': self.errores,
+            'media_ms': round(self.total_ms / self.peticiones, 2),
+            'p50_ms': round(self.percentil(0.50), 2),
+            'p95_ms': round(self.percentil(0.95), 2),
+            'p99_ms': round(self.percentil(0.99), 2),
+            'max_ms': round(self.max_ms, 2),
+            'db_media_ms': round(self.db_ms / self.peticiones, 2),
+            'consultas_media': round(self.consultas / self.peticiones, 1),
+            'histograma': {
+                **{f'<={limite}ms': cantidad for limite, cantidad in zip(LIMITES_MS, self.intervalos)},
+                f'>{LIMITES_MS[-1]}ms': self.intervalos[-1],
+            },
+        }
+
+
+class Histogramas:
+    """Un Acumulado por endpoint y minuto; se conservan METRICAS_VENTANA_MINUTOS minutos"""
+
+    def __init__(self):
+        self._minutos = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, endpoint, total_ms, medicion, estado):
+        minuto = int(time.time() // 60)
+        with self._lock:
+            por_endpoint = self._minutos.get(minuto)
+            if por_endpoint is None:
+                por_endpoint = self._minutos[minuto] = defaultdict(Acumulado)
+                self._descartar_viejos(minuto)
+            acumulado = por_endpoint[endpoint]
+            acumulado.intervalos[bisect.bisect_left(LIMITES_MS, total_ms)] += 1
+            acumulado.peticiones += 1
+            acumulado.errores += estado >= 500
+            acumulado.total_ms += total_ms
+            acumulado.db_ms += medicion.duraciones['db'] * 1000
+            acumulado.consultas += medicion.consultas
+            acumulado.max_ms = max(acumulado.max_ms, total_ms)
+
+    def _descartar_viejos(self, minuto):
+        for viejo in [m for m in self._minutos if m <= minuto - settings.METRICAS_VENTANA_MINUTOS]:
+            del self._minutos[viejo]
+
+    def resumen(self):
+        desde = int(time.time() // 60) - settings.METRICAS_VENTANA_MINUTOS
+        totales = defaultdict(Acumulado)
+        with self._lock:
+            for minuto, por_endpoint in self._minutos.items():
+                if minuto > desde:
+                    for endpoint, acumulado in por_endpoint.items():
+                        totales[endpoint].sumar(acumulado)
+        return {
+            'proceso': os.getpid(),
+            'ventana_minutos': settings.METRICAS_VENTANA_MINUTOS,
+            'endpoints': {endpoint: totales[endpoint].resumen() for endpoint in sorted(totales)},
+        }
+
+    def reiniciar(self):
+        with self._lock:
+            self._minutos.clear()
+
+
+histogramas = Histogramas()
+
+
+# ---------- middleware ----------
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = Medicion()
+        token = _actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with connection.execute_wrapper(medicion.sql):
+                response = self.get_response(request)
+        finally:
+            _actual.reset(token)
+        total = time.perf_counter() - inicio
+
+        if settings.METRICAS_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(medicion, total)
+        coincidencia = request.resolver_match
+        if coincidencia is not None and coincidencia.view_name:
+            histogramas.registrar(
+                f'{request.method} {coincidencia.view_name}', total * 1000, medicion, response.status_code
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicion = _actual.get()
+        if medicion is not None:
+            medicion.vista = nombre_vista(request, view_func)
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:08
+
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+from django.db.models.lookups import LessThanOrEqual
+
+
+def calcular_estados(apps, schema_editor):
+    Producto = apps.get_model('inventario', 'Producto')
+    Producto.objects.update(estado=Case(
+        When(LessThanOrEqual(F('stock_actual'), 0), then=Value('agotado')),
+        When(LessThanOrEqual(F('stock_actual'), F('stock_minimo')), then=Value('bajo_stock')),
+        default=Value('en_stock'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0004_producto_colores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='estado',
+            field=models.CharField(choices=[('en_stock', 'En Stock'), ('bajo_stock', 'Stock Bajo'), ('agotado', 'Agotado')], default='agotado', editable=False, max_length=20),
+        ),
+        migrations.RunPython(calcular_estados, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'estado'], name='producto_activo_estado_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0005_producto_estado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['nombre'], name='cliente_activo_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['fecha', 'id'], name='movimiento_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['nombre'], name='producto_activo_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha', 'id'], name='venta_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('canal_venta', models.CharField(choices=[('nequi', 'Nequi'), ('daviplata', 'Daviplata'), ('bancolombia', 'Bancolombia'), ('presencial', 'Presencial (Efectivo)'), ('tarjeta', 'Tarjeta')], max_length=20)),
+                ('unidades', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('descuento', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('empleado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventario.empleado')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventario.producto')),
+            ],
+            options={
+                'verbose_name_plural': 'Resúmenes de ventas diarias',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumenventadiaria',
+            constraint=models.UniqueConstraint(fields=('dia', 'producto', 'canal_venta', 'empleado'), name='resumen_venta_diaria_unico'),
+        ),
+    ]
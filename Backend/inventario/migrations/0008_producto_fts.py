@@ -0,0 +1,89 @@
+from django.db import migrations
+
+TABLA_FTS = 'inventario_producto_fts'
+
+# Longitud de los prefijos precalculados, para que "blu" no recorra el vocabulario
+_PREFIJOS = '2 3 4'
+
+_SELECT_PRODUCTO = """
+    SELECT p.id, p.nombre, p.descripcion,
+           COALESCE((SELECT c.nombre FROM inventario_categoria c WHERE c.id = p.categoria_id), ''),
+           COALESCE((SELECT co.nombre FROM inventario_coleccion co WHERE co.id = p.coleccion_id), '')
+    FROM inventario_producto p
+"""
+
+SQL_CREAR = [
+    f"""
+    CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5(
+        nombre, descripcion, categoria, coleccion,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '{_PREFIJOS}'
+    )
+    """,
+    f"INSERT INTO {TABLA_FTS} (rowid, nombre, descripcion, categoria, coleccion) {_SELECT_PRODUCTO}",
+    f"""
+    CREATE TRIGGER {TABLA_FTS}_producto_ai AFTER INSERT ON inventario_producto BEGIN
+        INSERT INTO {TABLA_FTS} (rowid, nombre, descripcion, categoria, coleccion)
+        {_SELECT_PRODUCTO} WHERE p.id = new.id;
+    END
+    """,
+    # Solo cuando cambia un campo indexado: los ajustes de stock no tocan el índice
+    f"""
+    CREATE TRIGGER {TABLA_FTS}_producto_au AFTER UPDATE ON inventario_producto
+    WHEN old.nombre IS NOT new.nombre OR old.descripcion IS NOT new.descripcion
+      OR old.categoria_id IS NOT new.categoria_id OR old.coleccion_id IS NOT new.coleccion_id
+    BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+        INSERT INTO {TABLA_FTS} (rowid, nombre, descripcion, categoria, coleccion)
+        {_SELECT_PRODUCTO} WHERE p.id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABLA_FTS}_producto_ad AFTER DELETE ON inventario_producto BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABLA_FTS}_categoria_au AFTER UPDATE OF nombre ON inventario_categoria BEGIN
+        UPDATE {TABLA_FTS} SET categoria = new.nombre
+        WHERE rowid IN (SELECT id FROM inventario_producto WHERE categoria_id = new.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABLA_FTS}_coleccion_au AFTER UPDATE OF nombre ON inventario_coleccion BEGIN
+        UPDATE {TABLA_FTS} SET coleccion = new.nombre
+        WHERE rowid IN (SELECT id FROM inventario_producto WHERE coleccion_id = new.id);
+    END
+    """,
+]
+
+SQL_ELIMINAR = [
+    f'DROP TRIGGER IF EXISTS {TABLA_FTS}_{sufijo}'
+    for sufijo in ('producto_ai', 'producto_au', 'producto_ad', 'categoria_au', 'coleccion_au')
+] + [f'DROP TABLE IF EXISTS {TABLA_FTS}']
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in SQL_CREAR:
+        schema_editor.execute(sql)
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in SQL_ELIMINAR:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    """Índice FTS5 de productos (solo SQLite; ver inventario/busqueda.py)"""
+
+    dependencies = [
+        ('inventario', '0007_resumen_venta_diaria'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def _dividir(texto, normalizar):
+    valores = (normalizar(valor) for valor in (texto or '').split(','))
+    return list(dict.fromkeys(valor for valor in valores if valor)) or ['']
+
+
+def crear_variantes(apps, schema_editor):
+    """
+    Una variante por cada talla x color de los campos de texto. Si el producto
+    tiene una sola variante recibe todo su stock; si no, el stock queda sin
+    asignar (en 0 por variante) hasta que se reparta.
+    """
+    Producto = apps.get_model('inventario', 'Producto')
+    ProductoVariante = apps.get_model('inventario', 'ProductoVariante')
+    variantes = []
+    for producto_id, tallas, colores, stock in Producto.objects.values_list(
+        'id', 'tallas', 'colores', 'stock_actual'
+    ).iterator(chunk_size=2000):
+        combinaciones = [
+            (talla, color)
+            for talla in _dividir(tallas, lambda t: t.strip().upper())
+            for color in _dividir(colores, lambda c: c.strip().capitalize())
+        ]
+        inicial = max(stock, 0) if len(combinaciones) == 1 else 0
+        variantes += [
+            ProductoVariante(producto_id=producto_id, talla=talla, color=color, stock=inicial)
+            for talla, color in combinaciones
+        ]
+        if len(variantes) >= 5000:
+            ProductoVariante.objects.bulk_create(variantes)
+            variantes = []
+    ProductoVariante.objects.bulk_create(variantes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_producto_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoVariante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('talla', models.CharField(max_length=20)),
+                ('color', models.CharField(blank=True, max_length=50)),
+                ('stock', models.IntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variantes', to='inventario.producto')),
+            ],
+            options={
+                'ordering': ['producto', 'talla', 'color'],
+            },
+        ),
+        migrations.AddField(
+            model_name='detalleventa',
+            name='variante',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventario.productovariante'),
+        ),
+        migrations.AddField(
+            model_name='movimientoinventario',
+            name='variante',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos', to='inventario.productovariante'),
+        ),
+        migrations.AddIndex(
+            model_name='productovariante',
+            index=models.Index(fields=['talla', 'producto'], name='variante_talla_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productovariante',
+            index=models.Index(fields=['color', 'producto'], name='variante_color_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productovariante',
+            constraint=models.UniqueConstraint(fields=('producto', 'talla', 'color'), name='variante_unica'),
+        ),
+        migrations.RunPython(crear_variantes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_producto_variante'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_actualizacion', 'id'], name='producto_actualizacion_idx'),
+        ),
+    ]
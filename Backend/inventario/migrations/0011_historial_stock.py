@@ -0,0 +1,99 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def _en_lotes(modelo, filas, tamano=5000):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            modelo.objects.bulk_create(lote)
+            lote = []
+    modelo.objects.bulk_create(lote)
+
+
+def reconstruir_historial(apps, schema_editor):
+    """
+    Historial a partir de los movimientos (salida resta) y las líneas de venta
+    registrados, más un stock inicial por producto (en su creación o antes del
+    primer cambio) que cuadra la suma de deltas con el stock_actual de hoy.
+    """
+    Producto = apps.get_model('inventario', 'Producto')
+    MovimientoInventario = apps.get_model('inventario', 'MovimientoInventario')
+    DetalleVenta = apps.get_model('inventario', 'DetalleVenta')
+    RegistroStock = apps.get_model('inventario', 'RegistroStock')
+
+    sumas = {}
+    primeras = {}
+
+    def anotar(producto_id, delta, fecha, origen):
+        sumas[producto_id] = sumas.get(producto_id, 0) + delta
+        primeras[producto_id] = min(fecha, primeras.get(producto_id, fecha))
+        return RegistroStock(producto_id=producto_id, delta=delta, origen=origen, fecha=fecha)
+
+    movimientos = MovimientoInventario.objects.values_list('producto_id', 'tipo', 'cantidad', 'fecha')
+    _en_lotes(RegistroStock, (
+        anotar(producto_id, -cantidad if tipo == 'salida' else cantidad, fecha, 'movimiento')
+        for producto_id, tipo, cantidad, fecha in movimientos.iterator(chunk_size=5000)
+    ))
+    lineas = DetalleVenta.objects.values_list('producto_id', 'cantidad', 'venta__fecha')
+    _en_lotes(RegistroStock, (
+        anotar(producto_id, -cantidad, fecha, 'venta')
+        for producto_id, cantidad, fecha in lineas.iterator(chunk_size=5000)
+    ))
+
+    productos = Producto.objects.values_list('id', 'stock_actual', 'fecha_creacion')
+    _en_lotes(RegistroStock, (
+        RegistroStock(
+            producto_id=producto_id,
+            delta=stock - sumas.get(producto_id, 0),
+            origen='inicial',
+            fecha=min(creacion, primeras.get(producto_id, creacion)),
+        )
+        for producto_id, stock, creacion in productos.iterator(chunk_size=5000)
+        if stock != sumas.get(producto_id, 0)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0010_producto_actualizacion_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('origen', models.CharField(choices=[('inicial', 'Stock inicial'), ('venta', 'Venta'), ('movimiento', 'Movimiento de inventario'), ('edicion', 'Edición del producto')], max_length=20)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('producto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventario.producto')),
+            ],
+            options={
+                'ordering': ['fecha', 'id'],
+                'indexes': [models.Index(fields=['producto', 'fecha', 'delta'], name='registro_stock_producto_idx'), models.Index(fields=['fecha', 'producto', 'delta'], name='registro_stock_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CorteStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('producto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventario.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha'], name='corte_stock_fecha_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cortestock',
+            constraint=models.UniqueConstraint(fields=('producto', 'fecha'), name='corte_stock_unico'),
+        ),
+        migrations.RunPython(reconstruir_historial, migrations.RunPython.noop),
+    ]
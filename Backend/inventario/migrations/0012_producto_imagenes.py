@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:02
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# En SQLite AddField rehace la tabla de productos y los triggers del índice
+# FTS quedarían apuntando a la tabla borrada: se quita el índice y se vuelve a crear
+fts = import_module('inventario.migrations.0008_producto_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0011_historial_stock'),
+    ]
+
+    operations = [
+        migrations.RunPython(fts.eliminar_indice, fts.crear_indice),
+        migrations.AddField(
+            model_name='producto',
+            name='imagenes',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(fts.crear_indice, fts.eliminar_indice),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:16
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0013_trabajo_reporte'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='referencia',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='venta',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
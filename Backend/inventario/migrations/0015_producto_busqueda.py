@@ -0,0 +1,155 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+TABLA = 'inventario_producto_busqueda'
+
+_CON_TILDE = 'ÁÉÍÓÚÜÑáéíóúüñ'
+_SIN_TILDE = 'AEIOUUNaeiouun'
+
+
+def _vector(columna, peso):
+    # TRANSLATE en lugar de unaccent: no necesita extensiones
+    return (
+        f"setweight(to_tsvector('simple', translate(COALESCE({columna}, ''), "
+        f"'{_CON_TILDE}', '{_SIN_TILDE}')), '{peso}')"
+    )
+
+
+SQL_CREAR = [
+    f"""
+    CREATE TABLE {TABLA} (
+        producto_id bigint PRIMARY KEY,
+        documento tsvector NOT NULL
+    )
+    """,
+    f"CREATE INDEX {TABLA}_documento_idx ON {TABLA} USING gin (documento)",
+    # Nombre A, categoría y colección B, descripción D (ver busqueda.PESOS_TS_RANK)
+    f"""
+    CREATE FUNCTION {TABLA}_actualizar(ids bigint[]) RETURNS void AS $$
+        INSERT INTO {TABLA} (producto_id, documento)
+        SELECT p.id,
+               {_vector('p.nombre', 'A')} || {_vector('c.nombre', 'B')}
+               || {_vector('co.nombre', 'B')} || {_vector('p.descripcion', 'D')}
+        FROM inventario_producto p
+        LEFT JOIN inventario_categoria c ON c.id = p.categoria_id
+        LEFT JOIN inventario_coleccion co ON co.id = p.coleccion_id
+        WHERE p.id = ANY(ids)
+        ON CONFLICT (producto_id) DO UPDATE SET documento = EXCLUDED.documento
+    $$ LANGUAGE sql
+    """,
+    f"""
+    CREATE FUNCTION {TABLA}_producto() RETURNS trigger AS $$
+    BEGIN
+        PERFORM {TABLA}_actualizar(ARRAY[NEW.id]::bigint[]);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    # Sin clave foránea, como la tabla FTS5 de SQLite: el flush de los tests
+    # vacía inventario_producto con TRUNCATE, que no admite tablas que la referencien
+    f"""
+    CREATE FUNCTION {TABLA}_producto_eliminado() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM {TABLA} WHERE producto_id = OLD.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE FUNCTION {TABLA}_categoria() RETURNS trigger AS $$
+    BEGIN
+        PERFORM {TABLA}_actualizar(ARRAY(SELECT id FROM inventario_producto WHERE categoria_id = NEW.id));
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE FUNCTION {TABLA}_coleccion() RETURNS trigger AS $$
+    BEGIN
+        PERFORM {TABLA}_actualizar(ARRAY(SELECT id FROM inventario_producto WHERE coleccion_id = NEW.id));
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    # Solo cuando cambia un campo indexado: los ajustes de stock no tocan el índice
+    f"""
+    CREATE TRIGGER {TABLA}_producto
+    AFTER INSERT OR UPDATE OF nombre, descripcion, categoria_id, coleccion_id ON inventario_producto
+    FOR EACH ROW EXECUTE PROCEDURE {TABLA}_producto()
+    """,
+    f"""
+    CREATE TRIGGER {TABLA}_producto_eliminado AFTER DELETE ON inventario_producto
+    FOR EACH ROW EXECUTE PROCEDURE {TABLA}_producto_eliminado()
+    """,
+    f"""
+    CREATE TRIGGER {TABLA}_categoria AFTER UPDATE OF nombre ON inventario_categoria
+    FOR EACH ROW WHEN (OLD.nombre IS DISTINCT FROM NEW.nombre) EXECUTE PROCEDURE {TABLA}_categoria()
+    """,
+    f"""
+    CREATE TRIGGER {TABLA}_coleccion AFTER UPDATE OF nombre ON inventario_coleccion
+    FOR EACH ROW WHEN (OLD.nombre IS DISTINCT FROM NEW.nombre) EXECUTE PROCEDURE {TABLA}_coleccion()
+    """,
+    f"SELECT {TABLA}_actualizar(ARRAY(SELECT id FROM inventario_producto))",
+]
+
+SQL_ELIMINAR = [
+    f'DROP TRIGGER IF EXISTS {TABLA}_producto ON inventario_producto',
+    f'DROP TRIGGER IF EXISTS {TABLA}_producto_eliminado ON inventario_producto',
+    f'DROP TRIGGER IF EXISTS {TABLA}_categoria ON inventario_categoria',
+    f'DROP TRIGGER IF EXISTS {TABLA}_coleccion ON inventario_coleccion',
+    f'DROP FUNCTION IF EXISTS {TABLA}_producto()',
+    f'DROP FUNCTION IF EXISTS {TABLA}_producto_eliminado()',
+    f'DROP FUNCTION IF EXISTS {TABLA}_categoria()',
+    f'DROP FUNCTION IF EXISTS {TABLA}_coleccion()',
+    f'DROP FUNCTION IF EXISTS {TABLA}_actualizar(bigint[])',
+    f'DROP TABLE IF EXISTS {TABLA}',
+]
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in SQL_CREAR:
+        schema_editor.execute(sql)
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in SQL_ELIMINAR:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    """Índice de texto completo de productos en PostgreSQL (tsvector + GIN; ver inventario/busqueda.py)"""
+
+    dependencies = [
+        ('inventario', '0014_venta_referencia'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+        # Modelos no gestionados para unir a Producto esta tabla y la FTS5 de SQLite
+        migrations.CreateModel(
+            name='ProductoBusqueda',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='busqueda', serialize=False, to='inventario.producto')),
+                ('documento', models.TextField()),
+            ],
+            options={
+                'db_table': 'inventario_producto_busqueda',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductoFTS',
+            fields=[
+                ('producto', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='fts', serialize=False, to='inventario.producto')),
+                ('indice', models.TextField(db_column='inventario_producto_fts')),
+            ],
+            options={
+                'db_table': 'inventario_producto_fts',
+                'managed': False,
+            },
+        ),
+    ]
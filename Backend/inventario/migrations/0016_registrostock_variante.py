@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def registrar_stock_variantes(apps, schema_editor):
+    """El stock que las variantes ya tienen entra al historial como reparto a la fecha de la migración"""
+    ProductoVariante = apps.get_model('inventario', 'ProductoVariante')
+    RegistroStock = apps.get_model('inventario', 'RegistroStock')
+    ahora = timezone.now()
+    RegistroStock.objects.bulk_create(
+        (
+            RegistroStock(
+                producto_id=producto_id, delta=0, origen='reparto', fecha=ahora,
+                variante_id=variante_id, delta_variante=stock,
+            )
+            for variante_id, producto_id, stock in ProductoVariante.objects.exclude(stock=0).values_list(
+                'pk', 'producto_id', 'stock'
+            ).iterator()
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0015_producto_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='registrostock',
+            name='delta_variante',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='registrostock',
+            name='variante',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventario.productovariante'),
+        ),
+        migrations.AlterField(
+            model_name='registrostock',
+            name='origen',
+            field=models.CharField(choices=[('inicial', 'Stock inicial'), ('venta', 'Venta'), ('movimiento', 'Movimiento de inventario'), ('edicion', 'Edición del producto'), ('reparto', 'Reparto entre variantes')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='registrostock',
+            index=models.Index(fields=['variante', 'fecha', 'delta_variante'], name='registro_stock_variante_idx'),
+        ),
+        migrations.RunPython(registrar_stock_variantes, migrations.RunPython.noop),
+    ]
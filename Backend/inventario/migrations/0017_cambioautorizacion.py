@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0016_registrostock_variante'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioAutorizacion',
+            fields=[
+                ('user_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('reclamos', models.JSONField()),
+                ('fecha', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0017_cambioautorizacion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productovariante',
+            name='color',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='productovariante',
+            name='talla',
+            field=models.CharField(max_length=100),
+        ),
+    ]
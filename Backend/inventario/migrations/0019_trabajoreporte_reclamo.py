@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0018_variante_largo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoreporte',
+            name='reclamo',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,7 +1,16 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q, Case, When, Value, IntegerField, Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThanOrEqual
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+from . import cache_catalogo, eventos
+
 
 # ==========================================
 # CATEGORÍAS
@@ -44,6 +53,20 @@ class Empleado(models.Model):
         return f"{self.user.first_name} {self.user.last_name}"
 
 
+class CambioAutorizacion(models.Model):
+    """
+    Último estado de autorización de un usuario, que reemplaza los claims de
+    sus tokens ya emitidos (ver autenticacion.py). Sin clave foránea: la fila
+    de un usuario eliminado es la que invalida sus tokens.
+    """
+    user_id = models.IntegerField(primary_key=True)
+    reclamos = models.JSONField()
+    fecha = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.fecha}"
+
+
 # ==========================================
 # PRODUCTOS - CON COLORES
 # ==========================================
@@ -64,6 +87,8 @@ class Producto(models.Model):
     colores = models.CharField(max_length=200, help_text="Ej: Rojo,Azul,Negro,Blanco", blank=True)
     descripcion = models.TextField(blank=True)
     imagen = models.ImageField(upload_to='productos/', null=True, blank=True)
+    # Versiones reducidas de la imagen, generadas en segundo plano (ver imagenes.py)
+    imagenes = models.JSONField(default=dict, blank=True, editable=False)
     
     # Precios e inventario
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
@@ -75,35 +100,122 @@ class Producto(models.Model):
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     activo = models.BooleanField(default=True)
     
+    # Estado del stock desnormalizado para poder filtrarlo con un índice.
+    # Se recalcula en save() y en cada UPDATE de ajustar_stock_lote().
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='agotado', editable=False)
+    
     def __str__(self):
         return self.nombre
     
-    @property
-    def estado(self):
-        """Retorna el estado del producto"""
-        if self.stock_actual == 0:
+    def calcular_estado(self):
+        """Retorna el estado que corresponde al stock actual"""
+        if self.stock_actual <= 0:
             return 'agotado'
         elif self.stock_actual <= self.stock_minimo:
             return 'bajo_stock'
         else:
             return 'en_stock'
     
+    def save(self, *args, **kwargs):
+        self.estado = self.calcular_estado()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # auto_now no se guarda si no está en update_fields, y la
+            # sincronización de terminales depende de fecha_actualizacion
+            update_fields = {*update_fields, 'fecha_actualizacion'}
+            if {'stock_actual', 'stock_minimo'} & update_fields:
+                update_fields.add('estado')
+            kwargs['update_fields'] = update_fields
+        creado = self._state.adding
+        with transaction.atomic():
+            anterior = None
+            if not creado and (update_fields is None or 'stock_actual' in update_fields):
+                # Stock guardado, bloqueado para que ningún UPDATE de ajustar_stock_lote se cuele
+                anterior = Producto.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'stock_actual', flat=True
+                ).first()
+            super().save(*args, **kwargs)
+            if creado:
+                nuevas = self.sincronizar_variantes(creado)
+                if self.stock_actual:
+                    # Con una sola variante el stock inicial es suyo (ver sincronizar_variantes)
+                    unica = nuevas[0] if len(nuevas) == 1 and nuevas[0].stock else None
+                    RegistroStock.objects.create(
+                        producto=self, delta=self.stock_actual, origen='inicial',
+                        variante=unica, delta_variante=unica.stock if unica else 0,
+                    )
+            elif anterior is not None and self.stock_actual != anterior:
+                self._registrar_edicion(self.stock_actual - anterior)
+        if not creado and (update_fields is None or {'tallas', 'colores'} & set(update_fields)):
+            self.sincronizar_variantes()
+
+    def _registrar_edicion(self, delta):
+        """
+        Anota una edición directa de stock_actual (con la fila ya bloqueada).
+        Con una sola variante el cambio también es suyo, sin bajarla de 0; con
+        varias el total no puede quedar por debajo de lo repartido entre ellas.
+        """
+        variantes = list(ProductoVariante.objects.filter(producto=self).values_list('pk', 'stock'))
+        if len(variantes) == 1:
+            variante_id, stock = variantes[0]
+            nuevo = max(stock + delta, 0)
+            if nuevo != stock:
+                ProductoVariante.objects.filter(pk=variante_id).update(stock=nuevo)
+            RegistroStock.objects.create(
+                producto=self, delta=delta, origen='edicion', variante_id=variante_id, delta_variante=nuevo - stock
+            )
+            return
+        repartido = sum(stock for _, stock in variantes)
+        if self.stock_actual < repartido:
+            raise ValidationError({'stock_actual': [
+                f"No puede ser menor que el stock repartido entre las variantes ({repartido})."
+            ]})
+        RegistroStock.objects.create(producto=self, delta=delta, origen='edicion')
+
+    def combinaciones(self):
+        """Pares (talla, color) normalizados a partir de los campos de texto"""
+        tallas = dividir_valores(self.tallas, normalizar_talla) or ['']
+        colores = dividir_valores(self.colores, normalizar_color) or ['']
+        return [(talla, color) for talla in tallas for color in colores]
+
+    def sincronizar_variantes(self, creado=False):
+        """
+        Crea las variantes que falten según tallas/colores y elimina las que ya
+        no aparezcan. Un producto nuevo con una sola variante le asigna su stock.
+        Devuelve las variantes creadas.
+        """
+        combinaciones = self.combinaciones()
+        existentes = {
+            (talla, color): pk
+            for pk, talla, color in ProductoVariante.objects.filter(producto=self).values_list('pk', 'talla', 'color')
+        }
+        stock_inicial = self.stock_actual if creado and len(combinaciones) == 1 else 0
+        nuevas = ProductoVariante.objects.bulk_create([
+            ProductoVariante(producto=self, talla=talla, color=color, stock=stock_inicial)
+            for talla, color in combinaciones if (talla, color) not in existentes
+        ])
+        sobrantes = [pk for combinacion, pk in existentes.items() if combinacion not in combinaciones]
+        if sobrantes:
+            ProductoVariante.objects.filter(pk__in=sobrantes).delete()
+        return nuevas
+    
     @property
     def stock_bajo(self):
         """Retorna True si el stock está por debajo del mínimo"""
-        return self.stock_actual <= self.stock_minimo
+        return self.estado in ('bajo_stock', 'agotado')
     
     @property
     def sin_stock(self):
         """Retorna True si no hay stock"""
-        return self.stock_actual == 0
+        return self.estado == 'agotado'
     
     @property
     def lista_colores(self):
         """Retorna una lista de colores separados"""
-        if self.colores:
-            return [color.strip() for color in self.colores.split(',')]
-        return []
+        # Con las variantes precargadas no hace falta volver a partir el texto
+        if 'variantes' in getattr(self, '_prefetched_objects_cache', {}):
+            return list(dict.fromkeys(v.color for v in self.variantes.all() if v.color))
+        return dividir_valores(self.colores, normalizar_color)
     
     @property
     def cantidad_colores(self):
@@ -112,6 +224,267 @@ class Producto(models.Model):
     
     class Meta:
         ordering = ['nombre']
+        indexes = [
+            models.Index(fields=['activo', 'estado'], name='producto_activo_estado_idx'),
+            # GET /api/productos/changes/: rango por (fecha_actualizacion, id)
+            models.Index(fields=['fecha_actualizacion', 'id'], name='producto_actualizacion_idx'),
+            # Listado del catálogo: activo=True ordenado por nombre
+            models.Index(fields=['nombre'], condition=Q(activo=True), name='producto_activo_nombre_idx'),
+        ]
+
+
+def dividir_valores(texto, normalizar):
+    """'s, M,m' -> ['S', 'M']: valores separados por comas, normalizados y sin repetir"""
+    valores = (normalizar(valor) for valor in (texto or '').split(','))
+    return list(dict.fromkeys(valor for valor in valores if valor))
+
+
+def normalizar_talla(talla):
+    return talla.strip().upper()
+
+
+def normalizar_color(color):
+    return color.strip().capitalize()
+
+
+# ==========================================
+# VARIANTES (talla x color)
+# ==========================================
+class ProductoVariante(models.Model):
+    """
+    Una combinación talla x color de un producto con su propio stock.
+    Producto.stock_actual sigue siendo el total: la parte que no está
+    asignada a ninguna variante es stock sin clasificar, y nunca es negativa
+    (la suma del stock de las variantes no supera stock_actual).
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='variantes')
+    # Mismo largo que Producto.tallas/colores: un valor puede ocupar todo el campo
+    talla = models.CharField(max_length=100)
+    color = models.CharField(max_length=200, blank=True)
+    stock = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['producto', 'talla', 'color']
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'talla', 'color'], name='variante_unica'),
+        ]
+        indexes = [
+            # Filtros ?tallas= y ?colores= del catálogo
+            models.Index(fields=['talla', 'producto'], name='variante_talla_idx'),
+            models.Index(fields=['color', 'producto'], name='variante_color_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto.nombre} ({' / '.join(filter(None, [self.talla, self.color]))})"
+
+    def save(self, *args, **kwargs):
+        """Reparte stock del producto a esta variante y lo anota en el historial"""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'stock' not in update_fields:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Con el producto bloqueado ninguna venta ni edición cambia el total entretanto
+            total = Producto.objects.select_for_update().values_list('stock_actual', flat=True).get(pk=self.producto_id)
+            repartido = dict(ProductoVariante.objects.filter(producto_id=self.producto_id).values_list('pk', 'stock'))
+            anterior = repartido.pop(self.pk, 0)
+            disponible = total - sum(repartido.values())
+            if not 0 <= self.stock <= disponible:
+                raise ValidationError({'stock': [f"Debe estar entre 0 y {disponible}."]})
+            super().save(*args, **kwargs)
+            if self.stock != anterior:
+                RegistroStock.objects.create(
+                    producto_id=self.producto_id, delta=0, origen='reparto',
+                    variante=self, delta_variante=self.stock - anterior,
+                )
+
+
+# ==========================================
+# ÍNDICES DE BÚSQUEDA (ver busqueda.py)
+# ==========================================
+class ProductoFTS(models.Model):
+    """
+    Tabla virtual FTS5 de la migración 0008 (solo SQLite). Django no la
+    gestiona: el modelo sirve para unirla a Producto en las búsquedas.
+    """
+    producto = models.OneToOneField(
+        Producto, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', related_name='fts'
+    )
+    # Columna oculta de FTS5 con el nombre de la tabla: la que reciben MATCH y bm25()
+    indice = models.TextField(db_column='inventario_producto_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'inventario_producto_fts'
+
+
+class ProductoBusqueda(models.Model):
+    """Tabla con el tsvector de cada producto de la migración 0015 (solo PostgreSQL)"""
+    producto = models.OneToOneField(
+        Producto, on_delete=models.DO_NOTHING, primary_key=True, related_name='busqueda'
+    )
+    # tsvector; solo lo escriben los triggers
+    documento = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = 'inventario_producto_busqueda'
+
+
+def expresion_estado(stock):
+    """Expresión SQL equivalente a Producto.calcular_estado para el stock dado"""
+    return Case(
+        When(LessThanOrEqual(stock, 0), then=Value('agotado')),
+        When(LessThanOrEqual(stock, F('stock_minimo')), then=Value('bajo_stock')),
+        default=Value('en_stock'),
+    )
+
+
+# ==========================================
+# AJUSTES DE STOCK
+# ==========================================
+class StockInsuficiente(Exception):
+    """Se lanza cuando una salida dejaría el stock de un producto por debajo de cero"""
+
+    def __init__(self, producto, cantidad):
+        self.producto = producto
+        self.cantidad = cantidad
+        super().__init__(
+            f"Stock insuficiente para '{producto}' (solicitado: {cantidad})"
+        )
+
+
+def ajustar_stock(producto, delta, variante=None, origen='movimiento'):
+    """
+    Suma ``delta`` al stock del producto (y de la variante, si se indica) con
+    un único UPDATE condicional por tabla.
+
+    El UPDATE solo toca stock_actual (más su estado y la fecha de actualización)
+    y el motor bloquea la fila mientras se ejecuta, así que varias terminales
+    vendiendo el mismo producto no pierden descuentos. Si es una salida y no hay stock
+    suficiente no se modifica nada y se lanza StockInsuficiente.
+    """
+    ajustar_stock_lote({producto: delta}, {variante: delta} if variante else None, origen)
+
+
+def _actualizar_condicional(modelo, campo, deltas, minimos=None, **extra):
+    """
+    UPDATE de ``campo`` += delta para todas las filas de ``deltas`` que no
+    quedarían en negativo ni, si están en ``minimos``, con el valor actual por
+    debajo de esa expresión. Los valores de ``extra`` que sean funciones
+    reciben la expresión del nuevo valor. Devuelve True si se actualizaron todas.
+    """
+    minimos = minimos or {}
+    condicion = Q()
+    casos = []
+    for objeto, delta in deltas.items():
+        filtro = Q(pk=objeto.pk, **{f'{campo}__gte': -delta}) if delta < 0 else Q(pk=objeto.pk)
+        if objeto in minimos:
+            filtro &= Q(**{f'{campo}__gte': minimos[objeto]})
+        condicion |= filtro
+        casos.append(When(pk=objeto.pk, then=Value(delta)))
+
+    nuevo = F(campo) + Case(*casos, output_field=IntegerField())
+    campos = {nombre: valor(nuevo) if callable(valor) else valor for nombre, valor in extra.items()}
+    return modelo.objects.filter(condicion).update(**{campo: nuevo}, **campos) == len(deltas)
+
+
+def _faltante(modelo, campo, deltas):
+    """El objeto de ``deltas`` sin stock suficiente (o la mayor salida si ya no falta)"""
+    disponibles = dict(modelo.objects.filter(pk__in=[o.pk for o in deltas]).values_list('pk', campo))
+    faltantes = [o for o, delta in deltas.items() if disponibles.get(o.pk, 0) + delta < 0]
+    # Si otra transacción repuso el stock entretanto, se reporta la mayor salida
+    return faltantes[0] if faltantes else min(deltas, key=deltas.get)
+
+
+def _sin_clasificar(deltas, variantes):
+    """
+    {producto: parte de su delta que no va a ninguna de ``variantes``}. Si el
+    producto tiene una sola variante esa parte es suya y se agrega a
+    ``variantes``; si tiene varias, la parte queda como stock sin clasificar.
+    """
+    asignado = defaultdict(int)
+    for variante, delta in variantes.items():
+        asignado[variante.producto_id] += delta
+    restos = {producto: delta - asignado[producto.pk] for producto, delta in deltas.items()}
+    restos = {producto: resto for producto, resto in restos.items() if resto}
+    if not restos:
+        return restos
+
+    productos = {producto.pk: producto for producto in restos}
+    unicas = (
+        ProductoVariante.objects.filter(producto_id__in=productos).order_by().values('producto_id')
+        .annotate(cantidad=Count('id'), unica=Max('id'), talla_unica=Max('talla'), color_unica=Max('color'))
+        .filter(cantidad=1)
+    )
+    for fila in unicas:
+        producto = productos[fila['producto_id']]
+        variante = ProductoVariante(
+            pk=fila['unica'], producto=producto, talla=fila['talla_unica'], color=fila['color_unica']
+        )
+        variantes[variante] = variantes.get(variante, 0) + restos.pop(producto)
+    return restos
+
+
+def ajustar_stock_lote(deltas, variantes=None, origen='movimiento'):
+    """
+    Aplica varios ajustes de stock ({producto: delta}) en un solo UPDATE, y
+    los de ``variantes`` ({variante: delta}) en otro, y los anota en el
+    historial (RegistroStock) con el ``origen`` indicado.
+    Lo que no va a ninguna variante se asigna a la única variante del producto
+    o, si tiene varias, al stock sin clasificar, que tampoco puede quedar negativo.
+    Si algún producto o variante no tiene stock suficiente no se aplica ninguno.
+    """
+    deltas = {producto: delta for producto, delta in deltas.items() if delta}
+    variantes = {variante: delta for variante, delta in (variantes or {}).items() if delta}
+    if not deltas:
+        return
+
+    restos = _sin_clasificar(deltas, variantes)
+    # Stock actual >= lo repartido entre variantes (antes de este UPDATE) más la salida sin clasificar
+    repartido = Coalesce(Subquery(
+        ProductoVariante.objects.filter(producto=OuterRef('pk')).order_by().values('producto')
+        .annotate(total=Sum('stock')).values('total')
+    ), 0)
+    minimos = {producto: repartido - resto for producto, resto in restos.items() if resto < 0}
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        productos_ok = _actualizar_condicional(
+            Producto, 'stock_actual', deltas, minimos,
+            estado=expresion_estado,
+            fecha_actualizacion=ahora,
+        )
+        variantes_ok = productos_ok and (
+            not variantes or _actualizar_condicional(ProductoVariante, 'stock', variantes)
+        )
+        if variantes_ok:
+            # Una fila por variante y otra por lo no clasificado: la suma de delta sigue siendo la del producto
+            RegistroStock.objects.bulk_create([
+                *(
+                    RegistroStock(
+                        producto_id=variante.producto_id, delta=delta, origen=origen, fecha=ahora,
+                        variante=variante, delta_variante=delta,
+                    )
+                    for variante, delta in variantes.items()
+                ),
+                *(
+                    RegistroStock(producto=producto, delta=resto, origen=origen, fecha=ahora)
+                    for producto, resto in restos.items()
+                ),
+            ])
+            transaction.on_commit(cache_catalogo.invalidar)
+            if eventos.difusor.hay_suscriptores():
+                ids_productos = [producto.pk for producto in deltas]
+                ids_variantes = [variante.pk for variante in variantes]
+                transaction.on_commit(lambda: eventos.publicar_stock(ids_productos, ids_variantes))
+            return
+        transaction.set_rollback(True)
+
+    if not productos_ok:
+        producto = _faltante(Producto, 'stock_actual', deltas)
+        raise StockInsuficiente(producto, -deltas[producto])
+    variante = _faltante(ProductoVariante, 'stock', variantes)
+    raise StockInsuficiente(variante, -variantes[variante])
 
 
 # ==========================================
@@ -130,6 +503,12 @@ class MovimientoInventario(models.Model):
         on_delete=models.PROTECT,
         related_name='movimientos'
     )
+    variante = models.ForeignKey(
+        ProductoVariante,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='movimientos'
+    )
     tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
     cantidad = models.PositiveIntegerField()
     fecha = models.DateTimeField(default=timezone.now)
@@ -141,30 +520,102 @@ class MovimientoInventario(models.Model):
     motivo = models.TextField(blank=True, null=True)
 
     def save(self, *args, **kwargs):
-        if not self.pk:
-            if self.tipo == 'entrada':
-                self.producto.stock_actual += self.cantidad
-            elif self.tipo == 'salida':
-                self.producto.stock_actual -= self.cantidad
-            elif self.tipo == 'devolucion':
-                self.producto.stock_actual += self.cantidad
-            elif self.tipo == 'ajuste':
-                self.producto.stock_actual += self.cantidad
-
-            if self.producto.stock_actual < 0:
-                self.producto.stock_actual = 0
-
-            self.producto.save()
-        
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not self.pk:
+                if self.tipo == 'salida':
+                    ajustar_stock(self.producto, -self.cantidad, self.variante)
+                else:
+                    # entrada, devolucion y ajuste suman al stock
+                    ajustar_stock(self.producto, self.cantidad, self.variante)
+
+            super().save(*args, **kwargs)
 
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['fecha', 'id'], name='movimiento_fecha_idx'),
+            # Historial de un producto ordenado por fecha
+            models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.tipo} - {self.producto.nombre} ({self.cantidad})"
 
 
+# ==========================================
+# HISTORIAL DE STOCK
+# ==========================================
+class RegistroStock(models.Model):
+    """
+    Cada cambio de Producto.stock_actual y de ProductoVariante.stock, solo se
+    agregan filas. Lo escriben ajustar_stock_lote() (ventas y movimientos),
+    Producto.save() (stock inicial y ediciones directas del stock) y
+    ProductoVariante.save() (reparto entre variantes). El stock de un producto
+    en una fecha es la suma de sus ``delta`` hasta esa fecha, y el de una
+    variante la de sus ``delta_variante`` (ver historial_stock.py).
+    """
+    ORIGEN_CHOICES = [
+        ('inicial', 'Stock inicial'),
+        ('venta', 'Venta'),
+        ('movimiento', 'Movimiento de inventario'),
+        ('edicion', 'Edición del producto'),
+        ('reparto', 'Reparto entre variantes'),
+    ]
+
+    # Los índices compuestos de Meta ya empiezan por producto
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='+', db_index=False)
+    delta = models.IntegerField()
+    # SET_NULL: el delta del producto sigue contando aunque se elimine la variante
+    variante = models.ForeignKey(
+        ProductoVariante, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_index=False
+    )
+    delta_variante = models.IntegerField(default=0)
+    origen = models.CharField(max_length=20, choices=ORIGEN_CHOICES)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("El historial de stock no se modifica")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("El historial de stock no se modifica")
+
+    class Meta:
+        ordering = ['fecha', 'id']
+        indexes = [
+            # Con delta incluido las sumas se resuelven solo con el índice
+            models.Index(fields=['producto', 'fecha', 'delta'], name='registro_stock_producto_idx'),
+            models.Index(fields=['fecha', 'producto', 'delta'], name='registro_stock_fecha_idx'),
+            models.Index(fields=['variante', 'fecha', 'delta_variante'], name='registro_stock_variante_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} {self.delta:+d} ({self.origen})"
+
+
+class CorteStock(models.Model):
+    """
+    Stock de cada producto en el instante ``fecha``. Un corte incluye todos los
+    productos con historial hasta esa fecha (también los que quedaron en 0).
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='+', db_index=False)
+    fecha = models.DateTimeField()
+    stock = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha'], name='corte_stock_fecha_idx'),
+        ]
+        constraints = [
+            # También sirve para buscar el último corte de un producto
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='corte_stock_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} @ {self.fecha}: {self.stock}"
+
+
 # ==========================================
 # CLIENTES
 # ==========================================
@@ -195,6 +646,11 @@ class Cliente(models.Model):
     
     def __str__(self):
         return self.nombre
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['nombre'], condition=Q(activo=True), name='cliente_activo_nombre_idx'),
+        ]
 
 
 # ==========================================
@@ -209,9 +665,12 @@ class Venta(models.Model):
         ('tarjeta', 'Tarjeta'),
     ]
     
-    fecha = models.DateTimeField(auto_now_add=True)
+    # Un POS sin conexión envía la hora en que vendió (ver CrearVentaSerializer.validate_fecha)
+    fecha = models.DateTimeField(default=timezone.now)
     canal_venta = models.CharField(max_length=20, choices=CANAL_CHOICES)
     empleado = models.ForeignKey(Empleado, on_delete=models.PROTECT)
+    # Identificador que asigna el POS: si reenvía la venta se devuelve la ya registrada
+    referencia = models.CharField(max_length=64, unique=True, null=True, blank=True)
     
     # Totales
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -225,6 +684,10 @@ class Venta(models.Model):
     
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            # Listado por -fecha y rangos fecha__gte de los reportes
+            models.Index(fields=['fecha', 'id'], name='venta_fecha_idx'),
+        ]
 
 
 # ==========================================
@@ -233,6 +696,10 @@ class Venta(models.Model):
 class DetalleVenta(models.Model):
     venta = models.ForeignKey(Venta, on_delete=models.CASCADE, related_name='detalles')
     producto = models.ForeignKey(Producto, on_delete=models.PROTECT)
+    # Talla y color vendidos; las ventas antiguas no la tienen
+    variante = models.ForeignKey(
+        ProductoVariante, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
     
     cantidad = models.IntegerField()
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
@@ -241,13 +708,91 @@ class DetalleVenta(models.Model):
     def save(self, *args, **kwargs):
         self.subtotal = self.cantidad * self.precio_unitario
         
-        if not self.pk:
-            self.producto.stock_actual -= self.cantidad
-            if self.producto.stock_actual < 0:
-                self.producto.stock_actual = 0
-            self.producto.save()
-        
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not self.pk:
+                ajustar_stock(self.producto, -self.cantidad, self.variante, origen='venta')
+
+            super().save(*args, **kwargs)
     
     def __str__(self):
-        return f"{self.producto.nombre} x{self.cantidad}"
\ No newline at end of file
+        return f"{self.producto.nombre} x{self.cantidad}"
+
+# ==========================================
+# RESUMEN DIARIO DE VENTAS (reportes)
+# ==========================================
+class ResumenVentaDiaria(models.Model):
+    """
+    Unidades, ingresos y descuentos por día, producto, canal y empleado.
+    Se mantiene desde inventario/reportes.py en la misma transacción que
+    registra la venta; el descuento de cada venta se reparte entre sus
+    productos en proporción al subtotal de cada línea.
+    """
+    dia = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='+')
+    canal_venta = models.CharField(max_length=20, choices=Venta.CANAL_CHOICES)
+    empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE, related_name='+')
+
+    unidades = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    descuento = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.dia} - {self.producto_id} ({self.unidades})"
+
+    class Meta:
+        verbose_name_plural = "Resúmenes de ventas diarias"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dia', 'producto', 'canal_venta', 'empleado'],
+                name='resumen_venta_diaria_unico',
+            ),
+        ]
+
+
+# ==========================================
+# TRABAJOS DE REPORTES (en segundo plano)
+# ==========================================
+class TrabajoReporte(models.Model):
+    """
+    Reporte de ventas pedido por POST /api/reportes/jobs/ y calculado por
+    ``python manage.py worker_reportes`` (ver inventario/trabajos_reportes.py).
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('terminado', 'Terminado'),
+        ('fallido', 'Fallido'),
+        ('cancelado', 'Cancelado'),
+    ]
+
+    # {"desde", "hasta", "granularidad", "dimensiones"} y su sha1 para reconocer pedidos iguales
+    parametros = models.JSONField()
+    firma = models.CharField(max_length=40, db_index=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    progreso = models.PositiveSmallIntegerField(default=0)
+    # Pedido de cancelación; el trabajador lo revisa entre tramos del cálculo
+    cancelar = models.BooleanField(default=False)
+    resultado = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+
+    creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    trabajador = models.CharField(max_length=100, blank=True)
+    # Cambia en cada reclamo: un proceso que perdió el trabajo (latido vencido y
+    # reclamado de nuevo, aunque sea por el mismo trabajador) ya no puede escribirlo
+    reclamo = models.UUIDField(null=True, blank=True, editable=False)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    # Lo renueva el trabajador mientras calcula; si se detiene, el trabajo vuelve a la cola
+    latido = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Reporte #{self.id} ({self.estado})"
+
+    class Meta:
+        ordering = ['-fecha_creacion', '-id']
+        indexes = [
+            # El trabajador toma el pendiente más antiguo
+            models.Index(fields=['estado', 'fecha_creacion', 'id'], name='trabajo_reporte_cola_idx'),
+        ]
@@ -0,0 +1,141 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import Max, Min, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class FechaKeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre (-fecha, -id).
+
+    Cada página se obtiene con un rango sobre el índice (fecha, id) en lugar de
+    COUNT(*) + OFFSET, así que la página 500 cuesta lo mismo que la primera y
+    las ventas nuevas no desplazan las páginas que el cliente ya recorrió.
+    El total solo se calcula si se pide: ?total=exacto o ?total=aproximado.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    total_query_param = 'total'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        fecha, pk, hacia_atras = self.decode_cursor(request)
+
+        if hacia_atras:
+            pagina = queryset.order_by('fecha', 'id')
+            if fecha is not None:
+                pagina = pagina.filter(Q(fecha__gt=fecha) | Q(fecha=fecha, id__gt=pk), fecha__gte=fecha)
+        else:
+            pagina = queryset.order_by('-fecha', '-id')
+            if fecha is not None:
+                pagina = pagina.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=pk), fecha__lte=fecha)
+
+        resultados = list(pagina[:self.page_size + 1])
+        hay_mas = len(resultados) > self.page_size
+        resultados = resultados[:self.page_size]
+        if hacia_atras:
+            resultados.reverse()
+
+        self.primero = resultados[0] if resultados else None
+        self.ultimo = resultados[-1] if resultados else None
+        if hacia_atras:
+            self.hay_siguiente, self.hay_anterior = fecha is not None, hay_mas
+        else:
+            self.hay_siguiente, self.hay_anterior = hay_mas, fecha is not None
+
+        self.total, self.total_aproximado = self.get_total(queryset, request)
+        return resultados
+
+    def get_paginated_response(self, data):
+        respuesta = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.total is not None:
+            respuesta['count'] = self.total
+            respuesta['count_aproximado'] = self.total_aproximado
+        respuesta['results'] = data
+        return Response(respuesta)
+
+    def get_page_size(self, request):
+        try:
+            tamano = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(tamano, self.max_page_size))
+
+    # ---------- cursores ----------
+    def decode_cursor(self, request):
+        codificado = request.query_params.get(self.cursor_query_param)
+        if not codificado:
+            return None, None, False
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(codificado.encode()).decode())
+            fecha = parse_datetime(datos['f'])
+            pk = int(datos['i'])
+            hacia_atras = bool(datos.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if fecha is None:
+            raise NotFound(self.invalid_cursor_message)
+        return fecha, pk, hacia_atras
+
+    def encode_cursor(self, objeto, hacia_atras):
+        datos = {'f': objeto.fecha.isoformat(), 'i': objeto.pk}
+        if hacia_atras:
+            datos['r'] = 1
+        codificado = base64.urlsafe_b64encode(json.dumps(datos).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, codificado)
+
+    def get_next_link(self):
+        if not self.hay_siguiente or self.ultimo is None:
+            return None
+        return self.encode_cursor(self.ultimo, hacia_atras=False)
+
+    def get_previous_link(self):
+        if not self.hay_anterior:
+            return None
+        if self.primero is None:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.primero, hacia_atras=True)
+
+    # ---------- total ----------
+    def get_total(self, queryset, request):
+        modo = request.query_params.get(self.total_query_param)
+        if modo == 'exacto':
+            return queryset.count(), False
+        if modo == 'aproximado':
+            return self.contar_aproximado(queryset), True
+        return None, False
+
+    def contar_aproximado(self, queryset):
+        """
+        Estimación barata del total: en PostgreSQL la del planificador; en otros
+        motores el rango de ids (cota superior que ignora los huecos por borrados).
+        """
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            sql, params = queryset.order_by().query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+
+        rango = queryset.order_by().aggregate(minimo=Min('pk'), maximo=Max('pk'))
+        if rango['maximo'] is None:
+            return 0
+        return rango['maximo'] - rango['minimo'] + 1
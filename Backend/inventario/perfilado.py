@@ -0,0 +1,118 @@
+"""
+Perfilado bajo demanda de peticiones de administradores.
+
+Una petición con la cabecera ``X-Perfilar: 1`` o el parámetro ``?perfilar=1``
+de un usuario que pasa IsAdmin se ejecuta bajo cProfile. El perfil se guarda
+en PERFILES_DIR con un id que se devuelve en la cabecera ``X-Perfil-Id`` y se
+consulta en GET /api/perfiles/<id>/ (resumen por tiempo acumulado, o el
+archivo .prof con ?formato=prof para snakeviz, gprof2dot o flameprof).
+
+Sin la cabecera ni el parámetro el middleware no hace nada más que mirar si
+están; la autenticación solo se repite para las peticiones que lo piden.
+"""
+import cProfile
+import io
+import json
+import pstats
+import re
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+CABECERA = 'HTTP_X_PERFILAR'
+PARAMETRO = 'perfilar'
+FORMATO_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _directorio():
+    directorio = Path(settings.PERFILES_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def _solicitado(request):
+    return request.META.get(CABECERA) == '1' or request.GET.get(PARAMETRO) == '1'
+
+
+def _es_admin(request):
+    # Importación local: views importa los módulos del paquete al cargarse
+    from .views import IsAdmin
+
+    peticion = Request(request, authenticators=[clase() for clase in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        return IsAdmin().has_permission(peticion, None)
+    except APIException:
+        return False
+
+
+def guardar(perfil, datos):
+    """Escribe <id>.prof y <id>.json y borra los más antiguos por encima de PERFILES_MAXIMO"""
+    directorio = _directorio()
+    perfil.dump_stats(directorio / f"{datos['id']}.prof")
+    (directorio / f"{datos['id']}.json").write_text(json.dumps(datos), encoding='utf-8')
+
+    metadatos = sorted(directorio.glob('*.json'), key=lambda archivo: archivo.stat().st_mtime, reverse=True)
+    for viejo in metadatos[settings.PERFILES_MAXIMO:]:
+        viejo.unlink(missing_ok=True)
+        viejo.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def listar():
+    metadatos = [json.loads(archivo.read_text(encoding='utf-8')) for archivo in _directorio().glob('*.json')]
+    return sorted(metadatos, key=lambda datos: datos['fecha'], reverse=True)
+
+
+def archivo_prof(perfil_id):
+    """Ruta del .prof de ``perfil_id`` o None si el id no es válido o no existe"""
+    if not FORMATO_ID.match(perfil_id):
+        return None
+    ruta = _directorio() / f'{perfil_id}.prof'
+    return ruta if ruta.exists() else None
+
+
+def obtener(perfil_id, funciones=60):
+    """Metadatos y resumen de texto (las ``funciones`` con más tiempo acumulado)"""
+    ruta = archivo_prof(perfil_id)
+    if ruta is None:
+        return None
+    salida = io.StringIO()
+    estadisticas = pstats.Stats(str(ruta), stream=salida)
+    estadisticas.strip_dirs().sort_stats('cumulative').print_stats(funciones)
+    datos = json.loads(ruta.with_suffix('.json').read_text(encoding='utf-8'))
+    return {**datos, 'resumen': salida.getvalue()}
+
+
+class PerfiladoMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _solicitado(request) or not _es_admin(request):
+            return self.get_response(request)
+
+        perfil = cProfile.Profile()
+        inicio = time.perf_counter()
+        perfil.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            perfil.disable()
+        duracion = time.perf_counter() - inicio
+
+        perfil_id = uuid.uuid4().hex
+        guardar(perfil, {
+            'id': perfil_id,
+            'fecha': timezone.now().isoformat(),
+            'metodo': request.method,
+            'ruta': request.get_full_path(),
+            'estado': response.status_code,
+            'duracion_ms': round(duracion * 1000, 2),
+        })
+        response['X-Perfil-Id'] = perfil_id
+        return response
@@ -0,0 +1,312 @@
+"""
+Mantenimiento del resumen diario de ventas (ResumenVentaDiaria) y cálculo de
+los reportes a partir de él, para que su costo dependa del número de días y
+no del número de ventas.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+
+from .models import DetalleVenta, ResumenVentaDiaria, Venta
+
+CENTAVO = Decimal('0.01')
+
+# Granularidad de ventas_por_periodo: (expresión del periodo, formato de la etiqueta)
+GRANULARIDADES = {
+    'dia': (lambda: F('dia'), '%Y-%m-%d'),
+    'semana': (lambda: TruncWeek('dia'), '%Y-%m-%d'),
+    'mes': (lambda: TruncMonth('dia'), '%Y-%m'),
+    'anio': (lambda: TruncYear('dia'), '%Y'),
+}
+
+# Dimensiones de ventas_por_periodo: {columna del resultado: campo del resumen}
+DIMENSIONES = {
+    'producto': {'producto': 'producto_id', 'producto_nombre': 'producto__nombre'},
+    'categoria': {'categoria': 'producto__categoria_id', 'categoria_nombre': 'producto__categoria__nombre'},
+    'canal': {'canal': 'canal_venta'},
+    'empleado': {'empleado': 'empleado_id'},
+}
+
+
+class ReporteCancelado(Exception):
+    """Lo lanza ventas_por_periodo cuando ``al_avanzar`` devuelve False"""
+
+
+def repartir_descuento(descuento, subtotales):
+    """
+    Reparte ``descuento`` entre las líneas en proporción a sus subtotales.
+    La última línea absorbe el redondeo para que la suma sea exacta.
+    """
+    if not subtotales:
+        return []
+    total = sum(subtotales, Decimal('0'))
+    if not descuento or not total:
+        partes = [Decimal('0')] * len(subtotales)
+        partes[0] = Decimal(descuento or 0)
+        return partes
+
+    partes = [(descuento * subtotal / total).quantize(CENTAVO) for subtotal in subtotales[:-1]]
+    partes.append(descuento - sum(partes, Decimal('0')))
+    return partes
+
+
+def contribuciones_venta(dia, canal_venta, empleado_id, descuento, lineas):
+    """
+    Convierte las líneas de una venta ([(producto_id, cantidad, subtotal)]) en
+    sumas por clave del resumen: {(dia, producto, canal, empleado): [unidades, ingresos, descuento]}
+    """
+    descuentos = repartir_descuento(Decimal(descuento or 0), [subtotal for _, _, subtotal in lineas])
+    sumas = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for (producto_id, cantidad, subtotal), descuento_linea in zip(lineas, descuentos):
+        suma = sumas[(dia, producto_id, canal_venta, empleado_id)]
+        suma[0] += cantidad
+        suma[1] += subtotal
+        suma[2] += descuento_linea
+    return sumas
+
+
+def registrar_venta(venta, detalles):
+    """
+    Suma una venta recién creada al resumen con dos consultas sin importar el
+    número de líneas: un INSERT de las claves que falten y un UPDATE que
+    incrementa todas a la vez. Debe llamarse dentro de la transacción de la venta.
+    """
+    dia = timezone.localdate(venta.fecha)
+    sumas = contribuciones_venta(
+        dia, venta.canal_venta, venta.empleado_id, venta.descuento,
+        [(d.producto_id, d.cantidad, d.subtotal) for d in detalles],
+    )
+    if not sumas:
+        return
+
+    ResumenVentaDiaria.objects.bulk_create(
+        [
+            ResumenVentaDiaria(dia=dia, producto_id=producto_id, canal_venta=canal, empleado_id=empleado_id)
+            for dia, producto_id, canal, empleado_id in sumas
+        ],
+        ignore_conflicts=True,
+    )
+
+    def incremento(campo, posicion, output_field):
+        casos = [
+            When(producto_id=producto_id, then=Value(suma[posicion]))
+            for (_, producto_id, _, _), suma in sumas.items()
+        ]
+        return F(campo) + Case(*casos, default=Value(0), output_field=output_field)
+
+    ResumenVentaDiaria.objects.filter(
+        dia=dia, canal_venta=venta.canal_venta, empleado_id=venta.empleado_id,
+        producto_id__in=[producto_id for _, producto_id, _, _ in sumas],
+    ).update(
+        unidades=incremento('unidades', 0, IntegerField()),
+        ingresos=incremento('ingresos', 1, DecimalField(max_digits=14, decimal_places=2)),
+        descuento=incremento('descuento', 2, DecimalField(max_digits=14, decimal_places=2)),
+    )
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _bloquear_resumen():
+    """
+    Impide que otras transacciones escriban en el resumen hasta que termine la
+    actual; las lecturas siguen. En SQLite basta con escribir primero: la
+    primera escritura toma el bloqueo de toda la base.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'LOCK TABLE {connection.ops.quote_name(ResumenVentaDiaria._meta.db_table)} '
+                'IN SHARE ROW EXCLUSIVE MODE'
+            )
+
+
+def _totales_ventas(desde, hasta):
+    """Sumas del resumen calculadas desde las líneas de venta de los días indicados"""
+    lineas = (
+        DetalleVenta.objects
+        .filter(
+            venta__fecha__gte=_inicio_del_dia(desde),
+            venta__fecha__lt=_inicio_del_dia(hasta + timedelta(days=1)),
+        )
+        .order_by('venta_id', 'id')
+        .values_list(
+            'venta_id', 'venta__fecha', 'venta__canal_venta', 'venta__empleado_id',
+            'venta__descuento', 'producto_id', 'cantidad', 'subtotal',
+        )
+    )
+
+    totales = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+
+    def acumular(venta, lineas_venta):
+        _, fecha, canal, empleado_id, descuento = venta
+        sumas = contribuciones_venta(timezone.localdate(fecha), canal, empleado_id, descuento, lineas_venta)
+        for clave, suma in sumas.items():
+            total = totales[clave]
+            for posicion in range(3):
+                total[posicion] += suma[posicion]
+
+    venta_actual = None
+    lineas_venta = []
+    for venta_id, fecha, canal, empleado_id, descuento, producto_id, cantidad, subtotal in lineas.iterator(chunk_size=5000):
+        if venta_actual is None or venta_actual[0] != venta_id:
+            if venta_actual is not None:
+                acumular(venta_actual, lineas_venta)
+            venta_actual = (venta_id, fecha, canal, empleado_id, descuento)
+            lineas_venta = []
+        lineas_venta.append((producto_id, cantidad, subtotal))
+    if venta_actual is not None:
+        acumular(venta_actual, lineas_venta)
+    return totales
+
+
+def reconstruir_resumen(desde, hasta):
+    """
+    Recalcula desde las ventas el resumen de los días entre ``desde`` y ``hasta``
+    (fechas locales, ambos incluidos). Se usa al editar o eliminar ventas y en
+    el comando backfill_resumen_ventas.
+
+    Las ventas se leen con el resumen bloqueado y en la misma transacción que
+    lo reemplaza: una venta que registrar_venta suma mientras tanto espera al
+    final y no se pierde al borrar las filas de esos días.
+    """
+    with transaction.atomic():
+        _bloquear_resumen()
+        ResumenVentaDiaria.objects.filter(dia__gte=desde, dia__lte=hasta).delete()
+        totales = _totales_ventas(desde, hasta)
+        ResumenVentaDiaria.objects.bulk_create(
+            [
+                ResumenVentaDiaria(
+                    dia=dia, producto_id=producto_id, canal_venta=canal, empleado_id=empleado_id,
+                    unidades=unidades, ingresos=ingresos, descuento=descuento,
+                )
+                for (dia, producto_id, canal, empleado_id), (unidades, ingresos, descuento) in totales.items()
+            ],
+            batch_size=5000,
+        )
+    return len(totales)
+
+
+def dias_sin_resumen():
+    """
+    Días locales con ventas que no aparecen en el resumen, más el primero que
+    sí aparece: si el resumen empezó a llenarse a mitad de ese día (ventas
+    sumadas por registrar_venta antes de reconstruirlo), le faltan las anteriores.
+    """
+    resumidos = set(ResumenVentaDiaria.objects.order_by().values_list('dia', flat=True).distinct())
+    con_ventas = set(
+        Venta.objects.filter(detalles__isnull=False)
+        .annotate(dia=TruncDate('fecha'))
+        .order_by()
+        .values_list('dia', flat=True)
+        .distinct()
+    )
+    faltantes = con_ventas - resumidos
+    if resumidos:
+        faltantes.add(min(resumidos))
+    return sorted(faltantes)
+
+
+def resumen_ventas(desde, hasta):
+    """
+    Totales, top 5 de productos y serie mensual entre dos fechas locales
+    (ambas incluidas), leyendo solo el resumen diario.
+    """
+    filas = ResumenVentaDiaria.objects.filter(dia__gte=desde, dia__lte=hasta).order_by()
+
+    totales = filas.aggregate(ingresos=Sum(F('ingresos') - F('descuento')), descuentos=Sum('descuento'))
+
+    top_productos = (
+        filas.values('producto__id', 'producto__nombre')
+        .annotate(cantidad_vendida=Sum('unidades'), ingresos=Sum('ingresos'))
+        .order_by('-cantidad_vendida')[:5]
+    )
+
+    serie_temporal = (
+        filas.annotate(mes=TruncMonth('dia'))
+        .values('mes')
+        .annotate(total=Sum(F('ingresos') - F('descuento')))
+        .order_by('mes')
+    )
+
+    return {
+        "totales": {
+            "ingresos": totales['ingresos'] or 0,
+            "descuentos": totales['descuentos'] or 0,
+        },
+        "top_productos": list(top_productos),
+        "serie_temporal": [
+            {"mes": item["mes"].strftime("%Y-%m"), "total": item["total"]} for item in serie_temporal
+        ],
+    }
+
+
+def ventas_por_periodo(desde, hasta, granularidad='mes', dimensiones=(), al_avanzar=None, dias_por_tramo=92):
+    """
+    Unidades, ingresos y descuentos entre dos fechas locales (ambas incluidas)
+    por periodo y por las ``dimensiones`` pedidas, leyendo el resumen diario.
+
+    Se consulta por tramos de ``dias_por_tramo`` días; después de cada uno se
+    llama ``al_avanzar(fraccion)`` y si devuelve False se lanza ReporteCancelado.
+    Un periodo partido entre dos tramos se suma al juntar los resultados.
+    """
+    periodo, formato = GRANULARIDADES[granularidad]
+    columnas = {columna: campo for dimension in dimensiones for columna, campo in DIMENSIONES[dimension].items()}
+    dias = (hasta - desde).days + 1
+
+    sumas = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    inicio = desde
+    while inicio <= hasta:
+        fin = min(inicio + timedelta(days=dias_por_tramo - 1), hasta)
+        filas = (
+            ResumenVentaDiaria.objects.filter(dia__gte=inicio, dia__lte=fin)
+            .annotate(periodo=periodo())
+            .values('periodo', *columnas.values())
+            .annotate(unidades=Sum('unidades'), ingresos=Sum('ingresos'), descuento=Sum('descuento'))
+            .order_by()
+        )
+        for fila in filas:
+            suma = sumas[(fila['periodo'], *(fila[campo] for campo in columnas.values()))]
+            suma[0] += fila['unidades']
+            suma[1] += fila['ingresos']
+            suma[2] += fila['descuento']
+
+        inicio = fin + timedelta(days=1)
+        if al_avanzar is not None and al_avanzar(min((inicio - desde).days / dias, 1)) is False:
+            raise ReporteCancelado()
+
+    # Por periodo y, dentro de cada uno, de mayor a menor venta neta
+    def orden(item):
+        (fecha_periodo, *valores), (_, ingresos, descuento) = item
+        return fecha_periodo, descuento - ingresos, [str(valor) for valor in valores]
+
+    resultado = []
+    for (fecha_periodo, *valores), (unidades, ingresos, descuento) in sorted(sumas.items(), key=orden):
+        # Misma escala en SQLite y PostgreSQL
+        ingresos, descuento = ingresos.quantize(CENTAVO), descuento.quantize(CENTAVO)
+        resultado.append({
+            'periodo': fecha_periodo.strftime(formato),
+            **dict(zip(columnas, valores)),
+            'unidades': unidades,
+            'ingresos': ingresos,
+            'descuento': descuento,
+            'neto': ingresos - descuento,
+        })
+
+    ingresos = sum((fila['ingresos'] for fila in resultado), Decimal('0'))
+    descuentos = sum((fila['descuento'] for fila in resultado), Decimal('0'))
+    return {
+        'totales': {
+            'unidades': sum(fila['unidades'] for fila in resultado),
+            'ingresos': ingresos,
+            'descuentos': descuentos,
+            'neto': ingresos - descuentos,
+        },
+        'filas': resultado,
+    }
@@ -1,30 +1,67 @@
 from rest_framework import serializers
+from collections import defaultdict
+from datetime import timedelta
 from decimal import Decimal
-from django.db import transaction
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+from . import imagenes, metricas, reportes, sqlite
 from .models import (
-    Categoria, Coleccion, Producto,
+    Categoria, Coleccion, Producto, ProductoVariante,
     Venta, DetalleVenta, MovimientoInventario,
-    Cliente, Empleado
+    Cliente, Empleado, TrabajoReporte, StockInsuficiente, ajustar_stock_lote
 )
 from django.contrib.auth.models import User
 
 
+class SerializerMedido(serializers.ModelSerializer):
+    """ModelSerializer que suma su to_representation al tramo 'serializacion' (metricas.py)"""
+
+    def to_representation(self, instance):
+        with metricas.medir('serializacion'):
+            return super().to_representation(instance)
+
+
+class ValidaEnElModelo:
+    """
+    Las reglas de stock se comprueban en save() con la fila bloqueada; el
+    ValidationError de Django que lanza se devuelve como un 400.
+    """
+
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.message_dict)
+
+
 # ==========================================
 # CATEGORÍAS, COLECCIONES, PRODUCTOS
 # ==========================================
-class CategoriaSerializer(serializers.ModelSerializer):
+class CategoriaSerializer(SerializerMedido):
     class Meta:
         model = Categoria
         fields = '__all__'
 
 
-class ColeccionSerializer(serializers.ModelSerializer):
+class ColeccionSerializer(SerializerMedido):
     class Meta:
         model = Coleccion
         fields = '__all__'
 
 
-class ProductoSerializer(serializers.ModelSerializer):
+class ProductoVarianteSerializer(ValidaEnElModelo, SerializerMedido):
+    """El stock repartido entre variantes no puede superar el total del producto (ver ProductoVariante.save)"""
+
+    class Meta:
+        model = ProductoVariante
+        fields = ('id', 'producto', 'talla', 'color', 'stock')
+        read_only_fields = ('producto', 'talla', 'color')
+
+
+class ProductoSerializer(ValidaEnElModelo, SerializerMedido):
     categoria_nombre = serializers.CharField(source='categoria.nombre', read_only=True)
     coleccion_nombre = serializers.CharField(source='coleccion.nombre', read_only=True)
     
@@ -35,35 +72,42 @@ class ProductoSerializer(serializers.ModelSerializer):
     # Campos adicionales para colores
     lista_colores = serializers.ListField(read_only=True)
     cantidad_colores = serializers.IntegerField(read_only=True)
+    # Se crean a partir de tallas y colores
+    variantes = ProductoVarianteSerializer(many=True, read_only=True)
+    # {tamaño: {webp, jpeg}} para no descargar la imagen original; null mientras se generan
+    imagenes = serializers.SerializerMethodField()
 
     class Meta:
         model = Producto
         fields = (
             'id', 'nombre', 'categoria', 'categoria_nombre', 'coleccion', 
-            'coleccion_nombre', 'tallas', 'colores', 'lista_colores', 'cantidad_colores',
-            'descripcion', 'imagen', 'precio_unitario', 'stock_actual', 'stock_minimo', 
+            'coleccion_nombre', 'tallas', 'colores', 'lista_colores', 'cantidad_colores', 'variantes',
+            'descripcion', 'imagen', 'imagenes', 'precio_unitario', 'stock_actual', 'stock_minimo', 
             'fecha_creacion', 'fecha_actualizacion', 'activo',
             'stock_bajo', 'sin_stock', 'estado'
         )
         read_only_fields = ('fecha_creacion', 'fecha_actualizacion')
 
+    def get_imagenes(self, obj):
+        return imagenes.urls(obj.imagenes, self.context.get('request'))
+
 
 # ==========================================
 # CLIENTES Y EMPLEADOS
 # ==========================================
-class ClienteSerializer(serializers.ModelSerializer):
+class ClienteSerializer(SerializerMedido):
     class Meta:
         model = Cliente
         fields = '__all__'
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SerializerMedido):
     class Meta:
         model = User
         fields = ('id', 'first_name', 'last_name', 'email', 'is_staff', 'username')
 
 
-class EmpleadoSerializer(serializers.ModelSerializer):
+class EmpleadoSerializer(SerializerMedido):
     user = UserSerializer(read_only=True)
     nombre_completo = serializers.SerializerMethodField()
 
@@ -78,7 +122,7 @@ class EmpleadoSerializer(serializers.ModelSerializer):
 # ==========================================
 # MOVIMIENTOS DE INVENTARIO
 # ==========================================
-class MovimientoInventarioSerializer(serializers.ModelSerializer):
+class MovimientoInventarioSerializer(SerializerMedido):
     producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
     empleado_nombre = serializers.CharField(source='empleado.user.get_full_name', read_only=True)
 
@@ -87,30 +131,42 @@ class MovimientoInventarioSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('fecha',)
 
+    def validate(self, data):
+        variante = data.get('variante')
+        if variante is not None and variante.producto_id != data['producto'].pk:
+            raise serializers.ValidationError({'variante': ["La variante no pertenece al producto."]})
+        return data
+
+    def create(self, validated_data):
+        try:
+            return sqlite.reintentar_si_bloqueada(super().create, validated_data)
+        except StockInsuficiente as error:
+            raise serializers.ValidationError({'cantidad': [str(error)]})
+
 
 # ==========================================
 # DETALLES Y VENTAS
 # ==========================================
-class DetalleVentaSerializer(serializers.ModelSerializer):
+class DetalleVentaSerializer(SerializerMedido):
     producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
 
     class Meta:
         model = DetalleVenta
         fields = [
-            'id', 'venta', 'producto', 'producto_nombre',
+            'id', 'venta', 'producto', 'producto_nombre', 'variante',
             'cantidad', 'precio_unitario', 'subtotal'
         ]
         read_only_fields = ('venta', 'producto_nombre', 'subtotal')
 
 
-class VentaSerializer(serializers.ModelSerializer):
+class VentaSerializer(SerializerMedido):
     detalles = DetalleVentaSerializer(many=True, read_only=True)
     empleado_nombre = serializers.CharField(source='empleado.user.get_full_name', read_only=True)
 
     class Meta:
         model = Venta
         fields = [
-            'id', 'fecha', 'canal_venta',
+            'id', 'fecha', 'referencia', 'canal_venta',
             'empleado', 'empleado_nombre',
             'subtotal', 'descuento', 'total',
             'notas', 'detalles'
@@ -120,33 +176,189 @@ class VentaSerializer(serializers.ModelSerializer):
 # ==========================================
 # CREAR VENTA (incluye detalles)
 # ==========================================
-class CrearVentaSerializer(serializers.ModelSerializer):
-    detalles = DetalleVentaSerializer(many=True)
+def ventas_repetidas(referencias):
+    """
+    {referencia: venta} de las ``referencias`` ya registradas, con una consulta.
+    Las ventas devueltas se marcan con ``repetida = True``.
+    """
+    referencias = {referencia for referencia in referencias if referencia is not None}
+    if not referencias:
+        return {}
+    ventas = {venta.referencia: venta for venta in Venta.objects.filter(referencia__in=referencias)}
+    for venta in ventas.values():
+        venta.repetida = True
+    return ventas
+
+
+class CrearDetalleVentaSerializer(DetalleVentaSerializer):
+    """
+    Detalle de una venta nueva. El producto y la variante se reciben como id
+    y se resuelven para todas las líneas a la vez en
+    CrearVentaSerializer.validate_detalles.
+    """
+    producto = serializers.IntegerField(source='producto_id')
+    variante = serializers.IntegerField(source='variante_id', required=False, allow_null=True)
+
+    class Meta(DetalleVentaSerializer.Meta):
+        pass
+
+
+class CrearVentaSerializer(SerializerMedido):
+    detalles = CrearDetalleVentaSerializer(many=True)
+    # Sin UniqueValidator: al crear, una referencia ya registrada devuelve esa
+    # venta (ver create); al editar la valida validate_referencia
+    referencia = serializers.CharField(max_length=64, required=False, allow_null=True)
 
     class Meta:
         model = Venta
         fields = [
-            'id', 'fecha',
+            'id', 'fecha', 'referencia',
             'canal_venta', 'empleado',
             'subtotal', 'descuento', 'total',
             'notas', 'detalles'
         ]
-        read_only_fields = ('id', 'fecha')
+        read_only_fields = ('id',)
+
+    def validate_fecha(self, fecha):
+        """Hora de la venta en el POS; se admite un pequeño desfase de reloj hacia el futuro"""
+        limite = timezone.now() + timedelta(seconds=settings.VENTAS_FECHA_TOLERANCIA_SEGUNDOS)
+        if fecha > limite:
+            raise serializers.ValidationError("La fecha de la venta no puede estar en el futuro.")
+        return fecha
+
+    def validate_referencia(self, referencia):
+        """Al editar una venta no se le puede poner la referencia de otra"""
+        if self.instance is not None and referencia is not None and (
+            Venta.objects.filter(referencia=referencia).exclude(pk=self.instance.pk).exists()
+        ):
+            raise serializers.ValidationError("Ya existe otra venta con esta referencia.")
+        return referencia
+
+    def validate_detalles(self, detalles):
+        """
+        Carga todos los productos (y variantes) de la venta con una consulta por
+        tabla. Una línea sin variante descuenta del stock sin clasificar del
+        producto, o de su variante si tiene una sola (ver ajustar_stock_lote).
+        """
+        ids = {d['producto_id'] for d in detalles}
+        ids_variantes = {d['variante_id'] for d in detalles if d.get('variante_id') is not None}
+        variantes = ProductoVariante.objects.in_bulk(ids_variantes) if ids_variantes else {}
+        # La carga masiva comparte un dict de productos entre todas las ventas del lote
+        productos = self.context.get('productos')
+        if productos is None:
+            productos = Producto.objects.in_bulk(ids)
+        elif not ids <= productos.keys():
+            productos.update(Producto.objects.in_bulk(ids - productos.keys()))
+
+        errores = []
+        for detalle in detalles:
+            producto = productos.get(detalle['producto_id'])
+            variante_id = detalle.pop('variante_id', None)
+            variante = variantes.get(variante_id)
+            if producto is None:
+                errores.append({'producto': [f"Producto {detalle['producto_id']} no existe."]})
+            elif variante_id is not None and (variante is None or variante.producto_id != producto.pk):
+                errores.append({'variante': [f"La variante {variante_id} no pertenece al producto."]})
+            else:
+                errores.append({})
+                detalle['producto'] = producto
+                del detalle['producto_id']
+                if variante is not None:
+                    variante.producto = producto
+                    detalle['variante'] = variante
+
+        if any(errores):
+            raise serializers.ValidationError(errores)
+        return detalles
 
     def create(self, validated_data):
+        try:
+            return sqlite.reintentar_si_bloqueada(self._registrar, validated_data)
+        except StockInsuficiente as error:
+            raise serializers.ValidationError({'detalles': [str(error)]})
+        except IntegrityError:
+            # Otra petición registró la misma referencia entretanto
+            existente = ventas_repetidas([validated_data.get('referencia')]).get(validated_data.get('referencia'))
+            if existente is None:
+                raise
+            return existente
+
+    def _registrar(self, validated_data):
+        """Guarda la venta en una transacción; se repite entera si la base está bloqueada"""
+        validated_data = dict(validated_data)
         detalles_data = validated_data.pop('detalles')
+
+        detalles = []
+        cantidades = defaultdict(int)
+        cantidades_variante = defaultdict(int)
+        for detalle_data in detalles_data:
+            detalle = DetalleVenta(**detalle_data)
+            detalle.subtotal = detalle.cantidad * detalle.precio_unitario
+            detalles.append(detalle)
+            cantidades[detalle.producto] += detalle.cantidad
+            if detalle.variante is not None:
+                cantidades_variante[detalle.variante] += detalle.cantidad
+
+        subtotal = sum((detalle.subtotal for detalle in detalles), Decimal('0'))
+        descuento = validated_data.get('descuento', Decimal('0')) or Decimal('0')
+        validated_data.update(subtotal=subtotal, descuento=descuento, total=subtotal - descuento)
+
         with transaction.atomic():
             venta = Venta.objects.create(**validated_data)
-            subtotal = Decimal('0')
-            for detalle_data in detalles_data:
-                cantidad = Decimal(detalle_data['cantidad'])
-                precio_unitario = Decimal(str(detalle_data['precio_unitario']))
-                subtotal += cantidad * precio_unitario
-                DetalleVenta.objects.create(venta=venta, **detalle_data)
-
-            venta.subtotal = subtotal
-            venta.descuento = validated_data.get('descuento', Decimal('0')) or Decimal('0')
-            venta.total = subtotal - venta.descuento
-            venta.save()
-
+            for detalle in detalles:
+                detalle.venta = venta
+            # bulk_create no llama a DetalleVenta.save(): el stock se descuenta
+            # agregado por producto (y por variante) en un único UPDATE por tabla
+            DetalleVenta.objects.bulk_create(detalles)
+            ajustar_stock_lote(
+                {producto: -cantidad for producto, cantidad in cantidades.items()},
+                {variante: -cantidad for variante, cantidad in cantidades_variante.items()},
+                origen='venta',
+            )
+            reportes.registrar_venta(venta, detalles)
         return venta
+
+    def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], Prefetch('detalles', queryset=DetalleVenta.objects.select_related('producto'))
+        )
+        return super().to_representation(instance)
+
+
+# ==========================================
+# REPORTES EN SEGUNDO PLANO
+# ==========================================
+class TrabajoReporteSerializer(SerializerMedido):
+    """Estado del trabajo; el resultado se pide en .../resultado/"""
+
+    class Meta:
+        model = TrabajoReporte
+        fields = (
+            'id', 'parametros', 'estado', 'progreso', 'cancelar', 'error',
+            'fecha_creacion', 'fecha_inicio', 'fecha_fin',
+        )
+        read_only_fields = fields
+
+
+class CrearTrabajoReporteSerializer(serializers.Serializer):
+    desde = serializers.DateField()
+    hasta = serializers.DateField()
+    granularidad = serializers.ChoiceField(choices=list(reportes.GRANULARIDADES), default='mes')
+    dimensiones = serializers.ListField(
+        child=serializers.ChoiceField(choices=list(reportes.DIMENSIONES)), default=list
+    )
+
+    def validate(self, attrs):
+        if attrs['hasta'] < attrs['desde']:
+            raise serializers.ValidationError({'hasta': 'Debe ser igual o posterior a desde'})
+        return attrs
+
+    def parametros(self):
+        """Parámetros normalizados: el mismo pedido siempre da la misma firma"""
+        datos = self.validated_data
+        return {
+            'desde': datos['desde'].isoformat(),
+            'hasta': datos['hasta'].isoformat(),
+            'granularidad': datos['granularidad'],
+            'dimensiones': [dimension for dimension in reportes.DIMENSIONES if dimension in datos['dimensiones']],
+        }
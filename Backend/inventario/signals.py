@@ -0,0 +1,136 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import autenticacion, cache_catalogo, cache_reportes, consultas_lentas, imagenes, reportes, sqlite
+from .models import Categoria, Coleccion, Empleado, Producto, ProductoVariante, Venta, DetalleVenta
+
+
+def _reconstruir_dia(fecha):
+    """Recalcula el resumen diario del día de ``fecha`` al confirmar la transacción"""
+    dia = timezone.localdate(fecha)
+    transaction.on_commit(lambda: reportes.reconstruir_resumen(dia, dia))
+    transaction.on_commit(cache_reportes.invalidar)
+
+
+def _borrado_desde_venta(origin):
+    if isinstance(origin, QuerySet):
+        return origin.model is Venta
+    return isinstance(origin, Venta)
+
+
+# La creación normal de ventas (CrearVentaSerializer) actualiza el resumen de
+# forma incremental; estas señales cubren ediciones, borrados y detalles
+# guardados uno a uno (admin, shell).
+@receiver(pre_save, sender=Venta)
+def venta_por_guardar(sender, instance, **kwargs):
+    # La fecha se puede editar: el día que deja también hay que recalcularlo
+    if instance.pk is not None:
+        instance._fecha_anterior = Venta.objects.filter(pk=instance.pk).values_list('fecha', flat=True).first()
+
+
+@receiver(post_save, sender=Venta)
+def venta_guardada(sender, instance, created, **kwargs):
+    if created:
+        # Los reportes en caché ya no incluyen esta venta
+        transaction.on_commit(cache_reportes.invalidar)
+        return
+    _reconstruir_dia(instance.fecha)
+    anterior = getattr(instance, '_fecha_anterior', None)
+    if anterior is not None and timezone.localdate(anterior) != timezone.localdate(instance.fecha):
+        _reconstruir_dia(anterior)
+
+
+@receiver(post_delete, sender=Venta)
+def venta_eliminada(sender, instance, **kwargs):
+    _reconstruir_dia(instance.fecha)
+
+
+@receiver(post_save, sender=DetalleVenta)
+def detalle_guardado(sender, instance, **kwargs):
+    _reconstruir_dia(instance.venta.fecha)
+
+
+@receiver(post_delete, sender=DetalleVenta)
+def detalle_eliminado(sender, instance, origin=None, **kwargs):
+    # Al borrar una venta sus detalles caen en cascada: basta con la señal de la venta
+    if not _borrado_desde_venta(origin):
+        _reconstruir_dia(instance.venta.fecha)
+
+
+# Cualquier escritura del catálogo cambia el ETag de sus listados. Los ajustes
+# de stock por UPDATE no emiten señales y renuevan la versión en ajustar_stock_lote.
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=ProductoVariante)
+@receiver([post_save, post_delete], sender=Categoria)
+@receiver([post_save, post_delete], sender=Coleccion)
+def catalogo_modificado(sender, **kwargs):
+    transaction.on_commit(cache_catalogo.invalidar)
+
+
+@receiver(post_save, sender=Producto)
+def imagen_guardada(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'imagen' not in update_fields:
+        return
+    if imagenes.pendiente(instance):
+        imagenes.programar(instance)
+
+
+# Cambios que alteran cómo se ve un producto sin pasar por Producto.save():
+# se marca fecha_actualizacion para que /api/productos/changes/ los entregue.
+def _marcar_productos(**filtro):
+    Producto.objects.filter(**filtro).update(fecha_actualizacion=timezone.now())
+
+
+@receiver(post_save, sender=ProductoVariante)
+@receiver(post_delete, sender=ProductoVariante)
+def variante_modificada(sender, instance, **kwargs):
+    _marcar_productos(pk=instance.producto_id)
+
+
+@receiver(post_save, sender=Categoria)
+def categoria_guardada(sender, instance, created, **kwargs):
+    if not created:
+        _marcar_productos(categoria=instance)
+
+
+@receiver(post_save, sender=Coleccion)
+def coleccion_guardada(sender, instance, created, **kwargs):
+    if not created:
+        _marcar_productos(coleccion=instance)
+
+
+@receiver(pre_delete, sender=Coleccion)
+def coleccion_eliminada(sender, instance, **kwargs):
+    # Después del borrado los productos ya tienen coleccion=NULL y no se pueden encontrar
+    _marcar_productos(coleccion=instance)
+
+
+@receiver(connection_created)
+def conexion_creada(sender, connection, **kwargs):
+    sqlite.configurar_conexion(connection)
+    consultas_lentas.instalar(connection)
+
+
+# Rol y estado de los tokens ya emitidos (ver autenticacion.py). Un usuario
+# nuevo aún no tiene tokens, y el inicio de sesión solo guarda last_login.
+@receiver(post_save, sender=User)
+def usuario_guardado(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    autenticacion.registrar_cambio(instance)
+
+
+@receiver(post_save, sender=Empleado)
+@receiver(post_delete, sender=Empleado)
+def empleado_modificado(sender, instance, **kwargs):
+    autenticacion.registrar_cambio(instance.user)
+
+
+@receiver(post_delete, sender=User)
+def usuario_eliminado(sender, instance, **kwargs):
+    autenticacion.registrar_eliminacion(instance.pk)
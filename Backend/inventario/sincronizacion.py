@@ -0,0 +1,95 @@
+"""
+Sincronización incremental del catálogo para las terminales.
+
+El token es la posición (fecha_actualizacion, id) del último producto
+entregado. Cada consulta es un rango sobre el índice
+producto_actualizacion_idx, así que su costo depende de los cambios y no
+del tamaño del catálogo.
+
+fecha_actualizacion se marca cuando se escribe la fila, no cuando confirma su
+transacción, así que una transacción larga (un /api/ventas/bulk/ grande)
+puede confirmar filas con fechas anteriores a un token ya entregado. En
+PostgreSQL el rango se corta en el inicio de la transacción de escritura
+abierta más antigua (pg_stat_activity; el usuario de la aplicación ve sus
+propias sesiones), más SINCRONIZACION_MARGEN_SEGUNDOS por la diferencia de
+reloj entre servidores. En SQLite no hay cómo verlas: el margen debe cubrir
+la transacción de escritura más larga.
+"""
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+class TokenInvalido(ValueError):
+    pass
+
+
+def codificar_token(fecha, pk):
+    datos = {'f': fecha.isoformat(), 'i': pk}
+    return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode()
+
+
+def decodificar_token(token):
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+        fecha = parse_datetime(datos['f'])
+        pk = int(datos['i'])
+    except (TypeError, ValueError, KeyError):
+        raise TokenInvalido(token)
+    if fecha is None:
+        raise TokenInvalido(token)
+    return fecha, pk
+
+
+def _inicio_escritura_mas_antigua(alias):
+    """Inicio de la transacción de escritura abierta más antigua de otra sesión (solo PostgreSQL)"""
+    conexion = connections[alias]
+    if conexion.vendor != 'postgresql':
+        return None
+    with conexion.cursor() as cursor:
+        # Dentro de una transacción pg_stat_activity se lee una sola vez si no se descarta
+        cursor.execute("SELECT pg_stat_clear_snapshot()")
+        # backend_xid solo existe cuando la transacción ya escribió algo
+        cursor.execute(
+            "SELECT min(xact_start) FROM pg_stat_activity "
+            "WHERE datname = current_database() AND backend_xid IS NOT NULL AND pid <> pg_backend_pid()"
+        )
+        return cursor.fetchone()[0]
+
+
+def cambios_desde(queryset, token=None, limite=None):
+    """
+    Productos de ``queryset`` modificados después de ``token`` (o todos si no
+    hay token), en orden de modificación. Incluye los inactivos, que la
+    terminal debe quitar de su copia local.
+
+    Devuelve (productos, nuevo_token, hay_mas).
+    """
+    limite = limite or settings.SINCRONIZACION_LIMITE
+    # Lo que pueden confirmar más tarde las transacciones abiertas con una fecha
+    # anterior se entrega en una consulta siguiente
+    hasta = timezone.now()
+    inicio = _inicio_escritura_mas_antigua(queryset.db)
+    if inicio is not None:
+        hasta = min(hasta, inicio)
+    hasta -= timedelta(seconds=settings.SINCRONIZACION_MARGEN_SEGUNDOS)
+    cambios = queryset.filter(fecha_actualizacion__lte=hasta).order_by('fecha_actualizacion', 'id')
+    if token:
+        fecha, pk = decodificar_token(token)
+        cambios = cambios.filter(
+            Q(fecha_actualizacion__gt=fecha) | Q(fecha_actualizacion=fecha, id__gt=pk),
+            fecha_actualizacion__gte=fecha,
+        )
+
+    productos = list(cambios[:limite + 1])
+    hay_mas = len(productos) > limite
+    productos = productos[:limite]
+    if productos:
+        token = codificar_token(productos[-1].fecha_actualizacion, productos[-1].pk)
+    return productos, token, hay_mas
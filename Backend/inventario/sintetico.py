@@ -0,0 +1,202 @@
+"""
+Generación de datos sintéticos para benchmarks.
+Usa bulk_create por lotes y una semilla fija para que los resultados sean
+reproducibles. No debe usarse sobre la base de datos de producción.
+
+Como bulk_create no pasa por ajustar_stock_lote(), el stock se siembra aparte
+con las mismas reglas: todo el stock está repartido entre las variantes, cada
+línea de venta y movimiento indica su variante y deja su fila en el historial
+(RegistroStock) con su fecha, y el stock inicial se anota antes de la primera
+venta, con lo necesario para que ninguna variante quede en negativo.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Categoria, Coleccion, Producto, ProductoVariante,
+    Venta, DetalleVenta, MovimientoInventario, RegistroStock, Empleado
+)
+
+CANALES = [canal for canal, _ in Venta.CANAL_CHOICES]
+TALLAS = ['XS', 'S', 'M', 'L', 'XL']
+COLORES = ['Negro', 'Blanco', 'Rojo', 'Azul', 'Azul marino', 'Verde', 'Beige', 'Animal print']
+PALABRAS = [
+    'Blusa', 'Vestido', 'Falda', 'Pantalón', 'Chaqueta', 'Top', 'Body', 'Kimono',
+    'Leopardo', 'Cebra', 'Satinado', 'Lino', 'Seda', 'Clásico', 'Oversize', 'Crop',
+]
+
+
+def sembrar_catalogo(productos, empleados, rng, lote=5000):
+    """Crea categorías, colecciones, productos y empleados. Devuelve (productos, empleados)"""
+    # Sufijo para no chocar con los nombres únicos de una siembra anterior
+    sufijo = Categoria.objects.count()
+    categorias = Categoria.objects.bulk_create(
+        [Categoria(nombre=f'Sintética {sufijo}-{i}') for i in range(20)]
+    )
+    colecciones = Coleccion.objects.bulk_create(
+        [Coleccion(nombre=f'Sintética {sufijo}-{i}', temporada=str(2020 + i % 6)) for i in range(30)]
+    )
+
+    nuevos = []
+    for i in range(productos):
+        producto = Producto(
+            nombre=f"{' '.join(rng.sample(PALABRAS, 3))} {i}",
+            categoria=rng.choice(categorias),
+            coleccion=rng.choice(colecciones + [None]),
+            tallas=','.join(rng.sample(TALLAS, rng.randint(1, len(TALLAS)))),
+            colores=','.join(rng.sample(COLORES, rng.randint(1, 4))),
+            precio_unitario=Decimal(rng.randint(20, 400) * 1000),
+            # El stock lo fija sembrar_ventas() al final
+            stock_actual=0,
+            stock_minimo=5,
+            activo=rng.random() > 0.05,
+        )
+        producto.estado = producto.calcular_estado()
+        nuevos.append(producto)
+    productos_creados = Producto.objects.bulk_create(nuevos, batch_size=lote)
+    # bulk_create no pasa por Producto.save(): las variantes se crean aparte
+    variantes = []
+    for producto in productos_creados:
+        combinaciones = producto.combinaciones()
+        producto.variantes_sinteticas = [
+            ProductoVariante(producto=producto, talla=talla, color=color) for talla, color in combinaciones
+        ]
+        for variante in producto.variantes_sinteticas:
+            # Stock que le queda al final aparte de las entradas
+            variante.base = rng.randint(0, 500 // len(combinaciones))
+        variantes.extend(producto.variantes_sinteticas)
+    ProductoVariante.objects.bulk_create(variantes, batch_size=lote)
+
+    prefijo = User.objects.count()
+    users = User.objects.bulk_create([
+        User(username=f'sintetico{prefijo + i}', first_name=f'Empleado{i}', last_name='Sintético')
+        for i in range(empleados)
+    ], batch_size=lote)
+    empleados_creados = Empleado.objects.bulk_create([
+        Empleado(user=user, fecha_contratacion=date.today() - timedelta(days=rng.randint(0, 2000)))
+        for user in users
+    ], batch_size=lote)
+
+    return productos_creados, empleados_creados
+
+
+def sembrar_ventas(cantidad, productos, empleados, rng, dias=730, lote=5000, movimientos=0, progreso=None):
+    """
+    Crea ``cantidad`` ventas con 1 a 4 detalles repartidas en los últimos ``dias``
+    días y ``movimientos`` movimientos de inventario, con su historial de stock,
+    y al final fija el stock de ``productos`` (ver _sembrar_stock).
+    ``progreso(ventas, movimientos)`` se llama después de cada lote.
+    """
+    ahora = timezone.now()
+    segundos = dias * 24 * 3600
+    # Por variante: unidades que salen y cambio neto del stock
+    salidas = defaultdict(int)
+    netos = defaultdict(int)
+
+    for inicio in range(0, cantidad, lote):
+        with transaction.atomic():
+            ventas = []
+            lineas = []
+            for _ in range(min(lote, cantidad - inicio)):
+                detalles = []
+                for producto in rng.sample(productos, rng.randint(1, 4)):
+                    cantidad_linea = rng.randint(1, 3)
+                    detalles.append(DetalleVenta(
+                        producto=producto,
+                        variante=rng.choice(producto.variantes_sinteticas),
+                        cantidad=cantidad_linea,
+                        precio_unitario=producto.precio_unitario,
+                        subtotal=producto.precio_unitario * cantidad_linea,
+                    ))
+                subtotal = sum(d.subtotal for d in detalles)
+                descuento = Decimal(rng.choice([0, 0, 0, 5000, 10000]))
+                ventas.append(Venta(
+                    fecha=ahora - timedelta(seconds=rng.randint(0, segundos)),
+                    canal_venta=rng.choice(CANALES),
+                    empleado=rng.choice(empleados),
+                    subtotal=subtotal,
+                    descuento=min(descuento, subtotal),
+                    total=subtotal - min(descuento, subtotal),
+                ))
+                lineas.append(detalles)
+
+            Venta.objects.bulk_create(ventas)
+            for venta, detalles in zip(ventas, lineas):
+                for detalle in detalles:
+                    detalle.venta = venta
+            DetalleVenta.objects.bulk_create([d for detalles in lineas for d in detalles])
+            registros = []
+            for venta, detalles in zip(ventas, lineas):
+                for detalle in detalles:
+                    salidas[detalle.variante] += detalle.cantidad
+                    netos[detalle.variante] -= detalle.cantidad
+                    registros.append(_registro(detalle.variante, -detalle.cantidad, 'venta', venta.fecha))
+            RegistroStock.objects.bulk_create(registros)
+        if progreso:
+            progreso(inicio + len(ventas), 0)
+
+    tipos = [tipo for tipo, _ in MovimientoInventario.TIPO_CHOICES]
+    for inicio in range(0, movimientos, lote):
+        with transaction.atomic():
+            nuevos = []
+            for _ in range(min(lote, movimientos - inicio)):
+                producto = rng.choice(productos)
+                nuevos.append(MovimientoInventario(
+                    producto=producto,
+                    variante=rng.choice(producto.variantes_sinteticas),
+                    tipo=rng.choice(tipos),
+                    cantidad=rng.randint(1, 50),
+                    fecha=ahora - timedelta(seconds=rng.randint(0, segundos)),
+                    empleado=rng.choice(empleados),
+                ))
+            MovimientoInventario.objects.bulk_create(nuevos)
+            registros = []
+            for movimiento in nuevos:
+                # Como MovimientoInventario.save(): solo la salida resta
+                delta = -movimiento.cantidad if movimiento.tipo == 'salida' else movimiento.cantidad
+                if delta < 0:
+                    salidas[movimiento.variante] -= delta
+                netos[movimiento.variante] += delta
+                registros.append(_registro(movimiento.variante, delta, 'movimiento', movimiento.fecha))
+            RegistroStock.objects.bulk_create(registros)
+        if progreso:
+            progreso(cantidad, min(inicio + lote, movimientos))
+
+    _sembrar_stock(productos, salidas, netos, ahora - timedelta(seconds=segundos + 1), lote)
+
+
+def _registro(variante, delta, origen, fecha):
+    return RegistroStock(
+        producto_id=variante.producto_id, variante=variante, delta=delta, delta_variante=delta,
+        origen=origen, fecha=fecha,
+    )
+
+
+def _sembrar_stock(productos, salidas, netos, fecha, lote):
+    """
+    Anota en ``fecha`` (antes de toda venta y movimiento) el stock inicial de
+    cada variante: su base más todo lo que sale después, así que ningún
+    momento del historial queda en negativo. El stock actual es ese inicial
+    más los cambios netos, igual a la suma del historial.
+    """
+    registros = []
+    variantes = []
+    with transaction.atomic():
+        for producto in productos:
+            producto.stock_actual = 0
+            for variante in producto.variantes_sinteticas:
+                inicial = variante.base + salidas[variante]
+                if inicial:
+                    registros.append(_registro(variante, inicial, 'inicial', fecha))
+                variante.stock = inicial + netos[variante]
+                producto.stock_actual += variante.stock
+                variantes.append(variante)
+            producto.estado = producto.calcular_estado()
+        RegistroStock.objects.bulk_create(registros, batch_size=lote)
+        ProductoVariante.objects.bulk_update(variantes, ['stock'], batch_size=lote)
+        Producto.objects.bulk_update(productos, ['stock_actual', 'estado'], batch_size=lote)
@@ -0,0 +1,73 @@
+"""
+SQLite como base de producción (opcional, DJANGO_SQLITE_PRODUCCION=True).
+
+``configurar_conexion`` aplica los PRAGMA de settings.SQLITE_PRAGMAS a cada
+conexión nueva: WAL para que las lecturas no esperen a los escritores,
+busy_timeout para que un escritor espere el bloqueo en lugar de fallar,
+synchronous=NORMAL (seguro con WAL) y mmap/caché más grandes.
+
+Aun así SQLite puede responder "database is locked" sin esperar, cuando una
+transacción que empezó leyendo intenta escribir y otro proceso escribió
+antes. ``reintentar_si_bloqueada`` repite la transacción completa con espera
+exponencial; se usa en las escrituras de ventas y movimientos.
+"""
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection as conexion_defecto
+
+logger = logging.getLogger(__name__)
+
+MENSAJES_BLOQUEO = ('database is locked', 'database table is locked')
+
+_reintentos = 0
+_lock = threading.Lock()
+
+
+def configurar_conexion(connection):
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRODUCCION:
+        return
+    with connection.cursor() as cursor:
+        for pragma, valor in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {valor}')
+
+
+def es_bloqueo(error):
+    return isinstance(error, OperationalError) and any(mensaje in str(error) for mensaje in MENSAJES_BLOQUEO)
+
+
+def reintentar_si_bloqueada(funcion, *args, **kwargs):
+    """
+    Ejecuta ``funcion`` y, si falla con "database is locked", la repite hasta
+    SQLITE_REINTENTOS veces con espera exponencial y aleatoria. ``funcion``
+    debe abrir su propia transacción: dentro de una transacción ajena no se
+    reintenta (la de fuera ya quedó invalidada) y el error se propaga.
+    """
+    for intento in range(settings.SQLITE_REINTENTOS + 1):
+        try:
+            return funcion(*args, **kwargs)
+        except OperationalError as error:
+            if (
+                not es_bloqueo(error)
+                or intento == settings.SQLITE_REINTENTOS
+                or conexion_defecto.in_atomic_block
+            ):
+                raise
+            espera = settings.SQLITE_REINTENTO_ESPERA_MS / 1000 * 2 ** intento
+            _contar_reintento()
+            logger.info("Base bloqueada, reintento %d en %.0f ms", intento + 1, espera * 1000)
+            time.sleep(espera * random.uniform(0.5, 1.5))
+
+
+def _contar_reintento():
+    global _reintentos
+    with _lock:
+        _reintentos += 1
+
+
+def reintentos_realizados():
+    """Reintentos hechos por este proceso (para bench_concurrencia)"""
+    return _reintentos
@@ -0,0 +1,120 @@
+"""
+GET /api/stock/eventos/?token=<access JWT>: Server-Sent Events con cada
+cambio de stock (ver eventos.py).
+
+Es una aplicación ASGI propia, montada en Backend/asgi.py delante de Django,
+porque la conexión queda abierta indefinidamente y hay que enterarse de que
+el cliente se fue (http.disconnect) para soltar su suscripción; el handler
+ASGI de Django 4.2 no lo informa mientras transmite una respuesta.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import autenticacion, eventos
+from .models import Empleado
+
+RUTA = '/api/stock/eventos/'
+
+
+def _puede_conectarse(acceso, user_id):
+    """Empleado activo o superusuario, desde los claims o (tokens antiguos) la BD"""
+    if autenticacion.CLAIM_ROL in acceso:
+        actual = autenticacion.cambios(user_id) or {}
+        if actual.get('eliminado'):
+            return False
+        usuario = autenticacion.UsuarioToken(acceso, actual)
+        if not usuario.is_active:
+            return False
+        return usuario.empleado_activo if usuario.empleado_id is not None else usuario.is_superuser
+    return (
+        Empleado.objects.filter(user_id=user_id, activo=True).exists()
+        or User.objects.filter(pk=user_id, is_superuser=True, is_active=True).exists()
+    )
+
+
+def _cabeceras_cors(origen):
+    if origen and (getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False) or origen in settings.CORS_ALLOWED_ORIGINS):
+        return [
+            (b'access-control-allow-origin', origen.encode()),
+            (b'access-control-allow-credentials', b'true'),
+            (b'vary', b'origin'),
+        ]
+    return []
+
+
+async def _responder_error(send, estado, mensaje, cors):
+    cuerpo = json.dumps({'error': mensaje}).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': estado,
+        'headers': [(b'content-type', b'application/json')] + cors,
+    })
+    await send({'type': 'http.response.body', 'body': cuerpo})
+
+
+async def _esperar_desconexion(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def aplicacion_eventos(scope, receive, send):
+    cabeceras = {nombre.decode().lower(): valor.decode() for nombre, valor in scope['headers']}
+    cors = _cabeceras_cors(cabeceras.get('origin'))
+
+    # EventSource no permite cabeceras: el token va en la URL (también se acepta Bearer)
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token', [''])[0]
+    autorizacion = cabeceras.get('authorization', '')
+    if not token and autorizacion.startswith('Bearer '):
+        token = autorizacion[len('Bearer '):]
+    try:
+        acceso = AccessToken(token)
+        user_id = acceso[settings.SIMPLE_JWT['USER_ID_CLAIM']]
+    except (TokenError, KeyError):
+        return await _responder_error(send, 401, 'Token inválido o ausente', cors)
+    if not await sync_to_async(_puede_conectarse)(acceso, user_id):
+        return await _responder_error(send, 403, 'No tienes permisos para acceder.', cors)
+
+    suscripcion = eventos.difusor.suscribir()
+    desconexion = asyncio.ensure_future(_esperar_desconexion(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Evita que nginx acumule los eventos en su buffer
+                (b'x-accel-buffering', b'no'),
+            ] + cors,
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': f'retry: {eventos.REINTENTO_MS}\n\n'.encode(),
+            'more_body': True,
+        })
+        while True:
+            siguiente = asyncio.ensure_future(suscripcion.cola.get())
+            listos, _ = await asyncio.wait(
+                {siguiente, desconexion}, timeout=eventos.LATIDO_SEGUNDOS,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if desconexion in listos:
+                siguiente.cancel()
+                break
+            if siguiente in listos:
+                mensaje = siguiente.result()
+            else:
+                siguiente.cancel()
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                mensaje = ': latido\n\n'
+            await send({'type': 'http.response.body', 'body': mensaje.encode(), 'more_body': True})
+    finally:
+        desconexion.cancel()
+        eventos.difusor.cancelar(suscripcion)
@@ -0,0 +1,40 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def contar_consultas(cliente, url):
+    """Hace un GET a ``url`` y devuelve (respuesta, número de consultas SQL)"""
+    with CaptureQueriesContext(connection) as capturadas:
+        respuesta = cliente.get(url)
+    return respuesta, len(capturadas)
+
+
+class PresupuestoConsultasMixin:
+    """
+    Mixin para TestCase que verifica que un endpoint de listado no ejecuta
+    más consultas cuando la página trae más filas (síntoma de N+1).
+    """
+
+    def assertConsultasNoCrecen(self, url, crear_filas, tamanos=(1, 20), maximo=None):
+        """
+        Crea filas con ``crear_filas(n)`` hasta llegar a cada uno de ``tamanos``
+        y comprueba que ``url`` ejecuta siempre el mismo número de consultas
+        (y como mucho ``maximo``, si se indica).
+        """
+        conteos = {}
+        creadas = 0
+        for tamano in tamanos:
+            crear_filas(tamano - creadas)
+            creadas = tamano
+            respuesta, conteos[tamano] = contar_consultas(self.client, url)
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+
+        self.assertEqual(
+            len(set(conteos.values())), 1,
+            f"Las consultas de {url} crecen con el tamaño de la página: {conteos}"
+        )
+        if maximo is not None:
+            self.assertLessEqual(
+                conteos[tamanos[-1]], maximo,
+                f"{url} supera el presupuesto de {maximo} consultas: {conteos}"
+            )
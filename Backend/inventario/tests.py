@@ -1,3 +1,1448 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import (
+    Categoria, Coleccion, Producto, ProductoVariante,
+    Venta, DetalleVenta, MovimientoInventario, RegistroStock,
+    Cliente, Empleado, ResumenVentaDiaria, TrabajoReporte, StockInsuficiente, ajustar_stock
+)
+from . import (
+    autenticacion, cache_catalogo, consultas_lentas, eventos, historial_stock, imagenes, metricas, reportes,
+    sqlite, sse, trabajos_reportes,
+)
+from .testing import PresupuestoConsultasMixin
+from .views import VentaViewSet
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BaseInventarioTestCase(APITestCase):
+    """Crea un administrador autenticado y un catálogo mínimo"""
+
+    def setUp(self):
+        cache.clear()
+        autenticacion.limpiar_cache_local()
+        self.user = User.objects.create_user(
+            username='admin', password='admin123', first_name='Ana', last_name='Admin', is_staff=True
+        )
+        self.empleado = Empleado.objects.create(user=self.user, fecha_contratacion=date.today())
+        self.categoria = Categoria.objects.create(nombre='Blusas')
+        self.coleccion = Coleccion.objects.create(nombre='Verano')
+        self.client.force_authenticate(self.user)
+        self.contador = 0
+
+    def crear_producto(self, stock=100, **kwargs):
+        self.contador += 1
+        datos = {
+            'nombre': f'Producto {self.contador}',
+            'categoria': self.categoria,
+            'coleccion': self.coleccion,
+            'tallas': 'S,M,L',
+            'colores': 'Rojo,Negro',
+            'precio_unitario': Decimal('50000'),
+            'stock_actual': stock,
+        }
+        datos.update(kwargs)
+        return Producto.objects.create(**datos)
+
+
+# ==========================================
+# PRESUPUESTO DE CONSULTAS EN LISTADOS
+# ==========================================
+class ConsultasListadosTests(PresupuestoConsultasMixin, BaseInventarioTestCase):
+
+    def crear_productos(self, n):
+        for _ in range(n):
+            self.crear_producto()
+
+    def crear_ventas(self, n):
+        for _ in range(n):
+            venta = Venta.objects.create(canal_venta='nequi', empleado=self.empleado, total=0)
+            DetalleVenta.objects.create(
+                venta=venta, producto=self.crear_producto(), cantidad=1, precio_unitario=Decimal('10')
+            )
+            DetalleVenta.objects.create(
+                venta=venta, producto=self.crear_producto(), cantidad=2, precio_unitario=Decimal('10')
+            )
+
+    def crear_movimientos(self, n):
+        for _ in range(n):
+            MovimientoInventario.objects.create(
+                producto=self.crear_producto(), tipo='entrada', cantidad=3, empleado=self.empleado
+            )
+
+    def crear_empleados(self, n):
+        for _ in range(n):
+            self.contador += 1
+            user = User.objects.create_user(username=f'empleado{self.contador}', password=None)
+            Empleado.objects.create(user=user, fecha_contratacion=date.today())
+
+    def crear_clientes(self, n):
+        for _ in range(n):
+            Cliente.objects.create(nombre='Cliente', telefono='300')
+
+    def test_productos(self):
+        self.assertConsultasNoCrecen('/api/productos/', self.crear_productos)
+
+    def test_ventas(self):
+        self.assertConsultasNoCrecen('/api/ventas/', self.crear_ventas)
+
+    def test_movimientos(self):
+        self.assertConsultasNoCrecen('/api/movimientos-inventario/', self.crear_movimientos)
+
+    def test_empleados(self):
+        self.assertConsultasNoCrecen('/api/empleados/', self.crear_empleados)
+
+    def test_clientes(self):
+        self.assertConsultasNoCrecen('/api/clientes/', self.crear_clientes)
+
+
+# ==========================================
+# ESTADO DEL STOCK
+# ==========================================
+class EstadoStockTests(BaseInventarioTestCase):
+
+    def vender(self, producto, cantidad):
+        return self.client.post('/api/ventas/', {
+            'canal_venta': 'presencial',
+            'empleado': self.empleado.id,
+            'total': 0,
+            'detalles': [{'producto': producto.id, 'cantidad': cantidad, 'precio_unitario': '10'}],
+        }, format='json')
+
+    def test_venta_actualiza_estado(self):
+        producto = self.crear_producto(stock=10, stock_minimo=5)
+        self.assertEqual(producto.estado, 'en_stock')
+
+        self.assertEqual(self.vender(producto, 6).status_code, 201)
+        producto.refresh_from_db()
+        self.assertEqual((producto.stock_actual, producto.estado), (4, 'bajo_stock'))
+
+        self.assertEqual(self.vender(producto, 4).status_code, 201)
+        producto.refresh_from_db()
+        self.assertEqual((producto.stock_actual, producto.estado), (0, 'agotado'))
+
+    def test_venta_sin_stock_suficiente(self):
+        producto = self.crear_producto(stock=2)
+        respuesta = self.vender(producto, 3)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('detalles', respuesta.data)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_actual, 2)
+        self.assertFalse(Venta.objects.exists())
+
+    def test_sobreventa_no_modifica_el_stock(self):
+        producto = self.crear_producto(stock=2)
+        with self.assertRaises(StockInsuficiente) as error:
+            with transaction.atomic():
+                venta = Venta.objects.create(canal_venta='presencial', empleado=self.empleado, total=0)
+                DetalleVenta.objects.create(
+                    venta=venta, producto=producto, cantidad=3, precio_unitario=Decimal('10')
+                )
+        self.assertEqual((error.exception.producto, error.exception.cantidad), (producto, 3))
+        producto.refresh_from_db()
+        self.assertEqual((producto.stock_actual, producto.estado), (2, 'bajo_stock'))
+        self.assertFalse(Venta.objects.exists())
+        self.assertFalse(DetalleVenta.objects.exists())
+        self.assertEqual(RegistroStock.objects.filter(producto=producto).count(), 1)
+
+    def test_ultima_unidad_se_vende_una_vez(self):
+        producto = self.crear_producto(stock=1)
+        self.assertEqual(self.vender(producto, 1).status_code, 201)
+        # El UPDATE condicional lee el stock de la base, no el del objeto en memoria
+        self.assertEqual(producto.stock_actual, 1)
+        with self.assertRaises(StockInsuficiente):
+            ajustar_stock(producto, -1)
+        self.assertEqual(self.vender(producto, 1).status_code, 400)
+        producto.refresh_from_db()
+        self.assertEqual((producto.stock_actual, producto.estado), (0, 'agotado'))
+        self.assertEqual(Venta.objects.count(), 1)
+
+    def test_filtros_y_conteos(self):
+        self.crear_producto(stock=0)
+        self.crear_producto(stock=3, stock_minimo=5)
+        self.crear_producto(stock=50)
+
+        respuesta = self.client.get('/api/productos/?stock_bajo=true')
+        self.assertEqual(respuesta.data['count'], 2)
+        respuesta = self.client.get('/api/productos/?estado=agotado')
+        self.assertEqual(respuesta.data['count'], 1)
+        respuesta = self.client.get('/api/productos/estados/')
+        self.assertEqual(respuesta.data, {'en_stock': 1, 'bajo_stock': 1, 'agotado': 1})
+
+
+# ==========================================
+# CONSULTAS AL CREAR UNA VENTA
+# ==========================================
+class ConsultasCrearVentaTests(BaseInventarioTestCase):
+
+    def vender(self, lineas):
+        return self.client.post('/api/ventas/', {
+            'canal_venta': 'presencial',
+            'empleado': self.empleado.id,
+            'total': 0,
+            'detalles': [
+                {'producto': producto.id, 'variante': variante.id, 'cantidad': 1, 'precio_unitario': '10'}
+                for producto, variante in lineas
+            ],
+        }, format='json')
+
+    def test_consultas_no_crecen_con_las_lineas(self):
+        lineas = []
+        for _ in range(20):
+            producto = self.crear_producto(tallas='S,M', colores='Rojo')
+            variante = producto.variantes.get(talla='S')
+            variante.stock = 10
+            variante.save()
+            lineas.append((producto, variante))
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.vender(lineas[:1]).status_code, 201)
+        for cantidad in (5, 20):
+            with self.assertNumQueries(len(consultas)):
+                self.assertEqual(self.vender(lineas[:cantidad]).status_code, 201)
+
+
+# ==========================================
+# REPORTES (resumen diario)
+# ==========================================
+class ReportesTests(BaseInventarioTestCase):
+
+    def vender(self, productos, descuento='0'):
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post('/api/ventas/', {
+                'canal_venta': 'nequi',
+                'empleado': self.empleado.id,
+                'total': 0,
+                'descuento': descuento,
+                'detalles': [
+                    {'producto': producto.id, 'cantidad': cantidad, 'precio_unitario': precio}
+                    for producto, cantidad, precio in productos
+                ],
+            }, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+
+    def test_resumen_desde_resumen_diario(self):
+        blusa = self.crear_producto()
+        falda = self.crear_producto()
+        for descuento in ('0', '3.00'):
+            self.vender([(blusa, 2, '10.00'), (falda, 1, '5.00')], descuento)
+
+        respuesta = self.client.get('/api/ventas/reportes/resumen/?periodo=1m')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['totales'], {'ingresos': Decimal('47'), 'descuentos': Decimal('3')})
+        top = respuesta.data['top_productos'][0]
+        self.assertEqual((top['producto__id'], top['cantidad_vendida']), (blusa.id, 4))
+        self.assertEqual(len(respuesta.data['serie_temporal']), 1)
+
+    def test_cache_se_invalida_con_ventas(self):
+        producto = self.crear_producto()
+        self.vender([(producto, 1, '10.00')])
+
+        url = '/api/ventas/reportes/resumen/?periodo=3m'
+        self.assertEqual(self.client.get(url).data['totales']['ingresos'], Decimal('10'))
+        self.assertEqual(self.client.get(url).data['totales']['ingresos'], Decimal('10'))
+        estadisticas = self.client.get('/api/ventas/reportes/cache/').data
+        self.assertEqual((estadisticas['aciertos'], estadisticas['fallos']), (1, 1))
+
+        self.vender([(producto, 2, '10.00')])
+        self.assertEqual(self.client.get(url).data['totales']['ingresos'], Decimal('30'))
+
+    def test_reconstruir_lee_las_ventas_con_el_resumen_bloqueado(self):
+        self.vender([(self.crear_producto(), 2, '10.00')], descuento='1.00')
+        hoy = timezone.localdate()
+        esperado = list(ResumenVentaDiaria.objects.values_list('dia', 'unidades', 'ingresos', 'descuento'))
+
+        with CaptureQueriesContext(connection) as consultas:
+            reportes.reconstruir_resumen(hoy, hoy)
+        sql = [consulta['sql'] for consulta in consultas]
+        bloqueo = next(i for i, texto in enumerate(sql) if texto.startswith(('LOCK TABLE', 'DELETE')))
+        lectura = next(i for i, texto in enumerate(sql) if 'inventario_detalleventa' in texto)
+        # Una venta que se registre después ya no puede colarse entre la lectura y el borrado
+        self.assertLess(bloqueo, lectura)
+        self.assertEqual(
+            list(ResumenVentaDiaria.objects.values_list('dia', 'unidades', 'ingresos', 'descuento')), esperado
+        )
+
+    def test_cambiar_la_fecha_recalcula_ambos_dias(self):
+        self.vender([(self.crear_producto(), 2, '10.00')])
+        venta = Venta.objects.get()
+        hoy = timezone.localdate(venta.fecha)
+        venta.fecha -= timedelta(days=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            venta.save()
+        self.assertEqual(
+            list(ResumenVentaDiaria.objects.values_list('dia', 'unidades')), [(hoy - timedelta(days=2), 2)]
+        )
+
+
+    def test_backfill_completa_los_dias_faltantes(self):
+        producto = self.crear_producto()
+        self.vender([(producto, 2, '10.00')])
+        self.vender([(producto, 3, '10.00')])
+        hoy = timezone.localdate()
+        # Venta anterior al resumen: su día falta y el de hoy quedó con una venta de más
+        anterior = Venta.objects.order_by('id').first()
+        Venta.objects.filter(pk=anterior.pk).update(fecha=anterior.fecha - timedelta(days=3))
+        self.assertEqual(reportes.dias_sin_resumen(), [hoy - timedelta(days=3), hoy])
+
+        call_command('backfill_resumen_ventas', faltantes=True, stdout=io.StringIO())
+        self.assertEqual(
+            list(ResumenVentaDiaria.objects.order_by('dia').values_list('dia', 'unidades')),
+            [(hoy - timedelta(days=3), 2), (hoy, 3)],
+        )
+        # Solo queda el primer día resumido, que se vuelve a calcular por si acaso
+        self.assertEqual(reportes.dias_sin_resumen(), [hoy - timedelta(days=3)])
+
+# ==========================================
+# CARGA MASIVA DE VENTAS (POS sin conexión)
+# ==========================================
+class VentasBulkTests(BaseInventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto(stock=10, tallas='U', colores='')
+
+    def venta(self, cantidad=1, **extra):
+        return {
+            'canal_venta': 'presencial', 'empleado': self.empleado.id, 'total': 0,
+            'detalles': [{'producto': self.producto.id, 'cantidad': cantidad, 'precio_unitario': '10'}],
+            **extra,
+        }
+
+    def cargar(self, ventas, lote=None):
+        url = '/api/ventas/bulk/' + (f'?lote={lote}' if lote else '')
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(url, ventas, format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        return respuesta.data
+
+    def stock(self):
+        self.producto.refresh_from_db()
+        return self.producto.stock_actual
+
+    def test_lotes_y_venta_sin_stock(self):
+        ventas = [self.venta(), self.venta(), self.venta(cantidad=50), self.venta(), self.venta()]
+        with mock.patch.object(
+            VentaViewSet, '_guardar_lote', autospec=True, side_effect=VentaViewSet._guardar_lote
+        ) as guardar_lote:
+            datos = self.cargar(ventas, lote=2)
+        # Una transacción por lote de 2: la venta sin stock no descarta a su compañera de lote
+        self.assertEqual([len(llamada.args[2]) for llamada in guardar_lote.call_args_list], [2, 2, 1])
+        self.assertEqual((datos['creadas'], datos['rechazadas']), (4, 1))
+        self.assertEqual([r['posicion'] for r in datos['resultados']], [0, 1, 2, 3, 4])
+        self.assertFalse(datos['resultados'][2]['creada'])
+        self.assertIn('detalles', datos['resultados'][2]['errores'])
+        self.assertEqual(self.stock(), 6)
+        self.assertEqual(Venta.objects.count(), 4)
+
+    def test_ndjson_y_elemento_que_no_es_objeto(self):
+        cuerpo = '\n'.join([json.dumps(self.venta()), '', json.dumps('no es una venta'), json.dumps(self.venta())])
+        respuesta = self.client.post('/api/ventas/bulk/', cuerpo, content_type='application/x-ndjson')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((respuesta.data['creadas'], respuesta.data['rechazadas']), (2, 1))
+        self.assertEqual([r['creada'] for r in respuesta.data['resultados']], [True, False, True])
+        self.assertEqual(self.stock(), 8)
+
+    def test_referencia_repetida_y_reintento(self):
+        respuesta = self.client.post('/api/ventas/bulk/', [
+            self.venta(referencia='pos1-7'), self.venta(referencia='pos1-7'),
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.data['referencias'], ['pos1-7'])
+        # Una referencia igual a la posición de otra venta no la pisa
+        datos = self.cargar([self.venta(referencia='1'), self.venta()])
+        self.assertEqual([(r['posicion'], r['referencia']) for r in datos['resultados']], [(0, '1'), (1, None)])
+        self.assertEqual(datos['creadas'], 2)
+
+        # El POS reintenta tras un timeout: nada se registra dos veces
+        datos = self.cargar([self.venta(referencia='1'), self.venta(referencia='pos1-8')])
+        original = Venta.objects.get(referencia='1')
+        self.assertEqual(datos['resultados'][0], {
+            'posicion': 0, 'referencia': '1', 'creada': False, 'repetida': True, 'id': original.id,
+        })
+        self.assertEqual((datos['creadas'], datos['repetidas'], datos['rechazadas']), (1, 1, 0))
+        self.assertEqual(self.stock(), 7)
+
+        respuesta = self.client.post('/api/ventas/', self.venta(referencia='pos1-8'), format='json')
+        self.assertEqual((respuesta.status_code, respuesta.data['referencia']), (200, 'pos1-8'))
+        self.assertEqual(self.stock(), 7)
+
+    def test_editar_con_la_referencia_de_otra_venta(self):
+        datos = self.cargar([self.venta(referencia='pos1-1'), self.venta(referencia='pos1-2')])
+        segunda = datos['resultados'][1]['id']
+        respuesta = self.client.patch(f'/api/ventas/{segunda}/', {'referencia': 'pos1-1'}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('referencia', respuesta.data)
+        # La suya propia sí se puede volver a enviar
+        respuesta = self.client.patch(f'/api/ventas/{segunda}/', {'referencia': 'pos1-2'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_fecha_del_pos(self):
+        ayer = timezone.now() - timedelta(days=1)
+        datos = self.cargar([self.venta(fecha=ayer.isoformat())])
+        venta = Venta.objects.get(pk=datos['resultados'][0]['id'])
+        self.assertEqual(venta.fecha, ayer)
+        # El resumen diario la cuenta el día en que se vendió
+        self.assertEqual(
+            list(ResumenVentaDiaria.objects.values_list('dia', 'unidades')), [(timezone.localdate(ayer), 1)]
+        )
+
+        manana = timezone.now() + timedelta(days=1)
+        datos = self.cargar([self.venta(fecha=manana.isoformat())])
+        self.assertIn('fecha', datos['resultados'][0]['errores'])
+        self.assertEqual(self.stock(), 9)
+
+
+# ==========================================
+# PAGINACIÓN POR CURSOR
+# ==========================================
+class PaginacionCursorTests(BaseInventarioTestCase):
+
+    def test_recorre_ventas_sin_repetir_ni_saltar(self):
+        ventas = [Venta.objects.create(canal_venta='nequi', empleado=self.empleado, total=0) for _ in range(7)]
+        # Fechas repetidas: el desempate por id mantiene el orden estable
+        Venta.objects.filter(pk__lte=ventas[3].pk).update(fecha=ventas[0].fecha)
+
+        vistos = []
+        url = '/api/ventas/?page_size=3&total=exacto'
+        while url:
+            respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(respuesta.data['count'], 7)
+            vistos += [venta['id'] for venta in respuesta.data['results']]
+            # Una venta nueva durante el recorrido no desplaza las páginas siguientes
+            if len(vistos) == 3:
+                Venta.objects.create(canal_venta='nequi', empleado=self.empleado, total=0)
+                break
+            url = respuesta.data['next']
+
+        url = respuesta.data['next']
+        while url:
+            respuesta = self.client.get(url)
+            vistos += [venta['id'] for venta in respuesta.data['results']]
+            url = respuesta.data['next']
+
+        esperado = list(Venta.objects.order_by('-fecha', '-id').values_list('id', flat=True))[1:]
+        self.assertEqual(vistos, esperado)
+
+    def test_sin_total_por_defecto(self):
+        respuesta = self.client.get('/api/movimientos-inventario/')
+        self.assertNotIn('count', respuesta.data)
+        self.assertIsNone(respuesta.data['next'])
+
+
+# ==========================================
+# EXPORTACIÓN EN STREAMING
+# ==========================================
+class ExportacionTests(BaseInventarioTestCase):
+
+    def contenido(self, url):
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        return b''.join(respuesta.streaming_content).decode()
+
+    def test_exporta_ventas_csv_y_ndjson(self):
+        producto = self.crear_producto()
+        venta = Venta.objects.create(canal_venta='nequi', empleado=self.empleado, total=0)
+        for cantidad in (1, 2):
+            DetalleVenta.objects.create(
+                venta=venta, producto=producto, cantidad=cantidad, precio_unitario=Decimal('10')
+            )
+
+        lineas = self.contenido('/api/ventas/exportar/').splitlines()
+        self.assertTrue(lineas[0].startswith('venta_id,fecha,canal_venta'))
+        self.assertEqual(len(lineas), 3)
+
+        filas = [json.loads(linea) for linea in self.contenido('/api/ventas/exportar/?formato=ndjson').splitlines()]
+        self.assertEqual([fila['cantidad'] for fila in filas], [1, 2])
+        self.assertEqual(filas[0]['empleado_nombre'], 'Ana')
+
+    def test_exporta_movimientos_por_rango(self):
+        MovimientoInventario.objects.create(
+            producto=self.crear_producto(), tipo='entrada', cantidad=3, empleado=self.empleado
+        )
+        self.assertEqual(len(self.contenido('/api/movimientos-inventario/exportar/').splitlines()), 2)
+        self.assertEqual(
+            len(self.contenido('/api/movimientos-inventario/exportar/?hasta=2000-01-01').splitlines()), 1
+        )
+
+    async def test_bajo_asgi_se_entrega_como_iterador_asincrono(self):
+        producto = await sync_to_async(self.crear_producto)()
+        await MovimientoInventario.objects.acreate(
+            producto=producto, tipo='entrada', cantidad=3, empleado=self.empleado
+        )
+        respuesta = await AsyncClient().get(
+            '/api/movimientos-inventario/exportar/',
+            headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'},
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        # Un iterador síncrono lo consumiría entero Django con sync_to_async(list)
+        self.assertTrue(respuesta.is_async)
+        lineas = b''.join([bloque async for bloque in respuesta.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lineas), 2)
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/ventas/exportar/?formato=xml').status_code, 400)
+        self.assertEqual(self.client.get('/api/ventas/exportar/?desde=ayer').status_code, 400)
+
+
+# ==========================================
+# BÚSQUEDA POR TEXTO COMPLETO
+# ==========================================
+class BusquedaProductosTests(BaseInventarioTestCase):
+
+    def buscar(self, texto):
+        respuesta = self.client.get('/api/productos/', {'q': texto})
+        self.assertEqual(respuesta.status_code, 200)
+        return [producto['nombre'] for producto in respuesta.data['results']]
+
+    def test_prefijo_relevancia_y_sincronizacion(self):
+        self.crear_producto(nombre='Pantalón satinado', descripcion='Tiro alto')
+        self.crear_producto(nombre='Blusa lino', descripcion='Combina con un pantalón')
+        self.crear_producto(nombre='Falda midi')
+
+        # Prefijo, sin tildes, y el nombre pesa más que la descripción
+        self.assertEqual(self.buscar('panta'), ['Pantalón satinado', 'Blusa lino'])
+        self.assertEqual(self.buscar('pantalon sati'), ['Pantalón satinado'])
+        # Nombre de la categoría
+        self.assertEqual(len(self.buscar('blusas')), 3)
+
+        # Los triggers mantienen el índice al editar productos y categorías
+        Producto.objects.filter(nombre='Falda midi').update(nombre='Falda plisada')
+        self.assertEqual(self.buscar('plisa'), ['Falda plisada'])
+        self.categoria.nombre = 'Básicos'
+        self.categoria.save()
+        self.assertEqual(self.buscar('blusa'), ['Blusa lino'])
+        self.assertEqual(len(self.buscar('basicos')), 3)
+
+    def test_sintaxis_fts_no_rompe_la_busqueda(self):
+        self.crear_producto(nombre='Top "crop" NEAR')
+        self.assertEqual(self.buscar('crop" NEAR(*'), ['Top "crop" NEAR'])
+        self.assertEqual(len(self.buscar('  ')), 1)
+
+    def test_usa_el_indice_de_texto_completo(self):
+        self.crear_producto(nombre='Pantalón satinado')
+        self.crear_producto(nombre='Blusa', descripcion='Va con un pantalón')
+        indice = {'sqlite': '"inventario_producto_fts" MATCH', 'postgresql': 'inventario_producto_busqueda'}
+        self.assertIn(connection.vendor, indice)
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/api/productos/', {'q': 'pantalon'})
+        self.assertEqual([p['nombre'] for p in respuesta.data['results']], ['Pantalón satinado', 'Blusa'])
+        sql = ' '.join(consulta['sql'] for consulta in consultas)
+        self.assertIn(indice[connection.vendor], sql)
+        self.assertNotIn('LIKE', sql)
+
+    def test_filtro_por_nombre_busca_subcadenas(self):
+        self.crear_producto(nombre='Blusa lino')
+        self.crear_producto(nombre='Falda', descripcion='Va con una blusa')
+        respuesta = self.client.get('/api/productos/', {'nombre': 'USA'})
+        self.assertEqual([p['nombre'] for p in respuesta.data['results']], ['Blusa lino'])
+
+
+# ==========================================
+# VARIANTES (talla x color)
+# ==========================================
+class VariantesTests(BaseInventarioTestCase):
+
+    def test_variantes_desde_tallas_y_colores(self):
+        producto = self.crear_producto(tallas='s, M,m', colores='Azul,azul marino')
+        self.assertEqual(
+            sorted(producto.variantes.values_list('talla', 'color')),
+            [('M', 'Azul'), ('M', 'Azul marino'), ('S', 'Azul'), ('S', 'Azul marino')],
+        )
+        producto.tallas = 'M'
+        producto.save()
+        self.assertEqual(producto.variantes.count(), 2)
+
+        # Un producto nuevo con una sola variante le asigna todo su stock
+        unico = self.crear_producto(stock=7, tallas='U', colores='')
+        self.assertEqual(list(unico.variantes.values_list('talla', 'color', 'stock')), [('U', '', 7)])
+
+    def test_valores_tan_largos_como_el_campo_del_producto(self):
+        talla = 'T' * 100
+        color = 'C' * 200
+        producto = self.crear_producto(tallas=talla, colores=color)
+        self.assertEqual(list(producto.variantes.values_list('talla', 'color')), [(talla, color.capitalize())])
+
+    def test_filtros_exactos(self):
+        azul = self.crear_producto(tallas='S', colores='Azul')
+        self.crear_producto(tallas='L', colores='Azul marino')
+
+        respuesta = self.client.get('/api/productos/?colores=azul')
+        self.assertEqual([p['id'] for p in respuesta.data['results']], [azul.id])
+        self.assertEqual(self.client.get('/api/productos/?tallas=s,l').data['count'], 2)
+        self.assertEqual(respuesta.data['results'][0]['lista_colores'], ['Azul'])
+
+    def test_venta_descuenta_la_variante(self):
+        producto = self.crear_producto(stock=10, tallas='S,M', colores='Rojo')
+        talla_s = producto.variantes.get(talla='S')
+        respuesta = self.client.patch(f'/api/variantes/{talla_s.id}/', {'stock': 4}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            self.client.patch(f'/api/variantes/{talla_s.id}/', {'stock': 11}, format='json').status_code, 400
+        )
+
+        def vender(variante, cantidad):
+            return self.client.post('/api/ventas/', {
+                'canal_venta': 'presencial', 'empleado': self.empleado.id, 'total': 0,
+                'detalles': [{'producto': producto.id, 'variante': variante.id,
+                              'cantidad': cantidad, 'precio_unitario': '10'}],
+            }, format='json')
+
+        self.assertEqual(vender(talla_s, 3).status_code, 201)
+        talla_s.refresh_from_db()
+        producto.refresh_from_db()
+        self.assertEqual((talla_s.stock, producto.stock_actual), (1, 7))
+
+        # La variante no tiene suficiente aunque el producto sí: no se toca nada
+        respuesta = vender(talla_s, 2)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('(S / Rojo)', str(respuesta.data['detalles'][0]))
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_actual, 7)
+
+        otro = self.crear_producto(tallas='S', colores='Rojo')
+        self.assertEqual(vender(otro.variantes.get(), 1).status_code, 400)
+
+    def vender_sin_variante(self, producto, cantidad):
+        return self.client.post('/api/ventas/', {
+            'canal_venta': 'presencial', 'empleado': self.empleado.id, 'total': 0,
+            'detalles': [{'producto': producto.id, 'cantidad': cantidad, 'precio_unitario': '10'}],
+        }, format='json')
+
+    def test_linea_sin_variante(self):
+        # Con varias variantes se descuenta del stock sin clasificar (el POS no envía la variante)
+        producto = self.crear_producto(stock=10, tallas='S,M', colores='Rojo')
+        talla_s = producto.variantes.get(talla='S')
+        self.client.patch(f'/api/variantes/{talla_s.id}/', {'stock': 6}, format='json')
+        self.assertEqual(self.vender_sin_variante(producto, 3).status_code, 201)
+        producto.refresh_from_db()
+        talla_s.refresh_from_db()
+        self.assertEqual((producto.stock_actual, talla_s.stock), (7, 6))
+        # Solo queda 1 sin clasificar
+        respuesta = self.vender_sin_variante(producto, 2)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('detalles', respuesta.data)
+
+        # Con una sola se descuenta de ella
+        unico = self.crear_producto(stock=5, tallas='U', colores='')
+        self.assertEqual(self.vender_sin_variante(unico, 2).status_code, 201)
+        self.assertEqual(unico.variantes.get().stock, 3)
+        unico.refresh_from_db()
+        self.assertEqual(unico.stock_actual, 3)
+
+    def test_stock_sin_clasificar_no_queda_negativo(self):
+        producto = self.crear_producto(stock=10, tallas='S,M', colores='Rojo')
+        talla_s = producto.variantes.get(talla='S')
+        self.client.patch(f'/api/variantes/{talla_s.id}/', {'stock': 6}, format='json')
+
+        # Quedan 4 sin clasificar: una salida sin variante de 5 no se aplica
+        with self.assertRaises(StockInsuficiente):
+            MovimientoInventario.objects.create(producto=producto, tipo='salida', cantidad=5)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_actual, 10)
+
+        MovimientoInventario.objects.create(producto=producto, tipo='salida', cantidad=4)
+        producto.refresh_from_db()
+        talla_s.refresh_from_db()
+        self.assertEqual((producto.stock_actual, talla_s.stock), (6, 6))
+
+    def test_stock_actual_no_baja_de_lo_repartido(self):
+        producto = self.crear_producto(stock=10, tallas='S,M', colores='Rojo')
+        talla_s = producto.variantes.get(talla='S')
+        self.client.patch(f'/api/variantes/{talla_s.id}/', {'stock': 6}, format='json')
+
+        respuesta = self.client.patch(f'/api/productos/{producto.id}/', {'stock_actual': 5}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('stock_actual', respuesta.data)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_actual, 10)
+        self.assertEqual(
+            self.client.patch(f'/api/productos/{producto.id}/', {'stock_actual': 6}, format='json').status_code, 200
+        )
+
+        # Con una sola variante la edición también es suya
+        unico = self.crear_producto(stock=5, tallas='U', colores='')
+        self.client.patch(f'/api/productos/{unico.id}/', {'stock_actual': 8}, format='json')
+        self.assertEqual(unico.variantes.get().stock, 8)
+
+    def test_stock_de_la_variante_en_una_fecha(self):
+        producto = self.crear_producto(stock=10, tallas='S,M', colores='Rojo')
+        talla_s = producto.variantes.get(talla='S')
+        self.client.patch(f'/api/variantes/{talla_s.id}/', {'stock': 6}, format='json')
+        despues_del_reparto = timezone.now()
+        self.client.post('/api/ventas/', {
+            'canal_venta': 'presencial', 'empleado': self.empleado.id, 'total': 0,
+            'detalles': [{'producto': producto.id, 'variante': talla_s.id, 'cantidad': 2, 'precio_unitario': '10'}],
+        }, format='json')
+
+        self.assertEqual(historial_stock.stock_variante_en(talla_s.id, despues_del_reparto), 6)
+        respuesta = self.client.get(f'/api/variantes/{talla_s.id}/stock/')
+        self.assertEqual(respuesta.data['stock'], 4)
+        # El historial del producto no cuenta el reparto dos veces
+        self.assertEqual(historial_stock.stock_en(producto.id, timezone.now())[0], 8)
+
+
+# ==========================================
+# GET CONDICIONAL DEL CATÁLOGO
+# ==========================================
+class CatalogoCondicionalTests(BaseInventarioTestCase):
+
+    def test_304_sin_consultar_productos(self):
+        producto = self.crear_producto(stock=5)
+        url = '/api/productos/'
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.get(url)
+        etag = respuesta['ETag']
+        self.assertEqual(respuesta.status_code, 200)
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertFalse([c for c in consultas if 'inventario_producto' in c['sql']])
+
+        self.assertIn('Last-Modified', respuesta)
+        # Otra URL (filtros, página) tiene su propio ETag
+        self.assertEqual(self.client.get(url + '?estado=en_stock', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Un ajuste de stock (UPDATE sin señales) también cambia la versión
+        with self.captureOnCommitCallbacks(execute=True):
+            MovimientoInventario.objects.create(producto=producto, tipo='entrada', cantidad=1)
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_categorias_y_colecciones(self):
+        etag = self.client.get('/api/colecciones/')['ETag']
+        self.assertEqual(self.client.get('/api/colecciones/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/categorias/{self.categoria.id}/', {'nombre': 'Tops'}, format='json')
+        self.assertEqual(self.client.get('/api/colecciones/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# ==========================================
+# SINCRONIZACIÓN INCREMENTAL DEL CATÁLOGO
+# ==========================================
+@override_settings(SINCRONIZACION_MARGEN_SEGUNDOS=0)
+class CambiosProductosTests(BaseInventarioTestCase):
+
+    def cambios(self, since=None, **params):
+        if since:
+            params['since'] = since
+        respuesta = self.client.get('/api/productos/changes/', params)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data
+
+    def test_sincronizacion_por_token(self):
+        productos = [self.crear_producto() for _ in range(3)]
+
+        # Sincronización inicial por partes
+        primera = self.cambios(limite=2)
+        self.assertTrue(primera['hay_mas'])
+        segunda = self.cambios(primera['since'], limite=2)
+        self.assertFalse(segunda['hay_mas'])
+        self.assertEqual(
+            [p['id'] for p in primera['results'] + segunda['results']], [p.id for p in productos]
+        )
+        token = segunda['since']
+        self.assertEqual(self.cambios(token), {'results': [], 'since': token, 'hay_mas': False})
+
+        # Cambio de stock, baja lógica y cambio de nombre de la categoría
+        MovimientoInventario.objects.create(producto=productos[0], tipo='entrada', cantidad=1)
+        self.client.delete(f'/api/productos/{productos[1].id}/')
+        datos = self.cambios(token)
+        self.assertEqual(
+            {(p['id'], p['activo']) for p in datos['results']},
+            {(productos[0].id, True), (productos[1].id, False)},
+        )
+        self.client.patch(f'/api/categorias/{self.categoria.id}/', {'nombre': 'Tops'}, format='json')
+        self.assertEqual(len(self.cambios(datos['since'])['results']), 3)
+
+    @override_settings(SINCRONIZACION_MARGEN_SEGUNDOS=60)
+    def test_margen_de_seguridad(self):
+        self.crear_producto()
+        self.assertEqual(self.cambios()['results'], [])
+
+    @skipUnless(connection.vendor == 'postgresql', 'pg_stat_activity solo existe en PostgreSQL')
+    def test_espera_a_las_transacciones_de_escritura_abiertas(self):
+        otra = connection.get_new_connection(connection.get_connection_params())
+        try:
+            with otra.cursor() as cursor:
+                # Escritura abierta que empieza antes de que se marque el producto
+                cursor.execute('SELECT pg_current_xact_id()')
+            self.crear_producto()
+            self.assertEqual(self.cambios()['results'], [])
+            otra.commit()
+            self.assertEqual(len(self.cambios()['results']), 1)
+        finally:
+            otra.close()
+
+    def test_token_invalido(self):
+        self.assertEqual(self.client.get('/api/productos/changes/?since=xyz').status_code, 400)
+
+
+# ==========================================
+# EVENTOS DE STOCK (SSE)
+# ==========================================
+class EventosStockTests(BaseInventarioTestCase):
+
+    async def conectar(self, token):
+        enviados = []
+        desconexion = asyncio.Event()
+
+        async def receive():
+            await desconexion.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(mensaje):
+            enviados.append(mensaje)
+
+        scope = {'type': 'http', 'path': sse.RUTA, 'query_string': f'token={token}'.encode(), 'headers': []}
+        tarea = asyncio.ensure_future(sse.aplicacion_eventos(scope, receive, send))
+        return tarea, enviados, desconexion
+
+    async def test_difunde_y_libera_al_desconectar(self):
+        producto = await sync_to_async(self.crear_producto)(stock=8)
+        tarea, enviados, desconexion = await self.conectar(AccessToken.for_user(self.user))
+        while not eventos.difusor.hay_suscriptores():
+            await asyncio.sleep(0.01)
+        self.assertEqual(enviados[0]['status'], 200)
+
+        await sync_to_async(eventos.publicar_stock)([producto.id])
+        while len(enviados) < 3:
+            await asyncio.sleep(0.01)
+        cuerpo = enviados[2]['body'].decode()
+        self.assertTrue(cuerpo.startswith('event: stock'))
+        self.assertIn('"stock_actual": 8', cuerpo)
+
+        desconexion.set()
+        await asyncio.wait_for(tarea, 1)
+        self.assertFalse(eventos.difusor.hay_suscriptores())
+
+    async def test_token_requerido(self):
+        tarea, enviados, _ = await self.conectar('')
+        await asyncio.wait_for(tarea, 1)
+        self.assertEqual(enviados[0]['status'], 401)
+
+    def test_sin_suscriptores_no_se_publica(self):
+        producto = self.crear_producto()
+        with self.captureOnCommitCallbacks() as callbacks:
+            MovimientoInventario.objects.create(producto=producto, tipo='entrada', cantidad=1)
+        self.assertEqual(callbacks, [cache_catalogo.invalidar])
+
+
+# ==========================================
+# AUTORIZACIÓN POR CLAIMS DEL TOKEN
+# ==========================================
+class AutorizacionClaimsTests(BaseInventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+        self.vendedor = User.objects.create_user(username='vendedor', password='clave123')
+        self.empleado_vendedor = Empleado.objects.create(user=self.vendedor, fecha_contratacion=date.today())
+
+    def token(self, username, password):
+        respuesta = self.client.post('/api/token/', {'username': username, 'password': password}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data['access']
+
+    def test_sin_consultas_de_usuario_ni_empleado(self):
+        token = self.token('vendedor', 'clave123')
+        self.assertEqual(AccessToken(token)['empleado_id'], self.empleado_vendedor.id)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get('/api/productos/').status_code, 200)
+        tablas = ' '.join(c['sql'] for c in consultas)
+        self.assertNotIn('auth_user', tablas)
+        self.assertNotIn('inventario_empleado', tablas)
+        # Un empleado sin rol de admin no pasa IsAdmin
+        self.assertEqual(self.client.get('/api/empleados/').status_code, 403)
+        self.assertEqual(self.client.get('/api/empleados/me/').data['id'], self.empleado_vendedor.id)
+
+    def test_desactivar_y_eliminar_aplica_a_tokens_emitidos(self):
+        token_vendedor = self.token('vendedor', 'clave123')
+        token_admin = self.token('admin', 'admin123')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token_admin}')
+        self.client.patch(f'/api/empleados/{self.empleado_vendedor.id}/', {'activo': False}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token_vendedor}')
+        self.assertEqual(self.client.get('/api/productos/').status_code, 403)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token_admin}')
+        self.client.delete(f'/api/empleados/{self.empleado_vendedor.id}/')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token_vendedor}')
+        self.assertEqual(self.client.get('/api/productos/').status_code, 401)
+
+    def test_el_cambio_no_depende_de_la_cache(self):
+        token_vendedor = self.token('vendedor', 'clave123')
+        self.empleado_vendedor.activo = False
+        self.empleado_vendedor.save()
+
+        # Aunque la caché descarte la entrada, el cambio sigue en la base de datos
+        cache.clear()
+        autenticacion.limpiar_cache_local()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token_vendedor}')
+        self.assertEqual(self.client.get('/api/productos/').status_code, 403)
+        # Y se vuelve a cargar en la caché
+        with CaptureQueriesContext(connection) as consultas:
+            autenticacion.limpiar_cache_local()
+            self.client.get('/api/productos/')
+        self.assertNotIn('inventario_cambioautorizacion', ' '.join(c['sql'] for c in consultas))
+
+    def test_superusuario_desactivado_desde_el_admin(self):
+        User.objects.create_superuser(username='root', password='clave123')
+        token = self.token('root', 'clave123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get('/api/empleados/').status_code, 200)
+
+        # Como lo haría el admin de Django: sin pasar por EmpleadoViewSet
+        root = User.objects.get(username='root')
+        root.is_active = False
+        root.save()
+        self.assertEqual(self.client.get('/api/empleados/').status_code, 401)
+
+        root.is_active = True
+        root.is_superuser = False
+        root.save()
+        self.assertEqual(self.client.get('/api/empleados/').status_code, 403)
+
+
+# ==========================================
+# MÉTRICAS POR PETICIÓN
+# ==========================================
+class MetricasTests(BaseInventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metricas.histogramas.reiniciar()
+
+    def test_server_timing_e_histogramas(self):
+        self.crear_producto()
+        token = self.client.post('/api/token/', {'username': 'admin', 'password': 'admin123'}).data['access']
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        respuesta = self.client.get('/api/productos/')
+        tramos = {parte.split(';')[0]: parte for parte in respuesta['Server-Timing'].split(', ')}
+        self.assertEqual(set(tramos), {'db', 'auth', 'permisos', 'serializacion', 'total'})
+        self.assertRegex(tramos['db'], r'dur=[\d.]+;desc="[1-9]\d* consultas"')
+
+        resumen = self.client.get('/api/metrics/').data
+        producto_list = resumen['endpoints']['GET producto-list']
+        self.assertEqual(producto_list['peticiones'], 1)
+        self.assertGreater(producto_list['consultas_media'], 0)
+        self.assertEqual(sum(producto_list['histograma'].values()), 1)
+
+    def test_solo_admin(self):
+        vendedor = User.objects.create_user(username='vendedor', password='clave123')
+        Empleado.objects.create(user=vendedor, fecha_contratacion=date.today())
+        self.client.force_authenticate(vendedor)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+
+# ==========================================
+# CONSULTAS LENTAS
+# ==========================================
+class ConsultasLentasTests(BaseInventarioTestCase):
+
+    @override_settings(CONSULTAS_LENTAS_MS=0.000001)
+    def test_registra_vista_parametros_y_plan(self):
+        with self.assertLogs('inventario.consultas_lentas', 'WARNING') as registro:
+            self.crear_producto(nombre='Blusa seda')
+            self.client.get('/api/productos/', {'categoria': self.categoria.id})
+        registros = [json.loads(r.getMessage()) for r in registro.records]
+        listado = [r for r in registros if r['vista'] == 'ProductoViewSet.list' and 'inventario_producto' in r['sql']]
+        self.assertTrue(listado)
+        self.assertTrue(all(isinstance(tipo, str) for r in listado for tipo in r['parametros']))
+        self.assertTrue(any(r['plan'] for r in listado))
+
+        archivo = Path(tempfile.mkdtemp()) / 'consultas.log'
+        self.addCleanup(shutil.rmtree, archivo.parent, ignore_errors=True)
+        lento = {
+            **registros[0], 'base_de_datos': 'sqlite', 'huella': 'SELECT lenta',
+            'duracion_ms': 500.0, 'plan': ['SCAN inventario_venta'],
+        }
+        archivo.write_text('\n'.join(json.dumps(r) for r in registros + [lento, lento]), encoding='utf-8')
+        salida = io.StringIO()
+        call_command('resumen_consultas_lentas', archivo=str(archivo), json=True, stdout=salida)
+        ranking = json.loads(salida.getvalue())
+        self.assertEqual((ranking[0]['huella'], ranking[0]['veces']), ('SELECT lenta', 2))
+        self.assertTrue(ranking[0]['recorrido_completo'])
+
+    def test_la_carpeta_del_archivo_se_crea_al_escribir(self):
+        carpeta = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        archivo = carpeta / 'logs' / 'consultas.log'
+        manejador = consultas_lentas.ArchivoConsultasLentas(archivo, delay=True, encoding='utf-8')
+        self.addCleanup(manejador.close)
+        self.assertFalse(archivo.parent.exists())
+
+        manejador.emit(logging.makeLogRecord({'msg': '{}'}))
+        self.assertEqual(archivo.read_text(encoding='utf-8'), '{}\n')
+
+
+# ==========================================
+# PERFILADO BAJO DEMANDA
+# ==========================================
+class PerfiladoTests(BaseInventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        configuracion = self.settings(PERFILES_DIR=directorio)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        self.client.force_authenticate(None)
+
+    def usar_token(self, username, password):
+        token = self.client.post('/api/token/', {'username': username, 'password': password}).data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_admin_obtiene_perfil(self):
+        self.usar_token('admin', 'admin123')
+        self.assertNotIn('X-Perfil-Id', self.client.get('/api/productos/'))
+
+        respuesta = self.client.get('/api/productos/', HTTP_X_PERFILAR='1')
+        perfil_id = respuesta['X-Perfil-Id']
+        self.assertIn('X-Perfil-Id', self.client.get('/api/ventas/?perfilar=1'))
+
+        perfil = self.client.get(f'/api/perfiles/{perfil_id}/').data
+        self.assertEqual((perfil['ruta'], perfil['estado']), ('/api/productos/', 200))
+        self.assertIn('cumulative', perfil['resumen'])
+        self.assertEqual(len(self.client.get('/api/perfiles/').data), 2)
+        archivo = self.client.get(f'/api/perfiles/{perfil_id}/?formato=prof')
+        self.assertEqual(archivo.status_code, 200)
+        self.assertGreater(len(b''.join(archivo.streaming_content)), 0)
+        self.assertEqual(self.client.get('/api/perfiles/..%2Fsettings/').status_code, 404)
+
+    def test_empleado_no_puede_perfilar(self):
+        vendedor = User.objects.create_user(username='vendedor', password='clave123')
+        Empleado.objects.create(user=vendedor, fecha_contratacion=date.today())
+        self.usar_token('vendedor', 'clave123')
+        respuesta = self.client.get('/api/productos/?perfilar=1')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn('X-Perfil-Id', respuesta)
+        self.assertEqual(self.client.get('/api/perfiles/').status_code, 403)
+
+
+# ==========================================
+# SQLITE EN PRODUCCIÓN
+# ==========================================
+# Sin la transacción envolvente de APITestCase: los reintentos solo ocurren
+# fuera de una transacción
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    SQLITE_REINTENTO_ESPERA_MS=0,
+)
+class SqliteProduccionTests(APITransactionTestCase):
+
+    def setUp(self):
+        autenticacion.limpiar_cache_local()
+        user = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.empleado = Empleado.objects.create(user=user, fecha_contratacion=date.today())
+        self.producto = Producto.objects.create(
+            nombre='Blusa', categoria=Categoria.objects.create(nombre='Blusas'),
+            precio_unitario=Decimal('10'), stock_actual=10,
+        )
+        self.client.force_authenticate(user)
+
+    def bloquear(self, veces):
+        """registrar_venta falla ``veces`` veces con 'database is locked'"""
+        original = reportes.registrar_venta
+        fallos = iter(range(veces))
+
+        def registrar(*args):
+            if next(fallos, None) is not None:
+                raise OperationalError('database is locked')
+            return original(*args)
+        return mock.patch.object(reportes, 'registrar_venta', registrar)
+
+    def vender(self):
+        return self.client.post('/api/ventas/', {
+            'canal_venta': 'presencial',
+            'empleado': self.empleado.id,
+            'total': 0,
+            'detalles': [{'producto': self.producto.id, 'cantidad': 3, 'precio_unitario': '10'}],
+        }, format='json')
+
+    def test_venta_se_reintenta_si_la_base_esta_bloqueada(self):
+        with self.bloquear(2):
+            self.assertEqual(self.vender().status_code, 201)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 7)
+        self.assertEqual(Venta.objects.count(), 1)
+        self.assertEqual(DetalleVenta.objects.count(), 1)
+
+    @override_settings(SQLITE_REINTENTOS=1)
+    def test_reintentos_acotados(self):
+        with self.bloquear(2), self.assertRaises(OperationalError):
+            self.vender()
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 10)
+        self.assertFalse(Venta.objects.exists())
+
+    @skipUnless(connection.vendor == 'sqlite', 'PRAGMA solo existe en SQLite')
+    def test_pragmas_solo_en_modo_produccion(self):
+        def busy_timeout():
+            with connection.cursor() as cursor:
+                return cursor.execute('PRAGMA busy_timeout').fetchone()[0]
+
+        sqlite.configurar_conexion(connection)
+        self.assertNotEqual(busy_timeout(), 1234)
+        pragmas = {'busy_timeout': 1234, 'synchronous': 'NORMAL'}
+        with self.settings(SQLITE_PRODUCCION=True, SQLITE_PRAGMAS=pragmas):
+            sqlite.configurar_conexion(connection)
+        self.assertEqual(busy_timeout(), 1234)
+
+
+# ==========================================
+# HISTORIAL DE STOCK
+# ==========================================
+class HistorialStockTests(BaseInventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto(stock=10)
+        self.t1 = timezone.now()
+        MovimientoInventario.objects.create(producto=self.producto, tipo='entrada', cantidad=5)
+        self.t2 = timezone.now()
+        respuesta = self.client.post('/api/ventas/', {
+            'canal_venta': 'presencial',
+            'empleado': self.empleado.id,
+            'total': 0,
+            'detalles': [{'producto': self.producto.id, 'cantidad': 3, 'precio_unitario': '50000'}],
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        self.t3 = timezone.now()
+
+    def stock(self, momento=None, producto=None):
+        parametros = {'at': momento.isoformat()} if momento else {}
+        return self.client.get(f'/api/productos/{(producto or self.producto).id}/stock/', parametros)
+
+    def test_cada_cambio_queda_en_el_historial(self):
+        self.client.patch(f'/api/productos/{self.producto.id}/', {'stock_actual': 20}, format='json')
+        registros = list(
+            RegistroStock.objects.filter(producto=self.producto).values_list('origen', 'delta')
+        )
+        self.assertEqual(registros, [('inicial', 10), ('movimiento', 5), ('venta', -3), ('edicion', 8)])
+        self.producto.refresh_from_db()
+        self.assertEqual(sum(delta for _, delta in registros), self.producto.stock_actual)
+
+    def test_stock_en_una_fecha(self):
+        antes = self.producto.fecha_creacion - timedelta(seconds=1)
+        esperado = [(antes, 0), (self.t1, 10), (self.t2, 15), (self.t3, 12), (None, 12)]
+        for momento, stock in esperado:
+            self.assertEqual(self.stock(momento).data['stock'], stock, momento)
+
+        # Con un corte intermedio el resultado es el mismo
+        call_command('crear_corte_stock', '--fecha', self.t2.isoformat(), stdout=io.StringIO())
+        for momento, stock in esperado:
+            self.assertEqual(self.stock(momento).data['stock'], stock, momento)
+        self.assertEqual(self.stock(self.t3).data['corte'], self.t2)
+        self.assertIsNone(self.stock(self.t1).data['corte'])
+
+    def test_una_lectura_del_corte_y_una_suma(self):
+        otro = self.crear_producto(stock=7)
+        historial_stock.crear_corte(self.t2)
+        with self.assertNumQueries(2):
+            self.assertEqual(historial_stock.stock_en(self.producto.id, self.t3), (12, self.t2))
+        with self.assertNumQueries(2):
+            saldos, corte = historial_stock.stock_todos_en(timezone.now())
+        self.assertEqual(corte, self.t2)
+        self.assertEqual(saldos, {self.producto.id: 12, otro.id: 7})
+
+        respuesta = self.client.get('/api/productos/stock/', {'at': self.t2.isoformat()})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['results'], [{'producto': self.producto.id, 'stock': 15}])
+
+    def test_fecha_sin_hora_y_fecha_invalida(self):
+        self.assertEqual(self.stock().data['stock'], 12)
+        hoy = timezone.localdate()
+        self.assertEqual(self.client.get(f'/api/productos/{self.producto.id}/stock/', {'at': hoy}).data['stock'], 12)
+        self.assertEqual(self.client.get('/api/productos/stock/', {'at': 'ayer'}).status_code, 400)
+
+    def test_el_historial_no_se_modifica(self):
+        registro = RegistroStock.objects.filter(producto=self.producto).first()
+        registro.delta = 100
+        with self.assertRaises(ValueError):
+            registro.save()
+        with self.assertRaises(ValueError):
+            registro.delete()
+
+
+# ==========================================
+# VERSIONES REDUCIDAS DE LAS IMÁGENES
+# ==========================================
+class ImagenesProductoTests(BaseInventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracion = self.settings(MEDIA_ROOT=self.media, IMAGENES_SEGUNDO_PLANO=False)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        self.producto = self.crear_producto()
+
+    def png(self, nombre='foto.png', tamano=(2000, 1000)):
+        contenido = io.BytesIO()
+        Image.new('RGBA', tamano, (200, 30, 30, 128)).save(contenido, 'PNG')
+        return SimpleUploadedFile(nombre, contenido.getvalue(), content_type='image/png')
+
+    def subir(self, archivo):
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.patch(
+                f'/api/productos/{self.producto.id}/', {'imagen': archivo}, format='multipart'
+            )
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        self.producto.refresh_from_db()
+        return self.producto.imagenes
+
+    def test_genera_webp_y_jpeg_por_tamano(self):
+        derivadas = self.subir(self.png())
+        self.assertEqual(derivadas['origen'], self.producto.imagen.name)
+        with Image.open(Path(self.media) / derivadas['miniatura']['webp']) as miniatura:
+            self.assertEqual((miniatura.format, miniatura.size), ('WEBP', (160, 80)))
+        with Image.open(Path(self.media) / derivadas['grande']['jpeg']) as grande:
+            self.assertEqual((grande.format, grande.mode, grande.size), ('JPEG', 'RGB', (1200, 600)))
+
+        urls = self.client.get(f'/api/productos/{self.producto.id}/').data['imagenes']
+        self.assertEqual(set(urls), {'miniatura', 'mediana', 'grande'})
+        self.assertTrue(urls['miniatura']['webp'].startswith('http://testserver/media/productos/derivadas/'))
+
+    def test_imagen_pequena_no_se_amplia(self):
+        derivadas = self.subir(self.png(tamano=(100, 50)))
+        with Image.open(Path(self.media) / derivadas['grande']['webp']) as grande:
+            self.assertEqual(grande.size, (100, 50))
+
+    def test_reemplazo_borra_las_versiones_anteriores(self):
+        anteriores = imagenes.archivos(self.subir(self.png()))
+        nuevas = imagenes.archivos(self.subir(self.png('otra.png')))
+        self.assertFalse(any((Path(self.media) / nombre).exists() for nombre in anteriores))
+        self.assertTrue(all((Path(self.media) / nombre).exists() for nombre in nuevas))
+
+        # Un trabajo atrasado de la imagen anterior no pisa las versiones nuevas
+        archivos_antes = set(Path(self.media).rglob('*'))
+        self.assertFalse(imagenes.procesar(self.producto.id, 'productos/foto.png'))
+        self.assertEqual(set(Path(self.media).rglob('*')), archivos_antes)
+
+    def test_sin_versiones_el_campo_es_nulo(self):
+        self.assertIsNone(self.client.get(f'/api/productos/{self.producto.id}/').data['imagenes'])
+
+    def test_comando_procesa_las_existentes(self):
+        nombre = default_storage.save('productos/antigua.png', self.png())
+        Producto.objects.filter(pk=self.producto.pk).update(imagen=nombre)
+        salida = io.StringIO()
+        call_command('procesar_imagenes', '--hilos', '0', stdout=salida)
+        self.assertIn('Procesadas: 1. Fallidas: 0.', salida.getvalue())
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.imagenes['origen'], nombre)
+
+        call_command('procesar_imagenes', '--hilos', '0', stdout=salida)
+        self.assertIn('0 imágenes por procesar.', salida.getvalue())
+
+
+# ==========================================
+# REPORTES EN SEGUNDO PLANO
+# ==========================================
+class TrabajosReportesTests(BaseInventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        producto = self.crear_producto()
+        # Dos años de resumen diario: un día por mes y canal
+        ResumenVentaDiaria.objects.bulk_create([
+            ResumenVentaDiaria(
+                dia=date(anio, mes, 15), producto=producto, canal_venta=canal, empleado=self.empleado,
+                unidades=unidades, ingresos=Decimal(unidades * 1000), descuento=Decimal('100'),
+            )
+            for anio in (2024, 2025) for mes in range(1, 13)
+            for canal, unidades in (('nequi', 1), ('presencial', 2))
+        ])
+        self.pedido = {'desde': '2024-01-01', 'hasta': '2025-12-31', 'granularidad': 'anio', 'dimensiones': ['canal']}
+
+    def pedir(self, **cambios):
+        return self.client.post('/api/reportes/jobs/', {**self.pedido, **cambios}, format='json')
+
+    def trabajar(self):
+        salida = io.StringIO()
+        call_command('worker_reportes', '--procesos', '0', '--una-vez', stdout=salida)
+        return salida.getvalue()
+
+    def test_pedido_estado_y_resultado(self):
+        respuesta = self.pedir()
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        trabajo_id = respuesta.data['id']
+        self.assertEqual(respuesta.data['estado'], 'pendiente')
+        self.assertEqual(self.client.get(f'/api/reportes/jobs/{trabajo_id}/resultado/').status_code, 202)
+
+        self.assertIn(f'Reporte #{trabajo_id}: terminado', self.trabajar())
+        estado = self.client.get(f'/api/reportes/jobs/{trabajo_id}/').data
+        self.assertEqual((estado['estado'], estado['progreso']), ('terminado', 100))
+
+        resultado = self.client.get(f'/api/reportes/jobs/{trabajo_id}/resultado/').data
+        self.assertEqual(
+            [(fila['periodo'], fila['canal'], fila['unidades'], fila['neto']) for fila in resultado['filas']],
+            [('2024', 'presencial', 24, '22800.00'), ('2024', 'nequi', 12, '10800.00'),
+             ('2025', 'presencial', 24, '22800.00'), ('2025', 'nequi', 12, '10800.00')],
+        )
+        self.assertEqual(resultado['totales']['unidades'], 72)
+
+    def test_tramos_no_cambian_el_resultado(self):
+        argumentos = (date(2024, 1, 1), date(2025, 12, 31), 'semana', ['producto', 'canal'])
+        self.assertEqual(
+            reportes.ventas_por_periodo(*argumentos, dias_por_tramo=5),
+            reportes.ventas_por_periodo(*argumentos, dias_por_tramo=1000),
+        )
+
+    def test_pedidos_iguales_reutilizan_trabajo_y_cache(self):
+        primero = self.pedir().data['id']
+        # Mismas dimensiones en otro orden: mismo reporte, mismo trabajo en curso
+        repetido = self.pedir(dimensiones=['canal', 'canal'])
+        self.assertEqual((repetido.status_code, repetido.data['id']), (200, primero))
+
+        self.trabajar()
+        desde_cache = self.pedir()
+        self.assertEqual((desde_cache.status_code, desde_cache.data['estado']), (201, 'terminado'))
+        self.assertEqual(
+            self.client.get(f"/api/reportes/jobs/{desde_cache.data['id']}/resultado/").data['filas'],
+            self.client.get(f'/api/reportes/jobs/{primero}/resultado/').data['filas'],
+        )
+
+    def test_cancelar_pendiente_y_en_proceso(self):
+        pendiente = self.pedir().data['id']
+        self.assertEqual(self.client.post(f'/api/reportes/jobs/{pendiente}/cancelar/').data['estado'], 'cancelado')
+        self.assertEqual(self.client.post(f'/api/reportes/jobs/{pendiente}/cancelar/').status_code, 409)
+        self.assertEqual(self.client.get(f'/api/reportes/jobs/{pendiente}/resultado/').status_code, 409)
+
+        en_proceso = self.pedir(granularidad='mes').data['id']
+        trabajo_id, reclamo = trabajos_reportes.reclamar('prueba')
+        self.assertEqual(trabajo_id, en_proceso)
+        self.assertTrue(self.client.post(f'/api/reportes/jobs/{en_proceso}/cancelar/').data['cancelar'])
+        self.assertEqual(trabajos_reportes.ejecutar(en_proceso, reclamo), 'cancelado')
+        self.assertIsNone(TrabajoReporte.objects.get(pk=en_proceso).resultado)
+
+    def test_trabajo_abandonado_vuelve_a_la_cola(self):
+        trabajo_id = self.pedir().data['id']
+        _, caido = trabajos_reportes.reclamar('caido')
+        self.assertIsNone(trabajos_reportes.reclamar('otro'))
+
+        vencido = timezone.now() - timedelta(seconds=settings.REPORTES_TRABAJO_EXPIRACION_SEGUNDOS + 1)
+        TrabajoReporte.objects.filter(pk=trabajo_id).update(latido=vencido)
+        self.assertEqual(trabajos_reportes.reclamar('otro')[0], trabajo_id)
+        TrabajoReporte.objects.filter(pk=trabajo_id).update(latido=vencido)
+        # El mismo trabajador lo vuelve a reclamar (otro proceso de su pool)
+        _, actual = trabajos_reportes.reclamar('otro')
+        self.assertEqual(TrabajoReporte.objects.get(pk=trabajo_id).intentos, 3)
+
+        # Los reclamos anteriores ya no pueden escribir el resultado, aunque el trabajador se llame igual
+        self.assertEqual(trabajos_reportes.ejecutar(trabajo_id, caido), 'en_proceso')
+        self.assertIsNone(TrabajoReporte.objects.get(pk=trabajo_id).resultado)
+        self.assertEqual(trabajos_reportes.ejecutar(trabajo_id, actual), 'terminado')
+
+    def test_validacion(self):
+        self.assertEqual(self.pedir(hasta='2023-12-31').status_code, 400)
+        self.assertEqual(self.pedir(dimensiones=['color']).status_code, 400)
+        self.assertEqual(self.pedir(granularidad='hora').status_code, 400)
+
+
+class LatidoTrabajosReportesTests(APITransactionTestCase):
+    """El hilo de latido usa su propia conexión: necesita ver los datos confirmados"""
+
+    @override_settings(REPORTES_TRABAJO_LATIDO_SEGUNDOS=0.05)
+    def test_latido_no_depende_de_los_tramos(self):
+        cache.clear()
+        TrabajoReporte.objects.create(parametros={
+            'desde': '2024-01-01', 'hasta': '2024-01-31', 'granularidad': 'mes', 'dimensiones': [],
+        }, firma='latido')
+        trabajo_id, reclamo = trabajos_reportes.reclamar('prueba')
+        renovado = []
+
+        def tramo_lento(*args, **kwargs):
+            # Un único tramo más largo que el intervalo del latido
+            antes = TrabajoReporte.objects.get(pk=trabajo_id).latido
+            time.sleep(0.5)
+            renovado.append(TrabajoReporte.objects.get(pk=trabajo_id).latido > antes)
+            return {'filas': [], 'totales': {}}
+
+        with mock.patch.object(reportes, 'ventas_por_periodo', tramo_lento):
+            self.assertEqual(trabajos_reportes.ejecutar(trabajo_id, reclamo), 'terminado')
+        self.assertEqual(renovado, [True])
+
+
+# ==========================================
+# DATOS SINTÉTICOS Y BENCHMARKS
+# ==========================================
+class ComandosSinteticosTests(BaseInventarioTestCase):
+
+    def sembrar(self):
+        call_command(
+            'seed_synthetic', productos=6, empleados=2, ventas=30, movimientos=20, dias=10, lote=7, forzar=True,
+            stdout=io.StringIO(),
+        )
+
+    def test_seed_synthetic_respeta_el_stock_y_su_historial(self):
+        self.sembrar()
+        self.assertEqual(Venta.objects.count(), 30)
+        self.assertEqual(MovimientoInventario.objects.count(), 20)
+        self.assertFalse(DetalleVenta.objects.filter(variante__isnull=True).exists())
+
+        historial = dict(
+            RegistroStock.objects.order_by().values_list('producto_id').annotate(total=Sum('delta'))
+        )
+        for producto in Producto.objects.all():
+            variantes = list(ProductoVariante.objects.filter(producto=producto).values_list('id', 'stock'))
+            self.assertEqual(producto.stock_actual, sum(stock for _, stock in variantes))
+            self.assertEqual(producto.stock_actual, historial.get(producto.id, 0))
+            self.assertEqual(producto.estado, producto.calcular_estado())
+            for variante_id, stock in variantes:
+                self.assertEqual(historial_stock.stock_variante_en(variante_id, timezone.now()), stock)
+
+        # Ningún momento del historial queda en negativo
+        saldos = {}
+        for variante_id, delta, fecha in RegistroStock.objects.values_list('variante_id', 'delta_variante', 'fecha'):
+            saldos[variante_id] = saldos.get(variante_id, 0) + delta
+            self.assertGreaterEqual(saldos[variante_id], 0, fecha)
+
+    def test_bench_api(self):
+        self.sembrar()
+        salida = io.StringIO()
+        call_command(
+            'bench_api', peticiones=2, calentamiento=1, escenarios='productos_listado,venta_crear,movimiento_crear',
+            stdout=salida, stderr=io.StringIO(),
+        )
+        resultado = json.loads(salida.getvalue())
+        self.assertEqual(resultado['escenarios']['productos_listado']['estados_http'], [200])
+        self.assertEqual(resultado['escenarios']['venta_crear']['estados_http'], [201])
+        self.assertEqual(resultado['escenarios']['movimiento_crear']['estados_http'], [201])
+        # Las escrituras del benchmark se revierten
+        self.assertEqual(Venta.objects.count(), 30)
@@ -0,0 +1,182 @@
+"""
+Cola de reportes de ventas en la base de datos (TrabajoReporte).
+
+- ``encolar`` crea el trabajo desde POST /api/reportes/jobs/. Si el mismo
+  reporte ya está en la caché de reportes el trabajo nace terminado, y si ya
+  hay uno igual pendiente o en proceso se devuelve ese.
+- ``python manage.py worker_reportes`` toma los pendientes con ``reclamar``
+  (un UPDATE condicional: dos trabajadores nunca se llevan el mismo) y los
+  calcula con ``ejecutar`` en un pool de procesos. Cada reclamo lleva un uuid
+  propio y toda escritura posterior lo exige, así que un proceso que perdió
+  el trabajo no puede pisar el resultado de quien lo reclamó después.
+- ``ejecutar`` calcula por tramos (reportes.ventas_por_periodo). Entre tramos
+  guarda el progreso con un UPDATE que no encuentra la fila si se pidió
+  cancelar: así la cancelación cuesta una consulta que ya se hacía. El latido
+  lo renueva un hilo cada REPORTES_TRABAJO_LATIDO_SEGUNDOS, aunque un tramo
+  tarde más que la expiración.
+- Un trabajo en proceso sin latido en REPORTES_TRABAJO_EXPIRACION_SEGUNDOS
+  (el trabajador murió) vuelve a la cola, hasta REPORTES_TRABAJO_INTENTOS veces.
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.utils import timezone
+
+from . import cache_reportes, reportes
+from .models import TrabajoReporte
+
+logger = logging.getLogger('inventario.trabajos_reportes')
+
+NOMBRE_CACHE = 'trabajo'
+ACTIVOS = ('pendiente', 'en_proceso')
+
+
+def nombre_trabajador():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def encolar(parametros, usuario=None):
+    """(trabajo, creado) para ``parametros`` (desde/hasta ISO, granularidad, dimensiones)"""
+    resultado = cache_reportes.buscar(cache_reportes.clave(NOMBRE_CACHE, parametros))
+    firma = cache_reportes.firma(parametros)
+    # Con JWT request.user es un TokenUser, no un User: basta con el id
+    creado_por_id = usuario.pk if getattr(usuario, 'is_authenticated', False) else None
+
+    if resultado is not None:
+        ahora = timezone.now()
+        trabajo = TrabajoReporte.objects.create(
+            parametros=parametros, firma=firma, estado='terminado', progreso=100, resultado=resultado,
+            creado_por_id=creado_por_id, fecha_inicio=ahora, fecha_fin=ahora,
+        )
+        return trabajo, True
+
+    existente = TrabajoReporte.objects.filter(firma=firma, estado__in=ACTIVOS, cancelar=False).order_by('id').first()
+    if existente is not None:
+        return existente, False
+    return TrabajoReporte.objects.create(parametros=parametros, firma=firma, creado_por_id=creado_por_id), True
+
+
+def cancelar(trabajo_id):
+    """
+    Cancela un trabajo pendiente o pide al trabajador que detenga uno en
+    proceso. False si ya había terminado (o fallado, o estaba cancelado).
+    """
+    ahora = timezone.now()
+    if TrabajoReporte.objects.filter(pk=trabajo_id, estado='pendiente').update(
+        estado='cancelado', cancelar=True, fecha_fin=ahora
+    ):
+        return True
+    return bool(TrabajoReporte.objects.filter(pk=trabajo_id, estado='en_proceso').update(cancelar=True))
+
+
+def liberar_vencidos():
+    """Devuelve a la cola los trabajos cuyo trabajador dejó de dar señales"""
+    ahora = timezone.now()
+    vencidos = TrabajoReporte.objects.filter(
+        estado='en_proceso', latido__lt=ahora - timedelta(seconds=settings.REPORTES_TRABAJO_EXPIRACION_SEGUNDOS)
+    )
+    vencidos.filter(intentos__gte=settings.REPORTES_TRABAJO_INTENTOS).update(
+        estado='fallido', error='El trabajador dejó de responder', fecha_fin=ahora
+    )
+    vencidos.filter(cancelar=True).update(estado='cancelado', fecha_fin=ahora)
+    vencidos.update(estado='pendiente', trabajador='', reclamo=None, progreso=0)
+
+
+def reclamar(trabajador):
+    """
+    Marca como en proceso el pendiente más antiguo y devuelve (id, reclamo),
+    o None si no hay pendientes. ``reclamo`` se le pasa a ``ejecutar``.
+    """
+    liberar_vencidos()
+    pendientes = TrabajoReporte.objects.filter(estado='pendiente').order_by('fecha_creacion', 'id')
+    for _ in range(10):
+        trabajo_id = pendientes.values_list('id', flat=True).first()
+        if trabajo_id is None:
+            return None
+        ahora = timezone.now()
+        reclamo = uuid.uuid4()
+        if TrabajoReporte.objects.filter(pk=trabajo_id, estado='pendiente').update(
+            estado='en_proceso', trabajador=trabajador, reclamo=reclamo, fecha_inicio=ahora, latido=ahora,
+            intentos=F('intentos') + 1,
+        ):
+            return trabajo_id, reclamo
+        # Otro trabajador lo tomó entre la lectura y el UPDATE
+    return None
+
+
+class Latido(threading.Thread):
+    """Renueva el latido de ``propio`` hasta ``detener()`` o hasta perder el trabajo"""
+
+    def __init__(self, propio):
+        super().__init__(name='latido-reporte', daemon=True)
+        self.propio = propio
+        self._detenido = threading.Event()
+
+    def run(self):
+        try:
+            while not self._detenido.wait(settings.REPORTES_TRABAJO_LATIDO_SEGUNDOS):
+                try:
+                    if not self.propio.update(latido=timezone.now()):
+                        return
+                except DatabaseError:
+                    logger.warning("No se pudo renovar el latido", exc_info=True)
+        finally:
+            # La conexión es de este hilo
+            connection.close()
+
+    def detener(self):
+        self._detenido.set()
+        self.join()
+
+
+def _estado(trabajo_id):
+    return TrabajoReporte.objects.filter(pk=trabajo_id).values_list('estado', flat=True).first()
+
+
+def ejecutar(trabajo_id, reclamo):
+    """Calcula el trabajo de ``reclamo`` (ver ``reclamar``) y guarda el resultado (o el error)"""
+    trabajo = TrabajoReporte.objects.get(pk=trabajo_id)
+    propio = TrabajoReporte.objects.filter(pk=trabajo_id, estado='en_proceso', reclamo=reclamo)
+    parametros = trabajo.parametros
+    clave = cache_reportes.clave(NOMBRE_CACHE, parametros)
+
+    def al_avanzar(fraccion):
+        return bool(propio.filter(cancelar=False).update(progreso=int(fraccion * 100)))
+
+    resultado = cache_reportes.buscar(clave)
+    if resultado is None:
+        latido = Latido(propio)
+        latido.start()
+        try:
+            resultado = reportes.ventas_por_periodo(
+                date.fromisoformat(parametros['desde']),
+                date.fromisoformat(parametros['hasta']),
+                parametros['granularidad'],
+                parametros['dimensiones'],
+                al_avanzar=al_avanzar,
+            )
+        except reportes.ReporteCancelado:
+            if propio.filter(cancelar=True).update(estado='cancelado', fecha_fin=timezone.now()):
+                return 'cancelado'
+            # Se perdió el trabajo: sigue en manos de quien lo reclamó después
+            return _estado(trabajo_id)
+        except Exception as error:
+            logger.exception("Falló el reporte #%s", trabajo_id)
+            propio.update(estado='fallido', error=str(error) or error.__class__.__name__, fecha_fin=timezone.now())
+            return 'fallido'
+        finally:
+            latido.detener()
+        cache_reportes.guardar(clave, resultado)
+
+    ahora = timezone.now()
+    if propio.filter(cancelar=False).update(estado='terminado', resultado=resultado, progreso=100, fecha_fin=ahora):
+        return 'terminado'
+    propio.update(estado='cancelado', fecha_fin=ahora)
+    return _estado(trabajo_id)
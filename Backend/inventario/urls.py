@@ -1,26 +1,31 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path
 from .views import (
-    CategoriaViewSet, ColeccionViewSet, ProductoViewSet,
+    CategoriaViewSet, ColeccionViewSet, ProductoViewSet, ProductoVarianteViewSet,
     ClienteViewSet, EmpleadoViewSet,
-    VentaViewSet, MovimientoInventarioViewSet
+    VentaViewSet, MovimientoInventarioViewSet, TrabajoReporteViewSet
 )
 
 router = DefaultRouter()
 router.register(r'categorias', CategoriaViewSet)
 router.register(r'colecciones', ColeccionViewSet)
 router.register(r'productos', ProductoViewSet)
+router.register(r'variantes', ProductoVarianteViewSet)
 router.register(r'clientes', ClienteViewSet)
 router.register(r'empleados', EmpleadoViewSet)
 router.register(r'ventas', VentaViewSet)
 router.register(r'movimientos-inventario', MovimientoInventarioViewSet)
+router.register(r'reportes/jobs', TrabajoReporteViewSet)
 
 urlpatterns = router.urls
 
-from .views import google_login
+from .views import google_login, metrics, perfil, perfiles
 
 urlpatterns = [
     path("google-login/", google_login),    
+    path("metrics/", metrics),
+    path("perfiles/", perfiles),
+    path("perfiles/<str:perfil_id>/", perfil),
 ]
 
 urlpatterns += router.urls
@@ -2,31 +2,43 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
-from django.db.models import F, Sum
-from django.db.models.functions import TruncMonth
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Prefetch
+from django.http import FileResponse
+from collections import Counter
 from datetime import date, timedelta
 from django.utils import timezone
+from django.utils.http import http_date, parse_etags
 from .filters import ProductoFilter
+from .pagination import FechaKeysetPagination
+from .parsers import NDJSONParser
+from . import (
+    autenticacion, cache_catalogo, cache_reportes, exportacion, historial_stock, metricas, perfilado, reportes,
+    sincronizacion, sqlite, trabajos_reportes,
+)
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
+import hashlib
 import jwt
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 
 from .models import (
-    Categoria, Coleccion, Producto, 
+    Categoria, Coleccion, Producto, ProductoVariante,
     Venta, DetalleVenta, MovimientoInventario, 
-    Cliente, Empleado
+    Cliente, Empleado, TrabajoReporte
 )
 from .serializers import (
-    CategoriaSerializer, ColeccionSerializer, ProductoSerializer, 
+    CategoriaSerializer, ColeccionSerializer, ProductoSerializer, ProductoVarianteSerializer,
     VentaSerializer, CrearVentaSerializer, DetalleVentaSerializer, 
-    MovimientoInventarioSerializer, ClienteSerializer, EmpleadoSerializer
+    MovimientoInventarioSerializer, ClienteSerializer, EmpleadoSerializer,
+    TrabajoReporteSerializer, CrearTrabajoReporteSerializer, ventas_repetidas
 )
 
 
@@ -62,13 +74,16 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     
     @classmethod
     def get_token(cls, user):
-        """Personalizar el token para incluir is_staff"""
+        """Personalizar el token para incluir is_staff y los claims de autorización"""
         token = super().get_token(user)
         
         # Agregar campos personalizados al token
         token['is_staff'] = user.is_staff
         token['first_name'] = user.first_name
         token['last_name'] = user.last_name
+        # empleado_id, activo, rol, is_superuser: los permisos no consultan la BD
+        for clave, valor in autenticacion.reclamos_usuario(user).items():
+            token[clave] = valor
         
         return token
 
@@ -82,9 +97,17 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 class IsAdmin(IsAuthenticated):
     """Permiso solo para administradores"""
     def has_permission(self, request, view):
+        with metricas.medir('permisos'):
+            return self._verificar(request, view)
+
+    def _verificar(self, request, view):
         if not super().has_permission(request, view):
             return False
         
+        user = request.user
+        if isinstance(user, autenticacion.UsuarioToken):
+            return user.is_staff if user.empleado_id is not None else user.is_superuser
+        
         try:
             empleado = request.user.empleado
             return empleado.user.is_staff
@@ -95,9 +118,17 @@ class IsAdmin(IsAuthenticated):
 class IsEmpleado(IsAuthenticated):
     """Permiso solo para empleados (tanto admin como usuario)"""
     def has_permission(self, request, view):
+        with metricas.medir('permisos'):
+            return self._verificar(request, view)
+
+    def _verificar(self, request, view):
         if not super().has_permission(request, view):
             return False
         
+        user = request.user
+        if isinstance(user, autenticacion.UsuarioToken):
+            return user.empleado_activo if user.empleado_id is not None else user.is_superuser
+        
         try:
             empleado = request.user.empleado
             return empleado.activo
@@ -105,24 +136,90 @@ class IsEmpleado(IsAuthenticated):
             return request.user.is_superuser
 
 
+# ==================== EXPORTACIÓN ====================
+def exportar(request, columnas, obtener_filas, nombre_archivo):
+    """
+    Respuesta en streaming para las acciones exportar.
+    Parámetros: ?formato=csv|ndjson&desde=YYYY-MM-DD&hasta=YYYY-MM-DD
+    (no se usa ?format= porque DRF lo reserva para sus renderers).
+    """
+    formato = request.query_params.get('formato', 'csv')
+    if formato not in exportacion.FORMATOS:
+        return Response(
+            {"error": "formato debe ser csv o ndjson"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        limites = exportacion.rango_fechas(
+            request.query_params.get('desde'), request.query_params.get('hasta')
+        )
+    except ValueError:
+        return Response(
+            {"error": "Las fechas deben tener el formato YYYY-MM-DD"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return exportacion.respuesta_streaming(
+        request._request, columnas, obtener_filas(limites), formato, nombre_archivo
+    )
+
+
+# ==================== GET CONDICIONAL ====================
+class CatalogoCondicionalMixin:
+    """
+    ETag y Last-Modified para list/retrieve del catálogo, derivados de la
+    versión del catálogo (cache_catalogo). Si el cliente ya tiene la versión
+    actual se responde 304 sin consultar la tabla ni serializar nada.
+    """
+
+    def respuesta_condicional(self, request, generar):
+        token, modificado = cache_catalogo.version()
+        firma = f'{token}:{request.get_full_path()}:{request.accepted_media_type}'
+        etag = f'"{hashlib.sha1(firma.encode()).hexdigest()}"'
+        # Solo se valida con el ETag: Last-Modified tiene resolución de segundos
+        # y dos versiones del mismo segundo darían un 304 equivocado con If-Modified-Since
+        if_none_match = request.headers.get('If-None-Match', '')
+        no_modificado = etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+
+        respuesta = Response(status=status.HTTP_304_NOT_MODIFIED) if no_modificado else generar()
+        if respuesta.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            respuesta['ETag'] = etag
+            respuesta['Last-Modified'] = http_date(modificado)
+            # El navegador guarda la respuesta pero la revalida en cada uso
+            respuesta['Cache-Control'] = 'private, no-cache'
+        return respuesta
+
+    def list(self, request, *args, **kwargs):
+        listar = super().list
+        return self.respuesta_condicional(request, lambda: listar(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        obtener = super().retrieve
+        return self.respuesta_condicional(request, lambda: obtener(request, *args, **kwargs))
+
+
 # ==================== VIEWSETS ====================
-class CategoriaViewSet(viewsets.ModelViewSet):
+class CategoriaViewSet(CatalogoCondicionalMixin, viewsets.ModelViewSet):
     """Permite el CRUD de las categorías de productos."""
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
     permission_classes = [IsAdmin]  # Solo admin
 
 
-class ColeccionViewSet(viewsets.ModelViewSet):
+class ColeccionViewSet(CatalogoCondicionalMixin, viewsets.ModelViewSet):
     """Permite el CRUD de las colecciones."""
     queryset = Coleccion.objects.all()
     serializer_class = ColeccionSerializer
     permission_classes = [IsAdmin]  # Solo admin
 
 
-class ProductoViewSet(viewsets.ModelViewSet):
+class ProductoViewSet(CatalogoCondicionalMixin, viewsets.ModelViewSet):
     """Permite el CRUD de los productos y filtros para stock bajo."""
-    queryset = Producto.objects.filter(activo=True).order_by('nombre')
+    queryset = (
+        Producto.objects.filter(activo=True)
+        .select_related('categoria', 'coleccion')
+        .prefetch_related('variantes')
+        .order_by('nombre')
+    )
     serializer_class = ProductoSerializer
     permission_classes = [IsAdmin]  # Solo admin para edición/creación
     filterset_class = ProductoFilter
@@ -154,10 +251,110 @@ class ProductoViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         
         if self.request.query_params.get('stock_bajo') in ['true', 'True']:
-            return queryset.filter(stock_actual__lte=F('stock_minimo'))
+            return queryset.filter(estado__in=['bajo_stock', 'agotado'])
         
         return queryset
 
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request):
+        """
+        Productos creados o modificados (incluidos los desactivados) desde
+        ?since=<token>. Sin token entrega el catálogo completo por partes.
+        Respuesta: {"results": [...], "since": <token siguiente>, "hay_mas": bool}
+        """
+        try:
+            limite = int(request.query_params.get('limite', settings.SINCRONIZACION_LIMITE))
+        except ValueError:
+            limite = settings.SINCRONIZACION_LIMITE
+        limite = max(1, min(limite, settings.SINCRONIZACION_LIMITE * 4))
+
+        queryset = Producto.objects.select_related('categoria', 'coleccion').prefetch_related('variantes')
+        try:
+            productos, token, hay_mas = sincronizacion.cambios_desde(
+                queryset, request.query_params.get('since'), limite
+            )
+        except sincronizacion.TokenInvalido:
+            return Response({"error": "Token since inválido"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "results": self.get_serializer(productos, many=True).data,
+            "since": token,
+            "hay_mas": hay_mas,
+        })
+
+    @action(detail=False, methods=['get'], url_path='estados')
+    def estados(self, request):
+        """Cantidad de productos activos en cada estado de stock."""
+        conteos = dict(
+            Producto.objects.filter(activo=True)
+            .order_by()
+            .values_list('estado')
+            .annotate(total=Count('id'))
+        )
+        return Response({
+            estado: conteos.get(estado, 0) for estado, _ in Producto.ESTADO_CHOICES
+        })
+
+    @action(detail=True, methods=['get'], url_path='stock')
+    def stock(self, request, pk=None):
+        """Stock del producto en ?at=<fecha ISO> (por defecto ahora)."""
+        try:
+            momento = historial_stock.leer_momento(request.query_params.get('at'))
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        producto = self.get_object()
+        stock, corte = historial_stock.stock_en(producto.pk, momento)
+        return Response({"producto": producto.pk, "at": momento, "stock": stock, "corte": corte})
+
+    @action(detail=False, methods=['get'], url_path='stock', url_name='stock-todos')
+    def stock_todos(self, request):
+        """Stock de todos los productos en ?at=<fecha ISO> (por defecto ahora)."""
+        try:
+            momento = historial_stock.leer_momento(request.query_params.get('at'))
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        saldos, corte = historial_stock.stock_todos_en(momento)
+        return Response({
+            "at": momento,
+            "corte": corte,
+            "results": [{"producto": producto_id, "stock": saldos[producto_id]} for producto_id in sorted(saldos)],
+        })
+
+
+class ProductoVarianteViewSet(viewsets.ModelViewSet):
+    """
+    Variantes (talla x color) de los productos y su stock.
+    Se crean y eliminan al editar tallas/colores del producto; aquí solo se
+    consulta y se reparte el stock entre ellas.
+    """
+    queryset = ProductoVariante.objects.select_related('producto').order_by('producto', 'talla', 'color')
+    serializer_class = ProductoVarianteSerializer
+    http_method_names = ['get', 'put', 'patch', 'head', 'options']
+    filterset_fields = ['producto', 'talla', 'color']
+
+    def get_permissions(self):
+        """Lectura para empleados (punto de venta), reparto de stock solo admin."""
+        if self.request.method in ['GET', 'HEAD', 'OPTIONS']:
+            permission_classes = [IsEmpleado]
+        else:
+            permission_classes = [IsAdmin]
+        return [permission() for permission in permission_classes]
+
+    @action(detail=True, methods=['get'], url_path='stock')
+    def stock(self, request, pk=None):
+        """Stock de la variante en ?at=<fecha ISO> (por defecto ahora)."""
+        try:
+            momento = historial_stock.leer_momento(request.query_params.get('at'))
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        variante = self.get_object()
+        return Response({
+            "variante": variante.pk, "at": momento, "stock": historial_stock.stock_variante_en(variante.pk, momento),
+        })
+
 
 class ClienteViewSet(viewsets.ModelViewSet):
     """Permite el CRUD de clientes (mayoristas/internacionales)."""
@@ -185,7 +382,7 @@ class EmpleadoViewSet(viewsets.ModelViewSet):
     ViewSet para manejar empleados.
     Solo admin puede ver, crear, editar y eliminar empleados.
     """
-    queryset = Empleado.objects.all().order_by('user__first_name')
+    queryset = Empleado.objects.select_related('user').order_by('user__first_name')
     serializer_class = EmpleadoSerializer
     permission_classes = [IsAdmin]  # Solo admin
 
@@ -286,7 +483,7 @@ class EmpleadoViewSet(viewsets.ModelViewSet):
         Devuelve el empleado asociado al usuario autenticado.
         """
         try:
-            empleado = Empleado.objects.get(user=request.user)
+            empleado = Empleado.objects.select_related('user').get(user_id=request.user.id)
         except Empleado.DoesNotExist:
             return Response(
                 {'detail': 'No hay empleado asociado a este usuario'},
@@ -297,13 +494,29 @@ class EmpleadoViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+def referencia_venta(datos):
+    """Referencia del POS de una venta de POST /api/ventas/bulk/ como texto (o None)"""
+    referencia = datos.get('referencia') if isinstance(datos, dict) else None
+    return None if referencia is None else str(referencia)
+
+
+def resultado_venta(resultado, venta):
+    """Resultado de una venta guardada (o ya registrada con esa referencia) de la carga masiva"""
+    if getattr(venta, 'repetida', False):
+        return {**resultado, "creada": False, "repetida": True, "id": venta.id}
+    return {**resultado, "creada": True, "id": venta.id}
+
+
 class VentaViewSet(viewsets.ModelViewSet):
     """
     Permite el CRUD de ventas.
     Solo admin puede editar y eliminar, todos los empleados pueden crear.
     """
-    queryset = Venta.objects.all().order_by('-fecha')
+    queryset = Venta.objects.select_related('empleado__user').prefetch_related(
+        Prefetch('detalles', queryset=DetalleVenta.objects.select_related('producto'))
+    ).order_by('-fecha')
     permission_classes = [IsEmpleado]  # Todos los empleados
+    pagination_class = FechaKeysetPagination
     
     def get_permissions(self):
         """
@@ -322,6 +535,100 @@ class VentaViewSet(viewsets.ModelViewSet):
             return CrearVentaSerializer
         return VentaSerializer
 
+    def create(self, request, *args, **kwargs):
+        """Si la referencia del POS ya está registrada se devuelve esa venta (200) sin repetirla"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        venta = serializer.save()
+        codigo = status.HTTP_200_OK if getattr(venta, 'repetida', False) else status.HTTP_201_CREATED
+        return Response(serializer.data, status=codigo)
+
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Registra en lote las ventas acumuladas por un POS sin conexión.
+        Recibe una lista JSON (o NDJSON, una venta por línea) con el mismo formato
+        de POST /api/ventas/, incluida la "fecha" en que se vendió y una
+        "referencia" propia del POS que no puede repetirse en la petición.
+        Las ventas cuya referencia ya está registrada (un reintento) no se
+        vuelven a guardar: su resultado trae "repetida" y el id existente.
+        Las ventas se validan por lotes de ?lote=N y cada lote se guarda en su
+        propia transacción; una venta rechazada no descarta las demás.
+        Los resultados vuelven en el orden de la petición.
+        """
+        ventas = request.data
+        if isinstance(ventas, dict):
+            ventas = ventas.get('ventas')
+        if not isinstance(ventas, list):
+            return Response(
+                {"error": "Se esperaba una lista de ventas"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(ventas) > settings.VENTAS_BULK_MAXIMO:
+            return Response(
+                {"error": f"Máximo {settings.VENTAS_BULK_MAXIMO} ventas por petición"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            tamano_lote = max(1, int(request.query_params.get('lote', settings.VENTAS_BULK_TAMANO_LOTE)))
+        except ValueError:
+            return Response(
+                {"error": "El parámetro lote debe ser un número"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        referencias = [referencia_venta(datos) for datos in ventas]
+        repetidas = sorted(
+            referencia for referencia, veces in Counter(referencias).items() if referencia is not None and veces > 1
+        )
+        if repetidas:
+            return Response(
+                {"error": "Hay referencias repetidas en la petición", "referencias": repetidas},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resultados = []
+        for inicio in range(0, len(ventas), tamano_lote):
+            # Un solo serializer por lote (como hace ListSerializer) y un dict de
+            # productos compartido entre todas sus ventas
+            serializer = CrearVentaSerializer(context={**self.get_serializer_context(), 'productos': {}})
+            existentes = ventas_repetidas(referencias[inicio:inicio + tamano_lote])
+            validas = []
+            for posicion, datos in enumerate(ventas[inicio:inicio + tamano_lote], start=inicio):
+                resultado = {"posicion": posicion, "referencia": referencias[posicion]}
+                if referencias[posicion] in existentes:
+                    resultados.append(resultado_venta(resultado, existentes[referencias[posicion]]))
+                    continue
+                try:
+                    validas.append((resultado, serializer.run_validation(datos)))
+                except serializers.ValidationError as error:
+                    resultados.append({**resultado, "creada": False, "errores": error.detail})
+
+            resultados.extend(sqlite.reintentar_si_bloqueada(self._guardar_lote, serializer, validas))
+
+        resultados.sort(key=lambda resultado: resultado["posicion"])
+        creadas = sum(1 for resultado in resultados if resultado["creada"])
+        repetidas = sum(1 for resultado in resultados if resultado.get("repetida"))
+        return Response({
+            "creadas": creadas,
+            "repetidas": repetidas,
+            "rechazadas": len(resultados) - creadas - repetidas,
+            "resultados": resultados,
+        })
+
+    def _guardar_lote(self, serializer, validas):
+        """Guarda un lote en una transacción; se repite entero si la base está bloqueada"""
+        resultados = []
+        with transaction.atomic():
+            for resultado, datos_validados in validas:
+                try:
+                    venta = serializer.create(datos_validados)
+                except serializers.ValidationError as error:
+                    resultados.append({**resultado, "creada": False, "errores": error.detail})
+                else:
+                    resultados.append(resultado_venta(resultado, venta))
+        return resultados
+
     @action(detail=False, methods=['get'], url_path='reportes/resumen', permission_classes=[IsAdmin])
     def reportes_resumen(self, request):
         """
@@ -334,45 +641,129 @@ class VentaViewSet(viewsets.ModelViewSet):
         ahora = timezone.now()
         inicio = ahora - timedelta(days=days)
 
-        ventas_qs = self.get_queryset().filter(fecha__gte=inicio)
-        totales = ventas_qs.aggregate(total_ingresos=Sum('total'), total_descuentos=Sum('descuento'))
-
-        top_productos = (
-            DetalleVenta.objects.filter(venta__fecha__gte=inicio)
-            .values('producto__id', 'producto__nombre')
-            .annotate(cantidad_vendida=Sum('cantidad'), ingresos=Sum('subtotal'))
-            .order_by('-cantidad_vendida')[:5]
-        )
-
-        serie_temporal = (
-            ventas_qs.annotate(mes=TruncMonth('fecha'))
-            .values('mes')
-            .annotate(total=Sum('total'))
-            .order_by('mes')
+        # Se lee el resumen diario: el costo depende de los días, no de las ventas
+        desde, hasta = timezone.localdate(inicio), timezone.localdate(ahora)
+        resumen = cache_reportes.obtener(
+            'resumen', {'desde': desde, 'hasta': hasta},
+            lambda: reportes.resumen_ventas(desde, hasta),
         )
 
         return Response({
             "periodo": period,
             "rango_desde": inicio.date(),
             "rango_hasta": ahora.date(),
-            "totales": {
-                "ingresos": totales.get('total_ingresos') or 0,
-                "descuentos": totales.get('total_descuentos') or 0,
-            },
-            "top_productos": list(top_productos),
-            "serie_temporal": [
-                {"mes": item["mes"].strftime("%Y-%m"), "total": item["total"]} for item in serie_temporal
-            ],
+            **resumen,
         })
 
+    @action(detail=False, methods=['get'], url_path='exportar', permission_classes=[IsAdmin])
+    def exportar(self, request):
+        """Exporta las ventas con sus detalles (una fila por detalle) en CSV o NDJSON."""
+        return exportar(request, exportacion.COLUMNAS_VENTAS, exportacion.filas_ventas, 'ventas')
+
+    @action(detail=False, methods=['get'], url_path='reportes/cache', permission_classes=[IsAdmin])
+    def reportes_cache(self, request):
+        """Aciertos, fallos e invalidaciones de la caché de reportes."""
+        return Response(cache_reportes.estadisticas())
+
 class MovimientoInventarioViewSet(viewsets.ModelViewSet):
     """
     Permite registrar entradas de stock, ajustes y devoluciones.
     Solo admin puede hacer esto.
     """
-    queryset = MovimientoInventario.objects.all().order_by('-fecha')
+    queryset = MovimientoInventario.objects.select_related('producto', 'empleado__user').order_by('-fecha')
     serializer_class = MovimientoInventarioSerializer
     permission_classes = [IsAdmin]  # Solo admin
+    pagination_class = FechaKeysetPagination
+
+    @action(detail=False, methods=['get'], url_path='exportar')
+    def exportar(self, request):
+        """Exporta los movimientos de inventario en CSV o NDJSON."""
+        return exportar(
+            request, exportacion.COLUMNAS_MOVIMIENTOS, exportacion.filas_movimientos, 'movimientos'
+        )
+
+
+# ==================== REPORTES EN SEGUNDO PLANO ====================
+class TrabajoReporteViewSet(viewsets.ModelViewSet):
+    """
+    Reportes de ventas de cualquier rango, calculados por el worker
+    (python manage.py worker_reportes). POST con desde, hasta, granularidad
+    (dia, semana, mes, anio) y dimensiones (producto, categoria, canal, empleado);
+    GET del trabajo para su estado y de .../resultado/ para el reporte.
+    """
+    queryset = TrabajoReporte.objects.defer('resultado')
+    serializer_class = TrabajoReporteSerializer
+    permission_classes = [IsAdmin]
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    def get_queryset(self):
+        if self.action == 'resultado':
+            return TrabajoReporte.objects.all()
+        return super().get_queryset()
+
+    def create(self, request, *args, **kwargs):
+        pedido = CrearTrabajoReporteSerializer(data=request.data)
+        pedido.is_valid(raise_exception=True)
+        trabajo, creado = trabajos_reportes.encolar(pedido.parametros(), request.user)
+        # Si ya había uno igual en curso se devuelve ese
+        return Response(
+            self.get_serializer(trabajo).data,
+            status=status.HTTP_201_CREATED if creado else status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=['get'])
+    def resultado(self, request, pk=None):
+        """El reporte si está terminado; 202 si aún no, 409 si falló o se canceló."""
+        trabajo = self.get_object()
+        if trabajo.estado == 'terminado':
+            return Response({"id": trabajo.id, "parametros": trabajo.parametros, **trabajo.resultado})
+        return Response(
+            {"estado": trabajo.estado, "progreso": trabajo.progreso, "error": trabajo.error},
+            status=status.HTTP_202_ACCEPTED if trabajo.estado in trabajos_reportes.ACTIVOS else status.HTTP_409_CONFLICT,
+        )
+
+    @action(detail=True, methods=['post'])
+    def cancelar(self, request, pk=None):
+        """Cancela un trabajo pendiente o pide detener uno en proceso."""
+        trabajo = self.get_object()
+        if not trabajos_reportes.cancelar(trabajo.pk):
+            return Response(
+                {"error": f"El trabajo ya está {trabajo.get_estado_display().lower()}"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        trabajo.refresh_from_db()
+        return Response(self.get_serializer(trabajo).data)
+
+
+# ==================== MÉTRICAS ====================
+@api_view(["GET"])
+@permission_classes([IsAdmin])
+def metrics(request):
+    """Histogramas por endpoint de los últimos minutos (de este proceso)"""
+    return Response(metricas.histogramas.resumen())
+
+
+@api_view(["GET"])
+@permission_classes([IsAdmin])
+def perfiles(request):
+    """Perfiles guardados (pedidos con X-Perfilar: 1 o ?perfilar=1), del más reciente al más antiguo"""
+    return Response(perfilado.listar())
+
+
+@api_view(["GET"])
+@permission_classes([IsAdmin])
+def perfil(request, perfil_id):
+    """Resumen de un perfil por tiempo acumulado, o el archivo .prof con ?formato=prof"""
+    if request.query_params.get('formato') == 'prof':
+        ruta = perfilado.archivo_prof(perfil_id)
+        if ruta is None:
+            return Response({"error": "Perfil no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=f'{perfil_id}.prof')
+
+    datos = perfilado.obtener(perfil_id)
+    if datos is None:
+        return Response({"error": "Perfil no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(datos)
 
 
 @api_view(["POST"])
@@ -452,7 +843,7 @@ def google_login(request):
         },
     )
 
-    refresh = RefreshToken.for_user(user)
+    refresh = CustomTokenObtainPairSerializer.get_token(user)
 
     return Response(
         {